@@ -30,6 +30,9 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'aho-corasick': ['pyahocorasick'],
+    'parquet': ['pyarrow'],
+    'xxhash': ['xxhash'],
 }
 
 # The rest you shouldn't have to touch too much :)
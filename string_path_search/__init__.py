@@ -1,9 +1,42 @@
-from .scanner import Scanner, Output
+from .checkpoint import Checkpoint, CHECKPOINT_INTERVAL
+from .filters import Exclusions, Prefilter
+from .matchers import get_matcher, MATCH_ENGINES
+from .sinks import (
+    Sink,
+    CallbackSink,
+    CSVSink,
+    ExcelSink,
+    JSONLSink,
+    ParquetSink,
+    SQLiteSink,
+    get_sink,
+    SINK_FORMATS,
+    FLUSH_INTERVAL,
+)
+from .scanner import (
+    Scanner,
+    Output,
+    CONTEXT_BYTES,
+    DEDUP_MEMORY,
+    MATCH_MODES,
+    MAX_OFFSETS,
+    NO_DIGEST,
+    PREFETCH_MEMORY,
+    SPOOL_SIZE,
+)
 from .utils import (
     random_string,
     calculate_md5,
+    calculate_digest,
+    new_digest,
+    DIGEST_ALGORITHMS,
     eprint,
     get_logger,
     LOGGER,
     make_dir_safe,
+    parse_size,
+    MemoryBudget,
+    LRUCache,
 )
+from .shards import merge_results, parse_shard, shard_of
+from .watcher import watch, DEBOUNCE, POLL_INTERVAL
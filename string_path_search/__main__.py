@@ -5,38 +5,134 @@ For a directory and a list of strings, find the files that match any string.
 
 Usage:
     python __main__.py [OPTIONS] <scan-root> [<search-string> [...]]
+    python __main__.py merge [OPTIONS] <partial-results> [...]
     where:
         -a, --unpack-archives = Unpack and scan within archives
             (Default: Arhives will NOT be uncompressed and will be scanned
             as a single file). LIMITATIONS: Only zip and tar archives will be
             unpacked. Only gzip and bzip2 tar compression methods are supported.
+        --any-match = Stop matching each file at the first string found, and
+            report only that string (Default: report every matching string).
         -B, --branding-text=<branding-text> = A string of text containing
             company or other information to add above the column headers in
             scan reports (Default: no text).
         -b, --branding-logo=<branding-logo> = (MS Excel only) An image
             file containing a corporate logo or other graphic to add above the
             column headers in scan reports (Default: no logo).
+        --cache-file=<cache-file> = An SQLite file that remembers which strings
+            matched each file, so that a rescan with the same search strings only
+            reads new or changed files (Default: no cache).
+        --build-index=<index-file> = Walk <scan-root> once and write a trigram
+            index of every file to <index-file> for --index, then exit. No search
+            strings are needed.
+        --checkpoint-interval=<seconds> = Checkpoint the scan to <output-dir>
+            every <seconds>, so that --resume can pick it up (Default: 60 with
+            --resume, otherwise no checkpoints).
+        --chunk-size=<size> = Read and match files <size> bytes at a time (K, M,
+            and G suffixes are allowed), so that memory use doesn't depend on
+            file size. Regular expression matches longer than 4096 characters
+            may be missed (Default: read whole files).
+        --byte-match = Match ASCII search strings directly against the raw file
+            bytes, encoded as UTF-8 or UTF-16LE, without decoding and normalizing
+            each file. Strings with non-ASCII characters are still matched
+            against normalized text (Default: decode and normalize every file).
+        --context=<bytes> = With --offsets, the number of bytes of context
+            reported either side of each occurrence (Default: 40).
+        --debounce=<seconds> = With --watch, wait for <seconds> without a change
+            before scanning a burst of changed files (Default: 1).
+        --dedup-memory=<size> = The most memory spent remembering the matches
+            of content already seen in this scan, so duplicate files are only
+            matched once (K, M, and G suffixes are allowed) (Default: 16M; 0
+            turns this off).
+        --digest=<algorithm> = The content digest reported for each match, one
+            of md5, sha1, sha256, blake2b, xxh64, or none (Default: md5).
+        --digest-matches-only = Only calculate digests for files that match
+            (Default: calculate a digest for every file).
+        --exclude=<pattern> = Skip files and directories matching a gitignore-style
+            pattern, e.g. *.min.js or **/node_modules/** (may repeat).
+        --exclude-ext=<extensions> = Skip files with any of these comma-separated
+            extensions, e.g. .png,.so (may repeat) (Default: no extension is skipped).
+        --flush-interval=<seconds> = How often streamed output is flushed to
+            disk during the scan (Default: 5).
         -h, --help = Print usage information and exit.
         -e, --excel-output = Generate Microsoft Excel 2007 (.xlsx) output
             (Default: Generate comma-separated-value (CSV) text output)
+        --files-only = Report each matching file once, without the strings it
+            matched. Implies --any-match (Default: report every match).
         -i  --ingore-case = Ignore UPPER/lowercase differences when matching strings
             (Default: case differences are significant).
+        --index=<index-file> = Only match the files that a --build-index index
+            says may contain a search string (Default: match every file).
+        --include-ext=<extensions> = Only match files with one of these
+            comma-separated extensions, e.g. .c,.h (may repeat) (Default: match
+            files with any extension).
+        -j, --jobs=<jobs> = Read, hash, and match files in <jobs> parallel
+            worker processes (Default: 1, scan serially).
+        --jsonl-output = Write each match to a JSON Lines (.jsonl) file as soon
+            as it is found. Same as --stream-output=jsonl.
+        --match-engine=<engine> = The multi-string matching engine, one of
+            auto, aho-corasick, trie, or substring (Default: auto, which picks
+            substring for short search lists and an automaton for long ones).
+        --max-offsets=<count> = With --offsets, the most occurrences of each
+            string reported for each file (Default: 10).
+        --max-size=<size> = Skip files larger than <size> bytes (K, M, and G
+            suffixes are allowed) (Default: no limit).
+        --min-size=<size> = Skip files smaller than <size> bytes (K, M, and G
+            suffixes are allowed) (Default: no limit).
+        --mmap-threshold=<size> = Memory-map regular files of at least <size>
+            bytes (K, M, and G suffixes are allowed) and match them in place,
+            instead of copying them into memory. Works best with --byte-match
+            (Default: never memory-map files).
+        --offsets = Report the byte offset, line number, and surrounding text
+            of each occurrence of a string, one row per occurrence (Default:
+            one row per matching string and file).
         -o, --output-dir=<output-dir> = Location for output (Default:
             <current working directory>).
+        --parquet-output = Generate columnar Parquet (.parquet) output. Requires
+            the pyarrow package (Default: Generate CSV text output).
+        --poll-interval=<seconds> = With --watch, poll for changes every
+            <seconds> instead of using inotify (Default: use inotify).
+        --prefetch=<depth> = Read up to <depth> files ahead of the matcher in a
+            small pool of threads (Default: 0, no read-ahead).
+        --prefetch-memory=<size> = The most memory read-ahead files may hold
+            (K, M, and G suffixes are allowed) (Default: 64M).
+        --roll-interval=<seconds> = With --watch, start a new output file every
+            <seconds>, at least 60 (Default: one output file).
         -s, --search-strings=<search-strings> = A file containing strings to
-        search for, one per line (No Default).
+        search for, one per line. Lines starting with re: are regular
+        expressions (No Default).
         -q, --quiet = Decrease logging verbosity (may repeat). -vvvv will suppress all logging.
+        --resume = Resume an interrupted scan from its checkpoint in <output-dir>,
+            if there is one, and keep checkpointing it (Default: start over).
+        --shard=<index>/<count> = Only scan the files that fall in shard <index>
+            of <count>, e.g. 3/16, and add the shard to the output file name.
+        --skip-binary = Skip files that look like images, media, compressed
+            data, or executables (Default: match every file).
+        --spool-size=<size> = Keep archives nested in other archives in memory
+            up to <size> bytes (K, M, and G suffixes are allowed) (Default: 64M).
+        --stream-output=<format> = Write each match to the output file as soon
+            as it is found, in csv, jsonl, sqlite, or xlsx format (Default: write
+            the output after the scan).
         -t, --temp-dir=<temp-dir> = Location for unpacking archives
             (Default: <output_dir>/temp).
+        --update-index=<index-file> = Like --build-index, but only re-index the
+            files that were added or changed since <index-file> was written.
         -v, --verbose = Increase logging verbosity.
+        --walk-threads=<threads> = List directories in <threads> threads ahead
+            of the scan (Default: 1, list each directory when it is reached).
+        --watch = Keep running, and scan the files that are added or changed
+            under <scan-root> as they land (Default: scan once and exit).
     <scan-root> = Directory to scan (No Default).
+    <partial-results> = The CSV or JSON Lines output of each --shard, which
+        merge combines into one report, in the format of the output options.
 
 Limitations:
     Requires Python 3.4 or later.
     Only handles jar, tar, and zip archives.
     Only handles bzip2, gzip, and xz tar compression.
     Only handles compression in archives, not single files.
-    Maximum file size and results array length limited by available system RAM.
+    Maximum file size limited by available system RAM unless --chunk-size is used.
+    Maximum results array length limited by available system RAM.
     Maximum archive size limited by available Scanner.temp_dir disk space.
 """
 
@@ -44,13 +140,36 @@ Limitations:
 import getopt
 import logging
 import os
+import signal
 import sys
 import time
 
 # Import 3rd party modules.
 
 # Import project modules.
-from string_path_search import Scanner, eprint, LOGGER, make_dir_safe, Output
+from string_path_search import (
+    CHECKPOINT_INTERVAL,
+    DEBOUNCE,
+    DEDUP_MEMORY,
+    DIGEST_ALGORITHMS,
+    FLUSH_INTERVAL,
+    PREFETCH_MEMORY,
+    Scanner,
+    SINK_FORMATS,
+    SPOOL_SIZE,
+    CONTEXT_BYTES,
+    MAX_OFFSETS,
+    NO_DIGEST,
+    eprint,
+    LOGGER,
+    make_dir_safe,
+    Output,
+    MATCH_ENGINES,
+    parse_size,
+    merge_results,
+    parse_shard,
+    watch,
+)
 
 # Define constants.
 
@@ -63,34 +182,204 @@ def print_usage():
         $ python -m string_path_search [OPTIONS] <scan-root> [<search-string> [...]]
         or (if the .exe was installed from pypi):
         $ string_path_search.exe [OPTIONS] <scan-root> [<search-string> [...]]
+        or, to combine the output of --shard scans:
+        $ python -m string_path_search merge [OPTIONS] <partial-results> [...]
         where:
             -a, --unpack-archives = Unpack and scan within archives
                 (Default: Arhives will NOT be uncompressed and will be scanned
                 as a single file). Only jar, tar, and zip archives will be
                 unpacked. Tar bzip2, gzip, and xz compression is supported.
+            --any-match = Stop matching each file at the first string found, and
+                report only that string (Default: report every matching string).
             -B, --branding-text=<branding-text> = A string of text containing
                 company or other information to add above the column headers in
                 scan reports (Default: no text).
             -b, --branding-logo=<branding-logo> = (MS Excel only) An image
                 file containing a corporate logo or other graphic to add above the
                 column headers in scan reports (Default: no logo).
+            --cache-file=<cache-file> = An SQLite file that remembers which strings
+                matched each file, so that a rescan with the same search strings only
+                reads new or changed files (Default: no cache).
+            --build-index=<index-file> = Walk <scan-root> once, with the same
+                -a, exclusion, extension, and size options as later scans, and
+                write a trigram index of every file, including archive members,
+                to <index-file> for --index. Then exit. No search strings are
+                needed.
+            --checkpoint-interval=<seconds> = Save the walk position, statistics,
+                and matches so far to a checkpoint file in <output-dir> every
+                <seconds>, between files and archives, so that an interrupted
+                scan can be picked up with --resume. The file is deleted once
+                the scan is complete (Default: 60 with --resume, otherwise no
+                checkpoints).
+            --chunk-size=<size> = Read and match files <size> bytes at a time (K, M,
+                and G suffixes are allowed), so that memory use doesn't depend on
+                file size. Regular expression matches longer than 4096 characters
+                may be missed (Default: read whole files).
+            --byte-match = Match ASCII search strings directly against the raw file
+                bytes, encoded as UTF-8 or UTF-16LE, without decoding and normalizing
+                each file. Strings with non-ASCII characters are still matched
+                against normalized text (Default: decode and normalize every file).
+            --context=<bytes> = With --offsets, the number of bytes of context
+                reported either side of each occurrence (Default: 40).
+            --debounce=<seconds> = With --watch, wait until <seconds> pass
+                without another change before scanning a burst of changed
+                files, so that files being written or copied in are scanned
+                once, when they are complete (Default: 1).
+            --dedup-memory=<size> = The most memory spent remembering the matches
+                of content already seen in this scan, so duplicate files are only
+                matched once (K, M, and G suffixes are allowed). Each parallel
+                job has its own (Default: 16M; 0 turns this off).
+            --digest=<algorithm> = The content digest reported for each match, one
+                of md5, sha1, sha256, blake2b, xxh64, or none (Default: md5). xxh64
+                is a fast non-cryptographic hash that requires the xxhash package.
+                none leaves the digest column empty; with --chunk-size, files are
+                then only read until their matches are known, and duplicate
+                content is no longer recognized.
+            --digest-matches-only = Only calculate digests for files that match.
+                Saves hashing every file, but duplicate content is no longer
+                recognized, so --dedup-memory has no effect (Default: calculate
+                a digest for every file).
+            --exclude=<pattern> = Skip files and directories matching a
+                gitignore-style pattern (may repeat). Patterns without a "/"
+                match base names anywhere, e.g. *.min.js; others match paths
+                relative to <scan-root>, or to the root of an archive, e.g.
+                /docs/api or **/node_modules/**. A trailing "/" only matches
+                directories. Excluded directories are never listed. Same as a
+                line of the -x file (Default: exclude nothing).
+            --exclude-ext=<extensions> = Skip files with any of these
+                comma-separated extensions, e.g. .png,.so (may repeat). Files are
+                skipped by name, without being opened (Default: no extension is
+                skipped).
+            --flush-interval=<seconds> = How often --stream-output and
+                --jsonl-output files are flushed to disk during the scan, so
+                that other programs can follow them (Default: 5).
             -h, --help = Print usage information and exit.
             -e, --excel-output = Generate Microsoft Excel 2007 (.xlsx) output
                 (Default: Generate comma-separated-value (CSV) text output)
+            --files-only = Report each matching file once, as a digest, name,
+                location row, without the strings it matched. Implies
+                --any-match (Default: report every match).
             -i  --ingore-case = Ignore UPPER/lowercase differences when matching strings
                 (Default: case differences are significant).
+            --index=<index-file> = Only read and match the files that a
+                --build-index index says may contain a search string. Files
+                and archives that are new or changed since the index was built
+                are matched in full. Search strings shorter than 3 characters,
+                and regular expressions without 3 literal characters in a row,
+                can't be looked up, and turn the index off (Default: match
+                every file).
+            --include-ext=<extensions> = Only match files with one of these
+                comma-separated extensions, e.g. .c,.h (may repeat). Archives
+                are still walked with -a, and their members filtered in turn
+                (Default: match files with any extension).
+            -j, --jobs=<jobs> = Read, hash, and match files in <jobs> parallel
+                worker processes. Output is identical to a serial scan
+                (Default: 1, scan serially).
+            --jsonl-output = Write each match to a JSON Lines (.jsonl) file, one
+                object per match, as soon as it is found. Same as
+                --stream-output=jsonl.
+            --match-engine=<engine> = The multi-string matching engine, one of
+                auto, aho-corasick, trie, or substring (Default: auto, which picks
+                substring for short search lists and an automaton for long ones).
+                aho-corasick requires the pyahocorasick package.
+            --max-offsets=<count> = With --offsets, the most occurrences of each
+                string reported for each file (Default: 10).
+            --max-size=<size> = Skip files larger than <size> bytes (K, M, and G
+                suffixes are allowed), by their directory or archive entry,
+                without opening them (Default: no limit).
+            --min-size=<size> = Skip files smaller than <size> bytes (K, M, and G
+                suffixes are allowed), likewise (Default: no limit).
+            --mmap-threshold=<size> = Memory-map regular files of at least <size>
+                bytes (K, M, and G suffixes are allowed) and match them in place,
+                instead of copying them into memory. Works best with --byte-match
+                (Default: never memory-map files).
+            --offsets = Report the byte offset, line number, and surrounding text
+                of each occurrence of a string, one row per occurrence, found in
+                the same pass as the match. Files read in chunks because of
+                --chunk-size only report which strings matched; use
+                --mmap-threshold for large files instead (Default: one row per
+                matching string and file).
             -o, --output-dir=<output-dir> = Location for output (Default:
                 <current working directory>).
+            --parquet-output = Generate compressed, columnar Parquet (.parquet)
+                output, which loads much faster than CSV. Requires the pyarrow
+                package (Default: Generate CSV text output).
+            --poll-interval=<seconds> = With --watch, walk <scan-root> every
+                <seconds> and compare file sizes and modification times,
+                instead of using Linux inotify. Use it for network filesystems,
+                whose remote changes inotify doesn't see (Default: use inotify
+                where it is available, otherwise poll every 5 seconds).
+            --prefetch=<depth> = Read up to <depth> files ahead of the matcher in a
+                small pool of threads, which helps on network and cold disks
+                (Default: 0, no read-ahead).
+            --prefetch-memory=<size> = The most memory read-ahead files may hold
+                (K, M, and G suffixes are allowed). Larger files are read
+                when they are matched (Default: 64M).
+            --roll-interval=<seconds> = With --watch, close the output file and
+                start a new, timestamped one once it has been open for at least
+                <seconds>, at least 60 (Default: one output file for as long as
+                the watch runs).
             -s, --search-strings-file=<search-strings> = A file containing strings
-                to search for, one per line (No Default).
+                to search for, one per line. Strings starting with re: are
+                regular expressions, e.g. re:[Cc]opyright [0-9]{4} (No Default).
             -q, --quiet = Decrease logging verbosity (may repeat). -qqqq will suppress all logging.
+            --resume = If <output-dir> holds the checkpoint of an interrupted scan
+                with the same <scan-root>, search strings, and options, skip
+                the files and archives it had already scanned, and carry on
+                from there. The output is identical to that of an uninterrupted
+                scan. The scan is checkpointed either way, so the same command
+                can simply be rerun. Not available with --stream-output or
+                --jsonl-output, whose rows aren't kept (Default: start over).
+            --shard=<index>/<count> = Split the scan into <count> shards, which
+                can run on separate hosts, and only scan shard <index> (counted
+                from 1), e.g. --shard=3/16. Files are assigned to shards by a
+                hash of their path relative to <scan-root>, so every host must
+                be given the same <scan-root> layout, exclusions, and options.
+                The output file name ends with the shard, e.g.
+                scan-<timestamp>-shard3of16.csv. Use csv or jsonl output
+                (the default csv, --jsonl-output, or --stream-output=csv or
+                jsonl) so that merge can read it (Default: scan everything).
+            --skip-binary = Skip files whose first 4K bytes look like images,
+                audio, video, compressed data, or executables, by their magic
+                number or the number of NUL bytes. UTF-16 text is still matched
+                (Default: match every file, including binaries).
+            --spool-size=<size> = Keep archives nested in other archives in memory
+                up to <size> bytes (K, M, and G suffixes are allowed). Larger ones
+                are spilled to <temp-dir> (Default: 64M; 0 always spills).
+            --stream-output=<format> = Write each match to the output file as soon
+                as it is found, in csv, jsonl, sqlite, or xlsx format, instead of
+                holding every match in memory until the scan is over. Use it
+                instead of -e (Default: write the output after the scan).
             -t, --temp-dir=<temp-dir> = Location for unpacking archives
                 (Default: <output_dir>/temp).
+            --update-index=<index-file> = Like --build-index, but keep what
+                <index-file> already holds of unchanged files, re-index only
+                added and changed files (and, inside changed archives, only
+                members whose digest changed), and tombstone removed files.
+                Reports the counts of added, changed, removed, and unchanged
+                files. Then exit.
             -v, --verbose = Increase logging verbosity.
-            -x, --exclusions-file=<exclusion-file> = A file containing (base) filenames to
-                exclude from the search results.
+            --walk-threads=<threads> = List directories in <threads> threads
+                ahead of the scan, which helps on network filesystems and cold
+                disks. Files are still scanned in the same order (Default: 1,
+                list each directory when it is reached).
+            --watch = Keep running as a daemon, and scan each file that is added
+                or changed under <scan-root> (a directory) as it lands, with the
+                same options as a scan. Matches are appended to a
+                --stream-output file (csv unless another format is given) and
+                flushed as they are found. Files already there when the watch
+                starts are not scanned. Stop it with Ctrl-C or SIGTERM
+                (Default: scan once and exit).
+            -x, --exclusions-file=<exclusion-file> = A file containing (base) filenames
+                and --exclude patterns to exclude from the search results, one per
+                line. Lines starting with # are comments.
         <scan-root> = Directory to scan (No Default).
         <search-string> ... = One or more terms to search for in <scan-root>.
+            Terms starting with re: are regular expressions.
+        <partial-results> ... = For merge, the CSV or JSON Lines output files of
+            --shard scans, whose rows are combined, less duplicates, into one
+            report in the format chosen by -e, --parquet-output,
+            --jsonl-output, or --stream-output (Default: csv) in <output-dir>.
         """
     eprint(usage)
 
@@ -105,12 +394,50 @@ def parse_args():
     config = {
         'branding_text': None,
         'branding_logo': None,
+        'build_index': False,
+        'byte_match': False,
+        'cache_file': None,
+        'checkpoint_dir': None,
+        'checkpoint_interval': CHECKPOINT_INTERVAL,
+        'chunk_size': None,
+        'context_bytes': CONTEXT_BYTES,
+        'debounce': DEBOUNCE,
+        'dedup_memory': DEDUP_MEMORY,
+        'digest_algorithm': 'md5',
+        'digest_matches_only': False,
         'excel_output': False,
+        'exclude_extensions': set(),
+        'flush_interval': FLUSH_INTERVAL,
         'ignore_case': False,
+        'include_extensions': set(),
+        'index_file': None,
+        'jobs': 1,
+        'match_engine': 'auto',
+        'match_mode': 'all',
+        'merge': False,
+        'merge_files': [],
+        'max_offsets': MAX_OFFSETS,
+        'max_size': None,
+        'min_size': None,
+        'mmap_threshold': None,
+        'offsets': False,
         'log_level': logging.INFO,
         'output_dir': os.getcwd(),
+        'parquet_output': False,
+        'poll_interval': None,
+        'prefetch_depth': 0,
+        'prefetch_memory': PREFETCH_MEMORY,
+        'resume': False,
+        'roll_interval': None,
         'search_strings_file': None,
+        'shard': None,
+        'skip_binary': False,
+        'spool_size': SPOOL_SIZE,
+        'stream_output': None,
         'temp_dir': os.path.join(os.getcwd(), "temp"),
+        'update_index': False,
+        'walk_threads': 1,
+        'watch': False,
         'scan_archives': False,
         'exclusions_file': None,
         'search_strings': set(),
@@ -118,21 +445,63 @@ def parse_args():
     }
 
     sys_args = sys.argv[1:]
+    checkpoint = False
+    if sys_args[:1] == ["merge"]:
+        config['merge'] = True
+        sys_args = sys_args[1:]
 
     # Process option flags.
     try:
-        opts, args = getopt.getopt(sys_args, "aB:b:ehio:qs:t:vx:",
+        opts, args = getopt.getopt(sys_args, "aB:b:ehij:o:qs:t:vx:",
                                    ["scan_archives",
+                                    "any-match",
                                     "branding_text",
                                     "branding_logo",
+                                    "build-index=",
+                                    "byte-match",
+                                    "cache-file=",
+                                    "checkpoint-interval=",
+                                    "chunk-size=",
+                                    "context=",
+                                    "debounce=",
+                                    "dedup-memory=",
+                                    "digest=",
+                                    "digest-matches-only",
                                     "excel_output",
+                                    "exclude=",
+                                    "exclude-ext=",
+                                    "files-only",
+                                    "flush-interval=",
                                     "help",
                                     "ignore_case",
+                                    "include-ext=",
+                                    "index=",
+                                    "jobs=",
+                                    "jsonl-output",
+                                    "match-engine=",
+                                    "max-offsets=",
+                                    "max-size=",
+                                    "min-size=",
+                                    "mmap-threshold=",
+                                    "offsets",
                                     "output_dir",
+                                    "parquet-output",
+                                    "poll-interval=",
+                                    "prefetch=",
+                                    "prefetch-memory=",
                                     "quiet",
+                                    "resume",
+                                    "roll-interval=",
+                                    "shard=",
+                                    "skip-binary",
+                                    "spool-size=",
+                                    "stream-output=",
                                     "search-strings-file"
                                     "temp_dir",
+                                    "update-index=",
                                     "verbose",
+                                    "walk-threads=",
+                                    "watch",
                                     "exclusions-file"])
     except getopt.GetoptError as err:
         eprint(err.msg)
@@ -148,17 +517,172 @@ def parse_args():
             config['branding_text'] = arg.strip()
         elif opt in ("-b", "--branding-logo"):
             config['branding_logo'] = arg.strip()
+        elif opt == "--build-index":
+            config['build_index'] = True
+            config['index_file'] = arg.strip()
+        elif opt == "--byte-match":
+            config['byte_match'] = True
+        elif opt == "--cache-file":
+            config['cache_file'] = arg.strip()
+        elif opt == "--checkpoint-interval":
+            try:
+                config['checkpoint_interval'] = float(arg)
+            except ValueError:
+                config['checkpoint_interval'] = -1
+            if config['checkpoint_interval'] < 0:
+                eprint("Invalid checkpoint interval {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+            checkpoint = True
+        elif opt == "--chunk-size":
+            try:
+                config['chunk_size'] = parse_size(arg)
+            except ValueError:
+                eprint("Invalid chunk size {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--context":
+            try:
+                config['context_bytes'] = int(arg)
+            except ValueError:
+                config['context_bytes'] = -1
+            if config['context_bytes'] < 0:
+                eprint("Invalid context size {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--debounce":
+            try:
+                config['debounce'] = float(arg)
+            except ValueError:
+                config['debounce'] = -1
+            if config['debounce'] < 0:
+                eprint("Invalid debounce interval {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--dedup-memory":
+            try:
+                config['dedup_memory'] = parse_size(arg)
+            except ValueError:
+                eprint("Invalid dedup memory size {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--any-match":
+            if config['match_mode'] != 'files':
+                config['match_mode'] = 'any'
+        elif opt == "--digest":
+            if arg.strip() not in DIGEST_ALGORITHMS and arg.strip() != NO_DIGEST:
+                eprint("Unknown digest algorithm {0}. Use one of: {1}".format(
+                    arg, ", ".join(list(DIGEST_ALGORITHMS) + [NO_DIGEST])))
+                print_usage()
+                sys.exit(2)
+            config['digest_algorithm'] = arg.strip()
+        elif opt == "--digest-matches-only":
+            config['digest_matches_only'] = True
         elif opt in ("-a", "--unpack-archives"):
             config['scan_archives'] = True
         elif opt in ("-e", "--excel-output"):
             config['excel_output'] = True
+        elif opt == "--exclude":
+            config['exclusions'].add(arg.strip())
+        elif opt == "--exclude-ext":
+            config['exclude_extensions'].update(
+                _.strip() for _ in arg.split(",") if _.strip())
+        elif opt == "--files-only":
+            config['match_mode'] = 'files'
+        elif opt == "--flush-interval":
+            try:
+                config['flush_interval'] = float(arg)
+            except ValueError:
+                config['flush_interval'] = -1
+            if config['flush_interval'] < 0:
+                eprint("Invalid flush interval {0}".format(arg))
+                print_usage()
+                sys.exit(2)
         elif opt in ("-h", "--help"):
             print_usage()
             sys.exit(0)
         elif opt in ("-i", "--ignore-case"):
             config['ignore_case'] = True
+        elif opt == "--index":
+            config['index_file'] = arg.strip()
+        elif opt == "--include-ext":
+            config['include_extensions'].update(
+                _.strip() for _ in arg.split(",") if _.strip())
+        elif opt in ("-j", "--jobs"):
+            try:
+                config['jobs'] = int(arg)
+            except ValueError:
+                config['jobs'] = 0
+            if config['jobs'] < 1:
+                eprint("Invalid number of jobs {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--jsonl-output":
+            config['stream_output'] = 'jsonl'
+        elif opt == "--match-engine":
+            if arg.strip() not in MATCH_ENGINES:
+                eprint("Unknown match engine {0}. Use one of: {1}".format(
+                    arg, ", ".join(MATCH_ENGINES)))
+                print_usage()
+                sys.exit(2)
+            config['match_engine'] = arg.strip()
+        elif opt == "--max-offsets":
+            try:
+                config['max_offsets'] = int(arg)
+            except ValueError:
+                config['max_offsets'] = 0
+            if config['max_offsets'] < 1:
+                eprint("Invalid maximum number of offsets {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt in ("--max-size", "--min-size"):
+            try:
+                config[opt[2:].replace("-", "_")] = parse_size(arg)
+            except ValueError:
+                eprint("Invalid file size {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--mmap-threshold":
+            try:
+                config['mmap_threshold'] = parse_size(arg)
+            except ValueError:
+                eprint("Invalid mmap threshold {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--offsets":
+            config['offsets'] = True
         elif opt in ("-o", "--output-dir"):
             config['output_dir'] = arg.strip()
+        elif opt == "--parquet-output":
+            config['parquet_output'] = True
+        elif opt == "--poll-interval":
+            try:
+                config['poll_interval'] = float(arg)
+            except ValueError:
+                config['poll_interval'] = -1
+            if config['poll_interval'] <= 0:
+                eprint("Invalid poll interval {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--prefetch":
+            try:
+                config['prefetch_depth'] = int(arg)
+            except ValueError:
+                config['prefetch_depth'] = -1
+            if config['prefetch_depth'] < 0:
+                eprint("Invalid prefetch depth {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--prefetch-memory":
+            try:
+                config['prefetch_memory'] = parse_size(arg)
+            except ValueError:
+                eprint("Invalid prefetch memory size {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--resume":
+            config['resume'] = True
+            checkpoint = True
         elif opt in ("-q", "--quiet"):
             if config['log_level'] == logging.CRITICAL:
                 config['log_level'] = logging.NOTSET
@@ -168,12 +692,59 @@ def parse_args():
                 config['log_level'] = logging.ERROR
             else:
                 config['log_level'] = logging.WARNING
+        elif opt == "--roll-interval":
+            try:
+                config['roll_interval'] = float(arg)
+            except ValueError:
+                config['roll_interval'] = -1
+            if config['roll_interval'] < 60:
+                eprint("Invalid roll interval {0}".format(arg))
+                print_usage()
+                sys.exit(2)
         elif opt in ("-s", "--search-string-file"):
             config['search_strings_file'] = arg.strip()
+        elif opt == "--shard":
+            try:
+                config['shard'] = parse_shard(arg.strip())
+            except ValueError:
+                eprint("Invalid shard {0}. Use <index>/<count>, e.g. 3/16".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--skip-binary":
+            config['skip_binary'] = True
+        elif opt == "--spool-size":
+            try:
+                config['spool_size'] = parse_size(arg)
+            except ValueError:
+                eprint("Invalid spool size {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--stream-output":
+            if arg.strip() not in SINK_FORMATS:
+                eprint("Unknown output format {0}. Use one of: {1}".format(
+                    arg, ", ".join(SINK_FORMATS)))
+                print_usage()
+                sys.exit(2)
+            config['stream_output'] = arg.strip()
         elif opt in ("-t", "--temp-dir"):
             config['temp_dir'] = arg.strip()
+        elif opt == "--update-index":
+            config['build_index'] = True
+            config['update_index'] = True
+            config['index_file'] = arg.strip()
         elif opt in ("-v", "--verbose"):
             config['log_level'] = logging.DEBUG
+        elif opt == "--walk-threads":
+            try:
+                config['walk_threads'] = int(arg)
+            except ValueError:
+                config['walk_threads'] = 0
+            if config['walk_threads'] < 1:
+                eprint("Invalid number of walk threads {0}".format(arg))
+                print_usage()
+                sys.exit(2)
+        elif opt == "--watch":
+            config['watch'] = True
         elif opt in ("-x", "--exclusions-file"):
             config['exclusions_file'] = arg.strip()
 
@@ -182,13 +753,44 @@ def parse_args():
         eprint("Insufficient arguments on command line")
         print_usage()
         sys.exit(2)
+    if config['merge']:
+        config['merge_files'] = [_.strip() for _ in args]
+        return config
     config['scan_root'] = args[0].strip()
 
     if len(args) > 1:
         for _ in args[1:]:
             config['search_strings'].add(_.strip())
 
-    if not config['search_strings']:
+    if len([_ for _ in (config['excel_output'], config['parquet_output'],
+                        config['stream_output']) if _]) > 1:
+        eprint("Improper usage: Use only one of -e, --parquet-output, and "
+               "--stream-output.")
+        print_usage()
+        sys.exit(2)
+
+    if checkpoint and (config['stream_output'] or config['build_index']
+                       or config['watch']):
+        eprint("Improper usage: --resume and --checkpoint-interval don't apply to "
+               "--stream-output, --jsonl-output, --build-index, --update-index, "
+               "or --watch.")
+        print_usage()
+        sys.exit(2)
+    if checkpoint:
+        config['checkpoint_dir'] = config['output_dir']
+
+    if config['shard'] and (config['build_index'] or config['watch']):
+        eprint("Improper usage: --shard only applies to scans, not to "
+               "--build-index, --update-index, or --watch.")
+        print_usage()
+        sys.exit(2)
+
+    if config['offsets'] and config['match_mode'] == 'files':
+        eprint("Improper usage: Use --offsets or --files-only, not both.")
+        print_usage()
+        sys.exit(2)
+
+    if not config['search_strings'] and not config['build_index']:
         eprint("You must specify at least one search string, either via the -s "
                "<search-strings-file> option or as positional commandline "
                "argument.")
@@ -220,6 +822,27 @@ def main():
         sys.exit(2)
     make_dir_safe(configs['temp_dir'], True)
 
+    if configs['merge']:
+        LOGGER.setLevel(configs['log_level'])
+        for path in configs['merge_files']:
+            if not os.path.exists(path):
+                eprint("The <partial-results> file, {0}, doesn't exist.".format(path))
+                sys.exit(2)
+        try:
+            header, rows = merge_results(configs['merge_files'])
+        except ValueError as err:
+            eprint(str(err))
+            sys.exit(2)
+        if configs['stream_output']:
+            # --jsonl-output and --stream-output choose the format of the report.
+            with Output.get_sink(configs) as sink:
+                sink.open(header)
+                for row in rows:
+                    sink.write(row)
+        else:
+            Output.get_output(header, rows, configs).output()
+        return
+
     if configs['search_strings_file']:
         if not os.path.exists(configs['search_strings_file']):
             eprint("-s <search-strings-file> argument, {0}, doesn't "
@@ -242,14 +865,43 @@ def main():
         eprint("The <scan-root> , {0}, doesn't exist.".format(configs['scan_root']))
         sys.exit(2)
 
+    if configs['watch'] and not os.path.isdir(configs['scan_root']):
+        eprint("--watch needs a <scan-root> directory, not {0}.".format(
+            configs['scan_root']))
+        sys.exit(2)
+
     # Setup the logger
     LOGGER.setLevel(configs['log_level'])
     LOGGER.info('Startup')
 
     scanner = Scanner(configs)
-    scanner.scan()
-    output = Output.get_output(scanner.HEADERS, scanner.get_results(), configs)
-    output.output()
+    if configs['update_index']:
+        scanner.update_index()
+        return
+    if configs['build_index']:
+        scanner.build_index()
+        return
+    if configs['watch']:
+        # Close the output file cleanly when the daemon is stopped.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        sink_configs = dict(configs, stream_output=configs['stream_output'] or 'csv',
+                            flush_interval=0)
+        changes = watch(configs['scan_root'],
+                        scanner.exclusions.excluded if scanner.exclusions else None,
+                        configs['walk_threads'], configs['debounce'],
+                        configs['poll_interval'])
+        try:
+            scanner.watch(changes, new_sink=lambda: Output.get_sink(sink_configs),
+                          roll_interval=configs['roll_interval'])
+        except KeyboardInterrupt:
+            LOGGER.info('Stopped watching')
+        return
+    if configs['stream_output']:
+        scanner.scan(Output.get_sink(configs))
+    else:
+        scanner.scan()
+        output = Output.get_output(scanner.HEADERS, scanner.get_results(), configs)
+        output.output()
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,150 @@
+"""Persistent cache of scan results, so that unchanged files are never rescanned."""
+
+# Import Python standard modules.
+import hashlib
+import json
+import os
+import sqlite3
+
+# Import 3rd party modules.
+
+# Import project modules.
+
+# Define constants.
+# Commit to disk after this many cache writes.
+COMMIT_INTERVAL = 1000
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT,
+    matches TEXT NOT NULL,
+    PRIMARY KEY (path, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS contents (
+    digest TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    matches TEXT NOT NULL,
+    PRIMARY KEY (digest, fingerprint)
+);
+"""
+
+
+def fingerprint(search_strings, **options):
+    """
+    Calculate a key for a set of search strings and matching options.
+
+    Cached matches are only reused by scans with the same fingerprint.
+
+    Args:
+        search_strings -- The search strings.
+        options -- Any settings that change which strings match a file.
+    """
+    key = json.dumps([sorted(search_strings), sorted(options.items())])
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def _load_matches(text):
+    """
+    Decode stored matches. JSON has no tuples, so the (search string,
+    offset, line, context) matches of an offsets scan come back as lists.
+    """
+    return [
+        tuple(matched) if isinstance(matched, list) else matched
+        for matched in json.loads(text)
+    ]
+
+
+class ScanCache:
+    """
+    An SQLite database of the search strings matched by each file.
+
+    Regular files are looked up by path, size, and modification time; any
+    content, including archive members, is also looked up by digest.
+    """
+
+    def __init__(self, path, key):
+        """
+        Open (or create) the cache.
+
+        Args:
+            path -- The SQLite database file.
+            key -- The fingerprint() of the current scan.
+        """
+        self.path = path
+        self.fingerprint = key
+        # Parallel scans open one connection per worker process.
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.pending = 0
+
+    def get_file(self, path, stat):
+        """
+        Look up a regular file.
+
+        Args:
+            path -- The file path.
+            stat -- The file's current os.stat() result.
+
+        Returns:
+            A (digest, matched strings) tuple, or None if the file is new or changed.
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, digest, matches FROM files "
+            "WHERE path = ? AND fingerprint = ?",
+            (os.path.abspath(path), self.fingerprint),
+        ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2], _load_matches(row[3])
+
+    def put_file(self, path, stat, digest, matched_strings):
+        """Remember the matches for a regular file, as of its os.stat() result."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                os.path.abspath(path),
+                self.fingerprint,
+                stat.st_size,
+                stat.st_mtime_ns,
+                digest,
+                json.dumps(matched_strings),
+            ),
+        )
+        self._written()
+
+    def get_content(self, digest):
+        """Return the matched strings for content with digest, or None."""
+        row = self.connection.execute(
+            "SELECT matches FROM contents WHERE digest = ? AND fingerprint = ?",
+            (digest, self.fingerprint),
+        ).fetchone()
+        return None if row is None else _load_matches(row[0])
+
+    def put_content(self, digest, matched_strings):
+        """Remember the matches for content with digest."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO contents VALUES (?, ?, ?)",
+            (digest, self.fingerprint, json.dumps(matched_strings)),
+        )
+        self._written()
+
+    def _written(self):
+        """Count a write, committing every COMMIT_INTERVAL writes."""
+        self.pending += 1
+        if self.pending >= COMMIT_INTERVAL:
+            self.commit()
+
+    def commit(self):
+        """Write pending changes to disk."""
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        """Commit and close the database."""
+        self.commit()
+        self.connection.close()
@@ -0,0 +1,110 @@
+"""Periodic checkpoints of a running scan, so that an interrupted scan can resume."""
+
+# Import Python standard modules.
+import json
+import os
+import sqlite3
+
+# Import 3rd party modules.
+
+# Import project modules.
+
+# Define constants.
+# Default number of seconds between checkpoints.
+CHECKPOINT_INTERVAL = 60.0
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    seq INTEGER PRIMARY KEY,
+    row TEXT NOT NULL
+);
+"""
+
+
+class Checkpoint:
+    """
+    An SQLite database of the progress of a scan: how far the walk has got,
+    the scan statistics, and the result rows found so far.
+
+    Rows are appended as they are found, and committed together with the walk
+    position, so that the database always holds a consistent state, however
+    the scan is interrupted.
+    """
+
+    def __init__(self, path, key):
+        """
+        Open (or create) the checkpoint.
+
+        Args:
+            path -- The SQLite database file.
+            key -- A fingerprint of the scan root, search strings, and options.
+                A checkpoint of a scan with another key is discarded.
+        """
+        self.path = path
+        self.key = key
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.pending = []
+
+    def load(self):
+        """
+        Read the last checkpoint.
+
+        Returns:
+            A (position, thing, stats, rows) tuple, where position counts the
+            files and archives on disk fully scanned, in walk order, thing is
+            the last of them, and rows are the result rows found so far, in
+            order. None if there is no checkpoint of this scan.
+        """
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        if meta.get("key") != self.key:
+            self.clear()
+            return None
+        rows = [
+            tuple(json.loads(row))
+            for (row,) in self.connection.execute("SELECT row FROM rows ORDER BY seq")
+        ]
+        return int(meta["position"]), meta["thing"], json.loads(meta["stats"]), rows
+
+    def clear(self):
+        """Forget any checkpoint."""
+        self.connection.execute("DELETE FROM meta")
+        self.connection.execute("DELETE FROM rows")
+        self.connection.commit()
+        self.pending = []
+
+    def add(self, row):
+        """Remember a result row, to be written at the next save()."""
+        self.pending.append(json.dumps(row))
+
+    def save(self, position, thing, stats):
+        """
+        Write a checkpoint.
+
+        Args:
+            position -- The number of files and archives on disk fully scanned.
+            thing -- The last of them.
+            stats -- The scan statistics so far.
+        """
+        self.connection.executemany(
+            "INSERT INTO rows (row) VALUES (?)", ((row,) for row in self.pending)
+        )
+        self.pending = []
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            (
+                ("key", self.key),
+                ("position", str(position)),
+                ("thing", thing),
+                ("stats", json.dumps(stats)),
+            ),
+        )
+        self.connection.commit()
+
+    def remove(self):
+        """Delete the checkpoint, once the scan is complete."""
+        self.connection.close()
+        os.remove(self.path)
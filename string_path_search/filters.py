@@ -0,0 +1,277 @@
+"""Decide which files are worth matching, before their content is read."""
+
+# Import Python standard modules.
+import re
+
+# Import 3rd party modules.
+
+# Import project modules.
+
+# Define constants.
+# Number of bytes at the start of a file that are sniffed for binary content.
+SNIFF_SIZE = 4096
+# Files whose sniffed bytes are more than this fraction NUL are binary.
+BINARY_NUL_RATIO = 0.01
+# Signatures of images, audio and video, compressed streams, and executables.
+BINARY_MAGIC = (
+    b"\x89PNG\r\n\x1a\n",
+    b"\xff\xd8\xff",
+    b"GIF87a",
+    b"GIF89a",
+    b"ID3",
+    b"OggS",
+    b"fLaC",
+    b"RIFF",
+    b"\x1a\x45\xdf\xa3",
+    b"\x1f\x8b",
+    b"BZh",
+    b"\xfd7zXZ\x00",
+    b"7z\xbc\xaf\x27\x1c",
+    b"\x28\xb5\x2f\xfd",
+    b"\x7fELF",
+    b"\xfe\xed\xfa\xce",
+    b"\xfe\xed\xfa\xcf",
+    b"\xce\xfa\xed\xfe",
+    b"\xcf\xfa\xed\xfe",
+)
+# Signatures found after the leading length of ISO media (MP4, MOV) files.
+BINARY_MAGIC_AT_4 = (b"ftyp",)
+# Byte order marks of UTF-16 text, which is mostly NULs but still text.
+UTF16_BOMS = (b"\xff\xfe", b"\xfe\xff")
+# Characters with a special meaning in exclusion patterns.
+GLOB_CHARS = frozenset("*?[\\/")
+
+
+def _translate(pattern):
+    """
+    Translate a gitignore-style pattern into a regular expression that
+    matches relative paths, with directories written with a trailing "/".
+
+    Args:
+        pattern -- The pattern. A pattern containing "/" (other than a
+            trailing "/", which restricts it to directories) is matched
+            against the whole path, otherwise it matches any base name.
+
+    Returns:
+        The regular expression, as a string.
+    """
+    dirs_only = pattern.endswith("/")
+    pattern = pattern.rstrip("/")
+    regex = "" if "/" in pattern else "(?:.*/)?"
+    segments = pattern.lstrip("/").split("/")
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == "**":
+            regex += ".*" if last else "(?:.*/)?"
+            continue
+        j = 0
+        while j < len(segment):
+            char = segment[j]
+            j += 1
+            if char == "*":
+                regex += "[^/]*"
+            elif char == "?":
+                regex += "[^/]"
+            elif char == "\\" and j < len(segment):
+                regex += re.escape(segment[j])
+                j += 1
+            elif char == "[" and segment.find("]", j + 1) > 0:
+                # A "]" straight after the "[" is part of the set.
+                end = segment.find("]", j + 1)
+                chars = segment[j:end]
+                if chars.startswith(("!", "^")):
+                    chars = "^" + chars[1:]
+                regex += "[" + chars.replace("\\", "\\\\") + "]"
+                j = end + 1
+            else:
+                regex += re.escape(char)
+        if not last:
+            regex += "/"
+    return regex + ("/" if dirs_only else "/?")
+
+
+class Exclusions:
+    """
+    Gitignore-style exclusion patterns, compiled once and matched against
+    paths relative to the scan root or to the root of an archive.
+
+    Plain names are looked up in a set; everything else is matched by a
+    single regular expression. Matching ignores case. Negated (!) patterns
+    are not supported.
+    """
+
+    def __init__(self, patterns=()):
+        """
+        Compile the patterns.
+
+        Args:
+            patterns -- Base names such as "Value.java", or gitignore-style
+                patterns such as "*.min.js", "build/", "/docs/api", or
+                "**/node_modules/**". Blank patterns and comments starting
+                with # are ignored.
+        """
+        self.names = set()
+        regexes = []
+        for pattern in patterns:
+            pattern = pattern.strip()
+            if not pattern or pattern.startswith("#"):
+                continue
+            if GLOB_CHARS.isdisjoint(pattern):
+                self.names.add(pattern.casefold())
+            else:
+                regexes.append(_translate(pattern))
+        self.regex = None
+        if regexes:
+            self.regex = re.compile(
+                "(?:{0})\\Z".format("|".join(regexes)), re.IGNORECASE | re.DOTALL
+            )
+
+    def __bool__(self):
+        """True if anything could be excluded."""
+        return bool(self.names or self.regex)
+
+    def excluded(self, path, is_dir=False):
+        """
+        Decide whether to exclude a file or directory, once its parent
+        directories have been found not to be excluded.
+
+        Args:
+            path -- The "/"-separated path, relative to the scan root.
+            is_dir -- True if path is a directory, whose contents are then
+                excluded too.
+
+        Returns:
+            True if path is excluded.
+        """
+        if path.rpartition("/")[2].casefold() in self.names:
+            return True
+        if self.regex is None:
+            return False
+        return bool(self.regex.match(path + "/" if is_dir else path))
+
+    def excluded_member(self, name):
+        """
+        Decide whether to exclude an archive member. Archives list members by
+        their full path, so every parent directory is checked too.
+
+        Args:
+            name -- The member's "/"-separated path within its archive.
+
+        Returns:
+            True if the member, or any of its parent directories, is excluded.
+        """
+        if not self:
+            return False
+        # tar members are often named ./path.
+        while name.startswith(("./", "/")):
+            name = name[2:] if name.startswith("./") else name[1:]
+        parts = name.split("/")
+        for i in range(1, len(parts)):
+            if self.excluded("/".join(parts[:i]), is_dir=True):
+                return True
+        return self.excluded(name)
+
+
+class Prefilter:
+    """
+    Skip files by size, extension, or the look of their first few bytes.
+
+    Sizes and names come from directory entries and archive indexes, so
+    files that fail those tests are never opened.
+    """
+
+    def __init__(
+        self,
+        min_size=None,
+        max_size=None,
+        include_extensions=(),
+        exclude_extensions=(),
+        skip_binary=False,
+    ):
+        """
+        Set it up.
+
+        Args:
+            min_size -- Skip files smaller than this many bytes (Default: None).
+            max_size -- Skip files larger than this many bytes (Default: None).
+            include_extensions -- Only match files with one of these
+                extensions, e.g. ".c" or ".tar.gz" (Default: any extension).
+            exclude_extensions -- Skip files with any of these extensions
+                (Default: None).
+            skip_binary -- Skip files whose first SNIFF_SIZE bytes look like
+                binary content (Default: False).
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.include_extensions = self._extensions(include_extensions)
+        self.exclude_extensions = self._extensions(exclude_extensions)
+        self.skip_binary = skip_binary
+
+    @staticmethod
+    def _extensions(extensions):
+        """Casefold extensions, and make sure that each starts with a dot."""
+        return tuple(
+            extension.casefold() if extension.startswith(".") else "." + extension.casefold()
+            for extension in extensions
+            if extension
+        )
+
+    @property
+    def active(self):
+        """True if any file could be skipped."""
+        return bool(
+            self.min_size is not None
+            or self.max_size is not None
+            or self.include_extensions
+            or self.exclude_extensions
+            or self.skip_binary
+        )
+
+    def skip(self, name, size_of):
+        """
+        Decide whether to skip a file by its name and size.
+
+        Args:
+            name -- The file name.
+            size_of -- A function returning the file size in bytes. It is
+                only called if a size limit is set.
+
+        Returns:
+            "extension" or "size" if the file should be skipped, otherwise None.
+        """
+        name = name.casefold()
+        if self.include_extensions and not name.endswith(self.include_extensions):
+            return "extension"
+        if self.exclude_extensions and name.endswith(self.exclude_extensions):
+            return "extension"
+        if self.min_size is not None or self.max_size is not None:
+            size = size_of()
+            if self.min_size is not None and size < self.min_size:
+                return "size"
+            if self.max_size is not None and size > self.max_size:
+                return "size"
+        return None
+
+    @staticmethod
+    def binary(head):
+        """
+        Sniff the start of a file for binary content.
+
+        Args:
+            head -- Up to SNIFF_SIZE bytes from the start of the file.
+
+        Returns:
+            True if head starts with a BINARY_MAGIC signature, or is more than
+            BINARY_NUL_RATIO NUL bytes and doesn't look like UTF-16 text.
+        """
+        if not head or head.startswith(UTF16_BOMS):
+            return False
+        if head.startswith(BINARY_MAGIC) or head[4:8].startswith(BINARY_MAGIC_AT_4):
+            return True
+        if head.count(b"\0") <= BINARY_NUL_RATIO * len(head):
+            return False
+        # Mostly-ASCII text encoded as UTF-16 without a byte order mark has
+        # NULs in nearly every other byte, and hardly anywhere else.
+        even, odd = sorted((head[0::2].count(b"\0"), head[1::2].count(b"\0")))
+        utf16 = odd >= 0.9 * (len(head) // 2) and even <= BINARY_NUL_RATIO * len(head)
+        return not utf16
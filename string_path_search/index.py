@@ -0,0 +1,390 @@
+"""Persistent trigram index of a scan root, so that repeat searches only read likely matches."""
+
+# Import Python standard modules.
+from array import array
+import codecs
+import collections
+import itertools
+import operator
+import os
+import sqlite3
+import sys
+import unicodedata
+import zlib
+
+# Import 3rd party modules.
+
+# Import project modules.
+from .utils import new_digest
+
+# Define constants.
+# Bumped whenever SCHEMA changes, so that older indexes are rebuilt.
+INDEX_VERSION = 2
+# Digest of each file's content, which an update compares to find changed
+# archive members.
+INDEX_DIGEST = "md5"
+# Number of bytes of a file that are read and indexed at a time.
+INDEX_BLOCK_SIZE = 2 ** 22
+# Write the postings held in memory to disk once there are this many.
+INDEX_BATCH_SIZE = 2 ** 23
+# Most parameters in one SQLite statement.
+SQL_VARIABLES = 500
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS things (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    files INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    thing TEXT NOT NULL,
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS files_thing ON files (thing);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram INTEGER NOT NULL,
+    batch INTEGER NOT NULL,
+    ids BLOB NOT NULL,
+    PRIMARY KEY (trigram, batch)
+) WITHOUT ROWID;
+"""
+
+
+def normalized_bytes(text):
+    """Normalize and casefold text as the index does, and encode it as UTF-8."""
+    return unicodedata.normalize("NFKD", text).casefold().encode("utf-8")
+
+
+def trigrams(data):
+    """
+    Collect the trigrams of data, each packed into a little-endian integer.
+
+    Python is slow at slicing out every trigram, so the data is cast into
+    4-byte words at each of the four alignments instead, and the trigrams
+    are taken from the distinct words.
+
+    Args:
+        data -- A bytes object.
+
+    Returns:
+        A set of integers.
+    """
+    view = memoryview(data)
+    words = set()
+    for start in range(4):
+        end = start + (len(data) - start) // 4 * 4
+        words.update(view[start:end].cast("I"))
+    if sys.byteorder == "big":
+        words = {int.from_bytes(word.to_bytes(4, "big"), "little") for word in words}
+    found = set(map((0xFFFFFF).__and__, words))
+    found.update(map((8).__rrshift__, words))
+    if len(data) >= 3:
+        found.add(int.from_bytes(data[-3:], "little"))
+    return found
+
+
+def file_digest(fid):
+    """Return the INDEX_DIGEST of a file object's remaining bytes."""
+    digest = new_digest(INDEX_DIGEST)
+    for block in iter(lambda: fid.read(INDEX_BLOCK_SIZE), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def file_trigrams(fid, digest=None):
+    """
+    Read a file a block at a time and collect the trigrams of its decoded,
+    normalized, and casefolded text.
+
+    ASCII text encoded as UTF-16 decodes with a NUL between characters, so
+    the trigrams of text with NULs are also collected with the NULs removed.
+
+    Args:
+        fid -- A file object opened in binary mode.
+        digest -- A new_digest() object to update with the file's bytes as
+            they are read (Default: None).
+
+    Returns:
+        A set of integers; see trigrams().
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    found = set()
+    carry = b""
+    stripped_carry = b""
+    nuls = False
+    while True:
+        block = fid.read(INDEX_BLOCK_SIZE)
+        if digest is not None:
+            digest.update(block)
+        text = normalized_bytes(decoder.decode(block, final=not block))
+        if text:
+            # Keep the trigrams that span blocks.
+            data = carry + text
+            found.update(trigrams(data))
+            carry = data[-2:]
+            nuls = nuls or b"\0" in text
+            if nuls:
+                data = stripped_carry + text.replace(b"\0", b"")
+                found.update(trigrams(data))
+                stripped_carry = data[-2:]
+            else:
+                stripped_carry = carry
+        if not block:
+            return found
+
+
+def _encode_ids(ids):
+    """Compress an increasing list of file ids, as zlib-compressed deltas."""
+    deltas = array("I", map(operator.sub, ids, itertools.chain((0,), ids)))
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return zlib.compress(deltas.tobytes())
+
+
+def _decode_ids(blob):
+    """Reverse _encode_ids()."""
+    deltas = array("I", zlib.decompress(blob))
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    return itertools.accumulate(deltas)
+
+
+class TrigramIndex:
+    """
+    An SQLite database of the files under a scan root, and of the files that
+    contain each trigram of normalized, casefolded text.
+
+    Files are recorded by the name and location that a scan reports, under
+    the file or archive on disk (the "thing") that holds them, along with the
+    thing's size and modification time, so that changed things are noticed.
+
+    Postings are only ever appended to. Files that are changed or removed by
+    an update are tombstoned instead, and left out of query results until
+    the index is next rebuilt.
+    """
+
+    def __init__(self, path, key):
+        """
+        Open (or create) the index.
+
+        Args:
+            path -- The SQLite database file.
+            key -- A fingerprint of the walk options, such as exclusions,
+                that decide which files are indexed.
+        """
+        self.path = path
+        self.key = key
+        # Parallel scans look things up from the thread feeding the workers,
+        # one thread at a time.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        if self._version() != INDEX_VERSION:
+            self._drop()
+        self.connection.executescript(SCHEMA)
+        self.postings = collections.defaultdict(lambda: array("I"))
+        self.pending = 0
+        # Updates carry on numbering from the existing files and batches.
+        self.batch = self.connection.execute(
+            "SELECT COALESCE(MAX(batch) + 1, 0) FROM postings"
+        ).fetchone()[0]
+        self.next_id = self.connection.execute(
+            "SELECT COALESCE(MAX(id) + 1, 0) FROM files"
+        ).fetchone()[0]
+        self.cache = {}
+
+    def _version(self):
+        """Return the INDEX_VERSION that the database was built with, if any."""
+        try:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return int(row[0]) if row else None
+
+    def _drop(self):
+        """Drop the tables of an older (or unfinished) index."""
+        for table in ("meta", "things", "files", "postings"):
+            self.connection.execute("DROP TABLE IF EXISTS {0}".format(table))
+
+    # Building.
+
+    def clear(self):
+        """Forget everything, before the index is rebuilt."""
+        for table in ("meta", "things", "files", "postings"):
+            self.connection.execute("DELETE FROM {0}".format(table))
+        self.postings.clear()
+        self.pending = self.batch = self.next_id = 0
+
+    def add_thing(self, thing, stat, files):
+        """Record a file or archive on disk, as of its os.stat() result."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO things VALUES (?, ?, ?, ?)",
+            (thing, stat.st_size, stat.st_mtime_ns, files),
+        )
+
+    def add_file(self, thing, name, location, digest, found):
+        """
+        Record a file, and the trigrams of its text.
+
+        Args:
+            thing -- The file or archive on disk that holds the file.
+            name -- The file name, as a scan reports it.
+            location -- The file location, likewise.
+            digest -- The INDEX_DIGEST of the file, as a hexadecimal string.
+            found -- The file_trigrams() of the file.
+        """
+        file_id = self.next_id
+        self.next_id += 1
+        self.connection.execute(
+            "INSERT INTO files (id, thing, name, location, digest) VALUES (?, ?, ?, ?, ?)",
+            (file_id, thing, name, location, digest),
+        )
+        for trigram in found:
+            self.postings[trigram].append(file_id)
+        self.pending += len(found)
+        if self.pending >= INDEX_BATCH_SIZE:
+            self._flush()
+
+    def entries(self, thing):
+        """
+        List the files indexed under a file or archive on disk.
+
+        Returns:
+            A dictionary of lists of (id, digest) tuples, by (name, location).
+        """
+        entries = collections.defaultdict(list)
+        for file_id, name, location, digest in self.connection.execute(
+            "SELECT id, name, location, digest FROM files WHERE thing = ? AND removed = 0",
+            (thing,),
+        ):
+            entries[(name, location)].append((file_id, digest))
+        return entries
+
+    def things(self):
+        """Return the paths of the files and archives on disk in the index."""
+        return [path for (path,) in self.connection.execute("SELECT path FROM things")]
+
+    def remove_file(self, file_id):
+        """Tombstone a file."""
+        self.connection.execute("UPDATE files SET removed = 1 WHERE id = ?", (file_id,))
+
+    def remove_thing(self, thing):
+        """
+        Forget a file or archive on disk, and tombstone the files under it.
+
+        Returns:
+            The number of files tombstoned.
+        """
+        removed = self.connection.execute(
+            "UPDATE files SET removed = 1 WHERE thing = ? AND removed = 0", (thing,)
+        ).rowcount
+        self.connection.execute("DELETE FROM things WHERE path = ?", (thing,))
+        return removed
+
+    def _flush(self):
+        """Write the postings held in memory as a new batch."""
+        self.connection.executemany(
+            "INSERT INTO postings VALUES (?, ?, ?)",
+            (
+                (trigram, self.batch, _encode_ids(ids))
+                for trigram, ids in self.postings.items()
+            ),
+        )
+        self.postings.clear()
+        self.pending = 0
+        self.batch += 1
+
+    def finish(self, scan_root):
+        """Write the remaining postings, and mark the index as complete."""
+        self._flush()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+            (
+                ("scan_root", os.path.abspath(scan_root)),
+                ("key", self.key),
+                ("version", str(INDEX_VERSION)),
+            ),
+        )
+        self.connection.commit()
+
+    # Querying.
+
+    def usable(self, scan_root):
+        """True if the index is complete, and was built the same way for scan_root."""
+        meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+        return meta.get("key") == self.key and meta.get("scan_root") == os.path.abspath(
+            scan_root
+        )
+
+    def files(self, thing, stat):
+        """
+        Look up a file or archive on disk.
+
+        Returns:
+            The number of files indexed under it, or None if it is new or changed.
+        """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, files FROM things WHERE path = ?", (thing,)
+        ).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            return None
+        return row[2]
+
+    def _posting(self, trigram):
+        """Return the set of ids of the files with a trigram."""
+        if trigram not in self.cache:
+            ids = set()
+            for (blob,) in self.connection.execute(
+                "SELECT ids FROM postings WHERE trigram = ?", (trigram,)
+            ):
+                ids.update(_decode_ids(blob))
+            self.cache[trigram] = ids
+        return self.cache[trigram]
+
+    def candidates(self, terms):
+        """
+        Find the files that may contain any of terms.
+
+        Args:
+            terms -- Strings that a match must contain. None stands for a
+                search string that has no such string.
+
+        Returns:
+            A dictionary of the (name, location) tuples of the candidate
+            files under each thing, or None if a term is too short for the
+            index to rule out any file.
+        """
+        ids = set()
+        for term in terms:
+            term_trigrams = trigrams(normalized_bytes(term)) if term else None
+            if not term_trigrams:
+                return None
+            # Intersect the shortest postings first.
+            postings = sorted(map(self._posting, term_trigrams), key=len)
+            ids.update(postings[0].intersection(*postings[1:]))
+        wanted = collections.defaultdict(set)
+        ids = sorted(ids)
+        for start in range(0, len(ids), SQL_VARIABLES):
+            chunk = ids[start : start + SQL_VARIABLES]
+            for thing, name, location in self.connection.execute(
+                "SELECT thing, name, location FROM files "
+                "WHERE removed = 0 AND id IN ({0})".format(
+                    ", ".join("?" * len(chunk))
+                ),
+                chunk,
+            ):
+                wanted[thing].add((name, location))
+        return wanted
+
+    def close(self):
+        """Commit and close the database."""
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,587 @@
+"""Multi-string matching engines used by the Scanner."""
+
+# Import Python standard modules.
+import codecs
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+
+# Import 3rd party modules.
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Import project modules.
+
+# Define constants.
+MATCH_ENGINES = ("auto", "aho-corasick", "trie", "substring")
+# Below this many search strings, a plain substring loop beats building an
+# automaton.
+AUTO_ENGINE_THRESHOLD = 100
+# Literals shorter than this don't rule out enough text to be worth a prefilter.
+REGEX_MIN_LITERAL = 3
+# Regular expression matches longer than this may be missed when they
+# straddle two pieces of a MatchStream.
+REGEX_OVERLAP = 4096
+# Characters on either side of a regular expression match that its anchors,
+# word boundaries and lookaround assertions may look at in a MatchStream.
+REGEX_CONTEXT = 256
+# Bytes of a buffer, such as a memory-mapped file, copied at a time when it
+# can't be searched in place.
+WINDOW_SIZE = 2 ** 20
+
+
+class Matcher:
+    """
+    Base class for the matching engines.
+
+    A matcher is compiled once from a list of (needle, search_string) tuples
+    and then searches any number of haystacks. Needles and haystacks may be
+    either str or bytes-like, but must be the same kind. Several search strings
+    may share a needle (e.g. when two strings normalize to the same text).
+    """
+
+    def __init__(self, search_strings):
+        """
+        Compile the search strings.
+
+        Args:
+            search_strings -- A list of (needle, search_string) tuples.
+        """
+        self.needles = []
+        self.search_strings = []
+        indexes = {}
+        for needle, search_string in search_strings:
+            if needle not in indexes:
+                indexes[needle] = len(self.needles)
+                self.needles.append(needle)
+                self.search_strings.append([])
+            self.search_strings[indexes[needle]].append(search_string)
+        self.indexes = indexes
+        self.longest = max((len(needle) for needle in self.needles), default=0)
+        # Elements on either side of a match that decide whether it matches.
+        self.context = 0
+        # An empty needle matches any non-empty haystack; the automatons skip it.
+        self.empty = next(
+            (index for index, needle in enumerate(self.needles) if not needle), None
+        )
+
+    def iter_matches(self, haystack):
+        """
+        Generate an (end, index) tuple for each needle occurrence in haystack.
+
+        Args:
+            haystack -- The text to search.
+        """
+        raise NotImplementedError
+
+    def iter_spans(self, haystack):
+        """
+        Generate a (start, end, index) tuple for each needle occurrence in
+        haystack. The occurrences of each needle come in order.
+
+        Args:
+            haystack -- The text to search.
+        """
+        if haystack and self.empty is not None:
+            yield 0, 0, self.empty
+        for end, index in self.iter_matches(haystack):
+            yield end - len(self.needles[index]), end, index
+
+    def find(self, haystack, first=False):
+        """
+        Generator method that yields the search strings found in haystack.
+
+        Each search string is yielded at most once, in the order it was given to
+        the constructor.
+
+        Args:
+            haystack -- The text to search.
+            first -- Stop at the first needle found (Default: False).
+        """
+        yield from self.strings(sorted(self.find_indexes(haystack, first=first)))
+
+    def find_indexes(self, haystack, found=None, first=False):
+        """
+        Collect the indexes of the needles found in haystack.
+
+        Stops early once every needle has been found or, with first, once any
+        needle has.
+
+        Args:
+            haystack -- The text to search.
+            found -- A set of needle indexes to add to (Default: a new set).
+            first -- Stop at the first needle found (Default: False).
+
+        Returns:
+            The set of found needle indexes.
+        """
+        if found is None:
+            found = set()
+        if haystack and self.empty is not None:
+            found.add(self.empty)
+        if len(found) == len(self.needles) or (first and found):
+            return found
+        for _, index in self.iter_matches(haystack):
+            found.add(index)
+            if first or len(found) == len(self.needles):
+                break
+        return found
+
+    def find_window(self, window, pos, final, found, first=False):
+        """
+        Collect the indexes of the needles found in a window of a MatchStream.
+
+        Args:
+            window -- The piece of the haystack, after the tail of the last one.
+            pos -- The index in window where matches may start; the elements
+                before it are only context for the matches after them.
+            final -- True if window ends the haystack.
+            found -- A set of needle indexes to add to.
+            first -- Stop at the first needle found (Default: False).
+
+        Returns:
+            The set of found needle indexes.
+        """
+        return self.find_indexes(window, found, first)
+
+    def strings(self, indexes):
+        """Generate the distinct search strings for a sequence of needle indexes."""
+        yielded = set()
+        for index in indexes:
+            for search_string in self.search_strings[index]:
+                if search_string not in yielded:
+                    yielded.add(search_string)
+                    yield search_string
+
+
+class SubstringMatcher(Matcher):
+    """
+    Test each needle separately. Cheapest for a handful of search strings.
+
+    str and bytes haystacks are searched with the in operator. Other buffers,
+    such as a memoryview over a memory-mapped file, don't support substring
+    tests, so they are searched with one literal regular expression per needle.
+    """
+
+    def __init__(self, search_strings):
+        super().__init__(search_strings)
+        self._patterns = None
+
+    @property
+    def patterns(self):
+        """The literal regular expressions, compiled on first use."""
+        if self._patterns is None:
+            self._patterns = [re.compile(re.escape(needle)) for needle in self.needles]
+        return self._patterns
+
+    def iter_matches(self, haystack):
+        for index, pattern in enumerate(self.patterns):
+            if not self.needles[index]:
+                continue
+            match = pattern.search(haystack)
+            while match:
+                yield match.end(), index
+                match = pattern.search(haystack, match.start() + 1)
+
+    def find_indexes(self, haystack, found=None, first=False):
+        if found is None:
+            found = set()
+        if isinstance(haystack, (str, bytes)):
+            for index, needle in enumerate(self.needles):
+                if first and found:
+                    break
+                if index not in found and needle in haystack:
+                    found.add(index)
+        else:
+            for index, pattern in enumerate(self.patterns):
+                if first and found:
+                    break
+                if index not in found and pattern.search(haystack):
+                    found.add(index)
+        return found
+
+
+class TrieMatcher(Matcher):
+    """
+    Compile the needles into a single regular expression shaped like a trie.
+
+    The regular expression engine then walks the trie at each position of the
+    haystack, so the cost of a scan grows with the depth of the trie rather
+    than with the number of needles.
+    """
+
+    def __init__(self, search_strings):
+        super().__init__(search_strings)
+        # Build the trie over str keys; bytes needles map 1:1 onto latin-1.
+        is_bytes = any(isinstance(needle, bytes) for needle in self.needles)
+        keys = [
+            needle.decode("latin-1") if is_bytes else needle for needle in self.needles
+        ]
+        trie = {}
+        for index, key in enumerate(keys):
+            if not key:
+                continue
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[None] = index
+        # The regex returns the longest needle starting at a position; any
+        # shorter needles on the same trie path start there too.
+        self.prefixes = []
+        for key in keys:
+            node = trie
+            prefixes = []
+            for char in key[:-1]:
+                node = node[char]
+                if None in node:
+                    prefixes.append(node[None])
+            self.prefixes.append(prefixes)
+        self.pattern = None
+        if trie:
+            source = self._trie_regex(trie)
+            self.pattern = re.compile(source.encode("latin-1") if is_bytes else source)
+
+    @staticmethod
+    def _trie_regex(node):
+        """Convert a trie (sub)tree into regular expression source."""
+        branches = []
+        for char in sorted(key for key in node if key is not None):
+            child = node[char]
+            # Collapse runs of single-child nodes into one literal.
+            literal = char
+            while len(child) == 1 and None not in child:
+                ((char, child),) = child.items()
+                literal += char
+            branch = re.escape(literal)
+            if len(child) > 1:
+                branch += TrieMatcher._trie_regex(child)
+            branches.append(branch)
+        regex = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if None in node:
+            regex = "(?:" + regex + ")?"
+        return regex
+
+    def iter_matches(self, haystack):
+        if not self.pattern:
+            return
+        pos = 0
+        while True:
+            match = self.pattern.search(haystack, pos)
+            if not match:
+                return
+            index = self.indexes[match.group()]
+            for prefix in self.prefixes[index]:
+                yield match.start() + len(self.needles[prefix]), prefix
+            yield match.end(), index
+            pos = match.start() + 1
+
+
+class AhoCorasickMatcher(Matcher):
+    """
+    Aho-Corasick automaton backed by the optional pyahocorasick package.
+
+    pyahocorasick only handles str, so bytes needles and haystacks are mapped
+    1:1 onto latin-1 text. Bytes-like haystacks are decoded WINDOW_SIZE bytes
+    at a time, so that a memory-mapped file is never copied whole.
+    """
+
+    def __init__(self, search_strings):
+        if ahocorasick is None:
+            raise ValueError(
+                "The aho-corasick match engine requires the pyahocorasick package"
+            )
+        super().__init__(search_strings)
+        self.automaton = ahocorasick.Automaton()
+        for index, needle in enumerate(self.needles):
+            if isinstance(needle, bytes):
+                needle = needle.decode("latin-1")
+            if needle:
+                self.automaton.add_word(needle, index)
+        if len(self.automaton):
+            self.automaton.make_automaton()
+
+    def iter_matches(self, haystack):
+        if not len(self.automaton):
+            return
+        if isinstance(haystack, str):
+            for end, index in self.automaton.iter(haystack):
+                yield end + 1, index
+            return
+        # Each window starts far enough back to hold the needles that
+        # straddle the previous one, which only reports those ending in it.
+        overlap = self.longest - 1
+        for offset in range(0, len(haystack), WINDOW_SIZE):
+            start = max(offset - overlap, 0)
+            window = codecs.decode(haystack[start : offset + WINDOW_SIZE], "latin-1")
+            for end, index in self.automaton.iter(window):
+                if start + end + 1 > offset:
+                    yield start + end + 1, index
+
+
+class RegexMatcher(Matcher):
+    """
+    Search for regular expressions in a single pass over the haystack.
+
+    Python's re module tries every alternative of a combined pattern at each
+    position and loses its fast literal prefix search, so an alternation of
+    all the patterns is much slower than searching for each one in turn.
+    Instead, a literal that any match must contain is taken from each pattern
+    where possible, and all of the literals are searched for at once with a
+    multi-string matcher. Only the patterns whose literal occurs, and those
+    without one, are then searched for. With the auto engine and only a few
+    literals, every pattern is simply searched for in turn.
+    """
+
+    def __init__(self, search_strings, ignore_case=False, engine="auto"):
+        """
+        Compile the search strings.
+
+        Args:
+            search_strings -- A list of (pattern, search_string) tuples.
+            ignore_case -- Match without regard to case, with re.IGNORECASE.
+                The haystack is expected not to be casefolded, so that a
+                pattern still matches its own text (Default: False).
+            engine -- The engine for the literal prefilter, one of
+                MATCH_ENGINES (Default: auto).
+
+        Raises:
+            ValueError -- If a pattern isn't a valid regular expression.
+        """
+        super().__init__(search_strings)
+        self.ignore_case = ignore_case
+        self.patterns = []
+        for needle in self.needles:
+            try:
+                self.patterns.append(
+                    re.compile(needle, re.IGNORECASE if ignore_case else 0)
+                )
+            except re.error as exc:
+                raise ValueError(
+                    "Invalid regular expression {0}: {1}".format(needle, exc)
+                ) from exc
+        self.longest = REGEX_OVERLAP
+        self.context = REGEX_CONTEXT
+        literals = []
+        self.unfiltered = []
+        for index, needle in enumerate(self.needles):
+            literal = self._required_literal(needle, ignore_case)
+            if literal:
+                literals.append((literal, index))
+            else:
+                self.unfiltered.append(index)
+        self.prefilter = None
+        if engine == "auto" and len(literals) < AUTO_ENGINE_THRESHOLD:
+            # re's own literal prefix search makes a handful of separate
+            # searches faster than a prefilter.
+            self.unfiltered = list(range(len(self.needles)))
+        elif literals:
+            self.prefilter = get_matcher(literals, engine)
+
+    @staticmethod
+    def _required_literal(pattern, ignore_case):
+        """
+        Find the longest run of literal characters at the top level of a
+        pattern, which every match must contain.
+
+        Args:
+            pattern -- A regular expression.
+            ignore_case -- True if the literal is searched for in casefolded
+                text.
+
+        Returns:
+            The literal, or None if the pattern has none that is long enough.
+        """
+        parsed = sre_parse.parse(pattern)
+        if parsed.state.flags & re.IGNORECASE and not ignore_case:
+            # (?i) makes the literal match text of either case.
+            return None
+        best = run = ""
+        for opcode, argument in parsed:
+            char = chr(argument) if opcode == sre_parse.LITERAL else None
+            if char is not None and ignore_case:
+                # Only ASCII has a single, predictable casefolded form.
+                char = char.lower() if char.isascii() else None
+            if char is None:
+                run = ""
+                continue
+            run += char
+            if len(run) > len(best):
+                best = run
+        return best if len(best) >= REGEX_MIN_LITERAL else None
+
+    def iter_matches(self, haystack):
+        for index, pattern in enumerate(self.patterns):
+            if not self.needles[index]:
+                continue
+            for match in pattern.finditer(haystack):
+                yield match.end(), index
+
+    def iter_spans(self, haystack):
+        for index in sorted(self._candidates(haystack)):
+            if not self.needles[index]:
+                continue
+            for match in self.patterns[index].finditer(haystack):
+                yield match.start(), match.end(), index
+
+    def _candidates(self, haystack):
+        """List the indexes of the patterns that may match haystack."""
+        candidates = list(self.unfiltered)
+        if self.prefilter:
+            if self.ignore_case:
+                # The literals are casefolded, and casefolded text holds them
+                # wherever re.IGNORECASE would match them.
+                haystack = haystack.casefold()
+            candidates.extend(self.prefilter.find(haystack))
+        return candidates
+
+    def find_indexes(self, haystack, found=None, first=False):
+        if found is None:
+            found = set()
+        if not haystack:
+            return found
+        for index in self._candidates(haystack):
+            if first and found:
+                break
+            if index not in found and self.patterns[index].search(haystack):
+                found.add(index)
+        return found
+
+    def find_window(self, window, pos, final, found, first=False):
+        if not window:
+            return found
+        # A match that ends this close to the end of the window may depend on
+        # what follows it, so the next window, or the final one, decides it.
+        end = len(window) if final else len(window) - self.context
+        for index in self._candidates(window):
+            if first and found:
+                break
+            if index in found:
+                continue
+            # Searching from pos, rather than from the start of a slice, lets
+            # ^, \b and lookbehind assertions see the text before pos.
+            match = self.patterns[index].search(window, pos)
+            if match and match.end() <= end:
+                found.add(index)
+        return found
+
+
+class MatchStream:
+    """
+    Search a haystack that arrives piece by piece.
+
+    Each piece is searched together with the tail of the previous one, one
+    element shorter than the longest needle, so needles that straddle two
+    pieces are still found while only one piece is held in memory at a time.
+    With a RegexMatcher, the tail also keeps REGEX_CONTEXT characters on
+    either side, so that a match is only decided once the text around it has
+    been fed; call finish() after the last piece.
+    """
+
+    def __init__(self, matcher, first=False):
+        """
+        Start a new stream.
+
+        Args:
+            matcher -- The Matcher to search with.
+            first -- Stop at the first needle found (Default: False).
+        """
+        self.matcher = matcher
+        self.first = first
+        self.found = set()
+        self.tail = None
+        # The index in tail where matches may start.
+        self.pos = 0
+        # The length of the haystack fed so far.
+        self.position = 0
+
+    @property
+    def done(self):
+        """True once every needle has been found or, with first, any needle."""
+        if self.first and self.found:
+            return True
+        return len(self.found) == len(self.matcher.needles)
+
+    def feed(self, piece):
+        """
+        Search the next piece of the haystack.
+
+        Args:
+            piece -- The next str or bytes-like piece of the haystack.
+        """
+        if not piece or self.done:
+            return
+        window = piece if self.tail is None else self.tail + piece
+        self.matcher.find_window(window, self.pos, False, self.found, self.first)
+        self._keep_tail(window)
+        self.position += len(piece)
+
+    def finish(self):
+        """Search the end of the haystack, after the last piece has been fed."""
+        if self.tail is None or not self.matcher.context or self.done:
+            return
+        self.matcher.find_window(self.tail, self.pos, True, self.found, self.first)
+
+    def _keep_tail(self, window):
+        """Keep the end of window to search with the next piece."""
+        context = self.matcher.context
+        cut = max(len(window) - self.matcher.longest + 1 - 2 * context, 0)
+        self.tail = window[cut:]
+        if cut:
+            self.pos = context
+
+    def iter_spans(self, piece):
+        """
+        Search the next piece of the haystack, and generate a (start, end,
+        index) tuple for each needle occurrence that ends in it, at its
+        position in the whole haystack. The occurrences of each needle come
+        in order.
+
+        Args:
+            piece -- The next str or bytes-like piece of the haystack.
+        """
+        if not piece:
+            return
+        window = piece if self.tail is None else self.tail + piece
+        # Occurrences that end in the tail were found with the last piece.
+        tail = len(window) - len(piece)
+        base = self.position - tail
+        for start, end, index in self.matcher.iter_spans(window):
+            if end > tail or self.tail is None:
+                yield base + start, base + end, index
+        self._keep_tail(window)
+        self.position += len(piece)
+
+    def strings(self):
+        """Generate the distinct search strings found so far."""
+        yield from self.matcher.strings(sorted(self.found))
+
+
+def get_matcher(search_strings, engine="auto"):
+    """
+    Factory method for constructing a matching engine.
+
+    Args:
+        search_strings -- A list of (needle, search_string) tuples.
+        engine -- One of MATCH_ENGINES (Default: auto). "auto" picks
+            substring matching for short lists and an automaton otherwise.
+    """
+    if engine not in MATCH_ENGINES:
+        raise ValueError("Unknown match engine {0}".format(engine))
+    if engine == "auto":
+        if len(search_strings) < AUTO_ENGINE_THRESHOLD:
+            engine = "substring"
+        elif ahocorasick is not None:
+            engine = "aho-corasick"
+        else:
+            engine = "trie"
+    if engine == "aho-corasick":
+        return AhoCorasickMatcher(search_strings)
+    if engine == "trie":
+        return TrieMatcher(search_strings)
+    return SubstringMatcher(search_strings)
@@ -0,0 +1,157 @@
+"""Locate matches within the bytes of a file, for the offset columns of a scan."""
+
+# Import Python standard modules.
+import codecs
+import re
+
+# Import 3rd party modules.
+
+# Import project modules.
+
+# Define constants.
+# Number of bytes examined at a time.
+BLOCK_SIZE = 2 ** 16
+# Runs of whitespace and control characters, squeezed out of context snippets.
+SNIPPET_REGEX = re.compile(r"[\s\x00-\x1f\x7f]+")
+
+
+class LineCounter:
+    """
+    Walk forward through the bytes of a file a block at a time, counting the
+    lines passed, so that large files and memory maps are never copied whole.
+    Offsets must be visited in increasing order.
+    """
+
+    def __init__(self, file_bytes):
+        """
+        Start at the beginning of the file.
+
+        Args:
+            file_bytes -- The content of a file, as a bytes-like object.
+        """
+        self.file_bytes = file_bytes
+        self.pos = 0
+        self.line = 1
+
+    def _block(self, end):
+        """Copy the bytes from pos up to end, at most BLOCK_SIZE of them."""
+        return bytes(self.file_bytes[self.pos : min(end, self.pos + BLOCK_SIZE)])
+
+    def seek(self, offset):
+        """
+        Move forward to offset.
+
+        Returns:
+            The (1-based) number of the line holding offset.
+        """
+        while self.pos < offset:
+            block = self._block(offset)
+            self.line += block.count(b"\n")
+            self.pos += len(block)
+        return self.line
+
+    def next_lines(self, count):
+        """
+        Move forward to the start of the count-th following line.
+
+        Returns:
+            The offset of the start of that line.
+        """
+        while count:
+            block = self._block(len(self.file_bytes))
+            if not block:
+                break
+            newlines = block.count(b"\n")
+            if newlines < count:
+                count -= newlines
+                self.line += newlines
+                self.pos += len(block)
+                continue
+            end = -1
+            for _ in range(count):
+                end = block.find(b"\n", end + 1)
+            self.line += count
+            self.pos += end + 1
+            count = 0
+        return self.pos
+
+
+def byte_span(file_bytes, line_start, start, end, normalize):
+    """
+    Convert the span of a match in the normalized text of a file into a span
+    of the file's bytes.
+
+    Normalization can change the length of the text, and undecodable bytes
+    are dropped, so the bytes of the line are decoded again character by
+    character, with each undecodable byte standing for no text at all.
+
+    Args:
+        file_bytes -- The content of a file, as a bytes-like object.
+        line_start -- The offset in file_bytes of the line the match starts on.
+        start -- The start of the match, relative to the start of its line
+            in the normalized text.
+        end -- The end of the match, likewise.
+        normalize -- The function that normalized the text.
+
+    Returns:
+        A (start, end) tuple of offsets into file_bytes.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="surrogateescape")
+    pos = line_start
+    chars = 0
+    span_start = None
+    for block_start in range(line_start, len(file_bytes), BLOCK_SIZE):
+        block = bytes(file_bytes[block_start : block_start + BLOCK_SIZE])
+        if (
+            span_start is None
+            and chars + len(block) <= start
+            and block.isascii()
+            and not decoder.getstate()[0]
+        ):
+            # ASCII normalizes to the same number of characters.
+            chars += len(block)
+            pos += len(block)
+            continue
+        for char in decoder.decode(block):
+            if "\udc80" <= char <= "\udcff":
+                size, width = 1, 0
+            else:
+                size, width = len(char.encode("utf-8")), len(normalize(char))
+            if span_start is None and chars + width > start:
+                span_start = pos
+                if end <= start:
+                    return span_start, span_start
+            chars += width
+            pos += size
+            if span_start is not None and chars >= end:
+                return span_start, pos
+    if span_start is None:
+        span_start = pos
+    return span_start, pos
+
+
+def snippet(file_bytes, start, end, context):
+    """
+    Decode a match and the bytes around it, for a report.
+
+    Args:
+        file_bytes -- The content of a file, as a bytes-like object.
+        start -- The offset of the match in file_bytes.
+        end -- The offset of the end of the match.
+        context -- The number of bytes to include either side of the match.
+            Only this many bytes of the match itself are included.
+
+    Returns:
+        The text, with line breaks and other control characters replaced by
+        spaces, and without any characters cut in two by the edges.
+    """
+    data = bytes(
+        file_bytes[max(start - context, 0) : min(end, start + context) + context]
+    )
+    # Skip UTF-8 continuation bytes at the start, and leave an incomplete
+    # character at the end undecoded.
+    skip = 0
+    while skip < min(len(data), 3) and 0x80 <= data[skip] < 0xC0:
+        skip += 1
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return SNIPPET_REGEX.sub(" ", decoder.decode(data[skip:])).strip()
@@ -3,29 +3,45 @@
 # Import Python standard modules.
 from abc import abstractmethod
 import codecs
-import csv
-import math
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+import io
+import itertools
+import mmap
+import multiprocessing
 import os
 import re
 import shutil
 import sys
 import tarfile
+import tempfile
+import threading
+import time
 from time import strftime
 import unicodedata
 import zipfile
 
 # Import 3rd party modules.
-import xlsxwriter
-from PIL import Image
 
 # Import project modules.
+from .cache import fingerprint, ScanCache
+from .checkpoint import Checkpoint, CHECKPOINT_INTERVAL
+from .filters import Exclusions, Prefilter, SNIFF_SIZE
+from .index import file_digest, file_trigrams, INDEX_DIGEST, TrigramIndex
+from .matchers import get_matcher, MatchStream, RegexMatcher, WINDOW_SIZE
+from .offsets import byte_span, LineCounter, snippet
+from .shards import shard_of
+from .sinks import CSVSink, ExcelSink, get_sink, ParquetSink
 from .utils import (
-    calculate_file_md5,
-    calculate_md5,
+    calculate_digest,
+    DIGEST_ALGORITHMS,
     LOGGER,
+    LRUCache,
     make_dir_safe,
-    random_string,
+    MemoryBudget,
+    new_digest,
 )
+from .walker import walk_dir
 
 # Define constants.
 DIR_REGEX = re.compile(r"[/]$")
@@ -36,6 +52,31 @@ ARCH_REGEX = re.compile(
     r"\.(?:cab|cpio|ear|jar|rpm|tar|tar.gz|tgz|tar.bzip2"
     r"|tar.bz2|tbz2|tgz|tar.xz|war|zip)$"
 )
+# Search strings with this prefix are regular expressions.
+REGEX_PREFIX = "re:"
+# Encodings searched for when matching ASCII strings against raw bytes.
+BYTE_ENCODINGS = ("utf-8", "utf-16-le")
+# Number of files or archives handed to a worker process at a time.
+PARALLEL_CHUNK_SIZE = 16
+# Upper limit on the number of threads reading files ahead of the matcher.
+PREFETCH_THREADS = 4
+# Default number of bytes that prefetched files may hold in memory.
+PREFETCH_MEMORY = 64 * 2 ** 20
+# Default number of bytes that remembered matches of duplicate content may hold.
+DEDUP_MEMORY = 16 * 2 ** 20
+# Default size above which inner archives are spilled from memory to temp_dir.
+SPOOL_SIZE = 64 * 2 ** 20
+# Default number of occurrences of each search string recorded in each file.
+MAX_OFFSETS = 10
+# Default number of bytes of context recorded either side of an occurrence.
+CONTEXT_BYTES = 40
+# The columns added to each row when occurrences are recorded.
+OFFSET_HEADERS = ("Offset", "Line", "Context")
+# all reports every matching string; any stops at the first string found in
+# each file, and files reports only the matching files.
+MATCH_MODES = ("all", "any", "files")
+# The digest_algorithm that turns hashing off.
+NO_DIGEST = "none"
 
 # pylint: disable=R0902
 # R0902 = too-many-instance-attributes
@@ -51,19 +92,104 @@ class Scanner:
         Parameters:
             configs -- Dictionary of settings populated from the command line by parse_args()
         """
+        self.configs = configs
         self.scan_root = configs["scan_root"]
         self.temp_dir = configs["temp_dir"]
         self.ignore_case = configs["ignore_case"]
+        self.byte_match = configs.get("byte_match", False)
         self.search_strings = []
+        self.byte_strings = []
+        self.regex_strings = []
         for search_string in configs["search_strings"]:
-            normal_string = unicodedata.normalize("NFKD", search_string)
-            if self.ignore_case:
-                normal_string = normal_string.casefold()
-            self.search_strings.append((normal_string, search_string))
-        self.exclusions = configs["exclusions"]
+            if search_string.startswith(REGEX_PREFIX):
+                # Regular expressions are matched against normalized text, but
+                # casefolding could change their meaning (e.g. \S to \s). With
+                # ignore_case, they match text that isn't casefolded either,
+                # with re.IGNORECASE, so that they can match their own text.
+                pattern = unicodedata.normalize(
+                    "NFKD", search_string[len(REGEX_PREFIX) :]
+                )
+                self.regex_strings.append((pattern, search_string))
+                continue
+            if self.byte_match and search_string.isascii():
+                # ASCII strings need neither decoding nor normalization.
+                byte_string = search_string
+                if self.ignore_case:
+                    byte_string = byte_string.lower()
+                for encoding in BYTE_ENCODINGS:
+                    self.byte_strings.append(
+                        (byte_string.encode(encoding), search_string)
+                    )
+                continue
+            self.search_strings.append((self._normalize(search_string), search_string))
+        self.match_engine = configs.get("match_engine", "auto")
+        # Base names and gitignore-style patterns, compiled once.
+        self.exclusions = Exclusions(configs["exclusions"])
         self.scan_archives = configs["scan_archives"]
+        # Files skipped by size, extension, or binary content are never matched.
+        self.prefilter = Prefilter(
+            min_size=configs.get("min_size"),
+            max_size=configs.get("max_size"),
+            include_extensions=configs.get("include_extensions", ()),
+            exclude_extensions=configs.get("exclude_extensions", ()),
+            skip_binary=configs.get("skip_binary", False),
+        )
+        self.spool_size = configs.get("spool_size", SPOOL_SIZE)
+        self.chunk_size = configs.get("chunk_size")
+        self.mmap_threshold = configs.get("mmap_threshold")
+        self.jobs = configs.get("jobs", 1)
+        self.walk_threads = configs.get("walk_threads", 1)
+        # An (index, count) tuple, to only scan one shard of scan_root.
+        self.shard = configs.get("shard")
+        # Checkpoint scans to a file in checkpoint_dir, and maybe resume them.
+        self.checkpoint_dir = configs.get("checkpoint_dir")
+        self.checkpoint_interval = configs.get("checkpoint_interval", CHECKPOINT_INTERVAL)
+        self.resume = configs.get("resume", False)
+        self.resume_position = 0
+        self.resume_thing = None
+        self.prefetch_depth = configs.get("prefetch_depth", 0)
+        self.prefetch_memory = configs.get("prefetch_memory", PREFETCH_MEMORY)
+        self.digest_algorithm = configs.get("digest_algorithm", "md5")
+        self.hashing = self.digest_algorithm != NO_DIGEST
+        self.digest_label = "Digest"
+        if self.hashing:
+            # Fail now, rather than on every file, if the algorithm is unavailable.
+            new_digest(self.digest_algorithm)
+            self.digest_label = "{0} Digest".format(
+                DIGEST_ALGORITHMS[self.digest_algorithm]
+            )
+        self.match_mode = configs.get("match_mode", "all")
+        if self.match_mode not in MATCH_MODES:
+            raise ValueError("Unknown match mode {0}".format(self.match_mode))
+        # Stop matching each file at the first string found.
+        self.first = self.match_mode != "all"
+        self.HEADERS = ("String", self.digest_label, "Name", "Location")
+        if self.match_mode == "files":
+            self.HEADERS = self.HEADERS[1:]
+        # Record where each search string occurs, as well as that it does.
+        self.offsets = configs.get("offsets", False)
+        self.max_offsets = configs.get("max_offsets", MAX_OFFSETS)
+        self.context_bytes = configs.get("context_bytes", CONTEXT_BYTES)
+        if self.offsets:
+            if self.match_mode == "files":
+                raise ValueError("Offsets can't be recorded when only files are reported")
+            self.HEADERS += OFFSET_HEADERS
+        # Only hash the files that match; duplicate content can then no
+        # longer be recognized.
+        self.digest_matches_only = configs.get("digest_matches_only", False)
+        # Matches by content digest, so duplicate files are matched only once.
+        self.dedup = None
+        dedup_memory = configs.get("dedup_memory", DEDUP_MEMORY)
+        if dedup_memory and self.hashing and not self.digest_matches_only:
+            self.dedup = LRUCache(dedup_memory)
         self.scan_results = {}
         self.stats = {}
+        # The part of stats counted by the walk of the files and archives on
+        # disk, which a resumed scan counts again.
+        self.walk_stats = {}
+        # A parallel scan counts the files that its walk skips on the pool's
+        # task thread, while this one counts the workers' statistics.
+        self.stats_lock = threading.Lock()
         if sys.version_info[0] + sys.version_info[1] / 10 < 3.4:
             LOGGER.error("ERROR: This script requires Python 3.4 or greater.")
             sys.exit(-1)
@@ -71,17 +197,285 @@ class Scanner:
             raise ValueError(
                 "scan_root {0} does not exist".format(configs["scan_root"])
             )
-        if not self.search_strings:
+        if (
+            not self.search_strings
+            and not self.byte_strings
+            and not self.regex_strings
+            and not configs.get("build_index")
+        ):
             raise ValueError("No strings to search!")
+        # Compile the search strings once, up front, so that each file is
+        # searched in a single pass regardless of the number of strings.
+        self.matcher = None
+        if self.search_strings:
+            self.matcher = get_matcher(self.search_strings, self.match_engine)
+        self.byte_matcher = None
+        if self.byte_strings:
+            self.byte_matcher = get_matcher(self.byte_strings, self.match_engine)
+        self.regex_matcher = None
+        if self.regex_strings:
+            self.regex_matcher = RegexMatcher(
+                self.regex_strings, self.ignore_case, self.match_engine
+            )
+        # The matchers that search decoded, normalized text, and whether
+        # that text is casefolded for them.
+        self.text_matchers = [
+            (matcher, casefold)
+            for matcher, casefold in ((self.matcher, True), (self.regex_matcher, False))
+            if matcher
+        ]
         if self.scan_archives:
             make_dir_safe(configs["temp_dir"])
+        self.cache = None
+        if configs.get("cache_file"):
+            options = dict(
+                ignore_case=self.ignore_case,
+                byte_match=self.byte_match,
+                digest=self.digest_algorithm,
+            )
+            if self.first:
+                options.update(match_mode="any")
+            if self.offsets:
+                options.update(
+                    max_offsets=self.max_offsets, context_bytes=self.context_bytes
+                )
+            self.cache = ScanCache(
+                configs["cache_file"], fingerprint(configs["search_strings"], **options)
+            )
+        # Narrow scans to the files that a prebuilt index says may match.
+        self.index = None
+        if configs.get("index_file"):
+            self.index = TrigramIndex(configs["index_file"], self._index_key())
+            if not configs.get("build_index") and not self.index.usable(self.scan_root):
+                LOGGER.warning(
+                    "Ignoring index %s, which was built for another scan root "
+                    "or with other walk options.",
+                    configs["index_file"],
+                )
+                self.index.close()
+                self.index = None
+
+    def _index_key(self):
+        """Fingerprint the options that decide which files an index holds."""
+        return fingerprint(
+            self.exclusions.names,
+            patterns=self.exclusions.regex.pattern if self.exclusions.regex else None,
+            scan_archives=self.scan_archives,
+            min_size=self.prefilter.min_size,
+            max_size=self.prefilter.max_size,
+            include_extensions=sorted(self.prefilter.include_extensions),
+            exclude_extensions=sorted(self.prefilter.exclude_extensions),
+        )
+
+    def _things(self):
+        """Generate the files and archives on disk under scan_root."""
+        if os.path.isdir(self.scan_root):
+            yield from self._dir_walk(self.scan_root)
+        else:
+            yield self.scan_root
+
+    def build_index(self):
+        """
+        Walk scan_root, including archive members when scan_archives is set,
+        and write a trigram index of every file to index_file, replacing its
+        contents.
+
+        Returns:
+            The number of files indexed.
+        """
+        LOGGER.info("Indexing %s", self.scan_root)
+        self.index.clear()
+        self._index_things(update=False)
+        LOGGER.info("Indexing complete. Indexed %d files.", self.stats["files_added"])
+        return self.stats["files_added"]
+
+    def update_index(self):
+        """
+        Bring index_file up to date with scan_root, re-indexing only what has
+        changed since it was built or last updated.
+
+        Files and archives on disk whose size and modification time match
+        the index are kept as they are. The members of a changed archive are
+        compared by digest, so only added and modified members are read for
+        trigrams. Files that are gone are tombstoned. An index built for
+        another scan root or with other walk options is rebuilt instead.
+
+        Returns:
+            The run stats, with counts of the files added, changed, removed,
+            and unchanged.
+        """
+        if not self.index.usable(self.scan_root):
+            LOGGER.warning(
+                "Rebuilding index %s, which was built for another scan root "
+                "or with other walk options.",
+                self.index.path,
+            )
+            self.build_index()
+            return self.stats
+        LOGGER.info("Updating the index of %s", self.scan_root)
+        self._index_things(update=True)
+        LOGGER.info(
+            "Index update complete. Added %d, changed %d, removed %d, and kept "
+            "%d unchanged files.",
+            self.stats["files_added"],
+            self.stats["files_changed"],
+            self.stats["files_removed"],
+            self.stats["files_unchanged"],
+        )
+        return self.stats
+
+    def _index_things(self, update):
+        """
+        Index the files under scan_root, counting them in the run stats.
+
+        Args:
+            update -- True to keep what the index already holds of unchanged
+                files, and to tombstone what is gone.
+        """
+        self.stats = dict.fromkeys(
+            ("files_added", "files_changed", "files_removed", "files_unchanged"), 0
+        )
+        seen = set()
+        for thing in self._things():
+            try:
+                stat = os.stat(thing)
+            except OSError:
+                LOGGER.error("Can't stat file=%s", thing)
+                continue
+            seen.add(thing)
+            if update:
+                files = self.index.files(thing, stat)
+                if files is not None:
+                    self._count("files_unchanged", files)
+                    continue
+            entries = self.index.entries(thing) if update else {}
+            files = 0
+            for name, location, fid, _ in self._walk(thing, listed=True):
+                try:
+                    self._index_file(thing, name, location, fid, entries)
+                # pylint: disable=W0703
+                # W0703 = broad-except
+                except Exception:
+                    LOGGER.error(
+                        "Caught an exception of type=%s while indexing file=%s: %s",
+                        sys.exc_info()[0],
+                        name,
+                        sys.exc_info()[1],
+                    )
+                    continue
+                # pylint: enable=W0703
+                files += 1
+            # Whatever is left of the thing's old files is gone.
+            for old in entries.values():
+                for file_id, _ in old:
+                    self.index.remove_file(file_id)
+                    self._count("files_removed")
+            self.index.add_thing(thing, stat, files)
+            indexed = sum(self.stats.values()) - self.stats["files_removed"]
+            if indexed // 1000 > (indexed - files) // 1000:
+                LOGGER.info("Indexed %d files so far.", indexed)
+        if update:
+            for thing in self.index.things():
+                if thing not in seen:
+                    self._count("files_removed", self.index.remove_thing(thing))
+        self.index.finish(self.scan_root)
+
+    def _index_file(self, thing, name, location, fid, entries):
+        """
+        Index a file, unless entries holds an unchanged copy of it.
 
-    def _walk(self, thing=None, parent=None):
-        """Walk a tree based on thing."""
+        Args:
+            thing -- The file or archive on disk that holds the file.
+            name -- The file name.
+            location -- The file location.
+            fid -- The open file.
+            entries -- The TrigramIndex.entries() of thing that haven't been
+                matched to a file yet. A matched entry is taken out.
+        """
+        old = entries.get((name, location))
+        if old and fid.seekable():
+            digest = file_digest(fid)
+            for i, (_, old_digest) in enumerate(old):
+                if old_digest == digest:
+                    del old[i]
+                    self._count("files_unchanged")
+                    return
+            fid.seek(0)
+        digest = new_digest(INDEX_DIGEST)
+        found = file_trigrams(fid, digest)
+        if old:
+            self.index.remove_file(old.pop()[0])
+            self._count("files_changed")
+        else:
+            self._count("files_added")
+        self.index.add_file(thing, name, location, digest.hexdigest(), found)
+
+    def _index_terms(self):
+        """
+        List a string that every match of each search string must contain,
+        for TrigramIndex.candidates().
+        """
+        terms = [original for _, original in self.search_strings + self.byte_strings]
+        for pattern, _ in self.regex_strings:
+            # The index is casefolded, like the text that an ignore_case scan
+            # matches search strings against.
+            # pylint: disable=W0212
+            # W0212 = protected-access
+            terms.append(RegexMatcher._required_literal(pattern, True))
+            # pylint: enable=W0212
+        return terms
+
+    def _indexed_things(self, things):
+        """
+        Generate an (ordinal, thing, wanted) tuple for each file and archive
+        on disk that may match, where wanted is the set of the (name,
+        location) tuples of the files under thing that the index can't rule
+        out, or None for things that are new or changed since the index was
+        built.
+
+        Args:
+            things -- (ordinal, thing) tuples; see _units().
+        """
+        candidates = self.index.candidates(self._index_terms())
+        if candidates is None:
+            LOGGER.warning(
+                "The index can't narrow the scan, as a search string is too "
+                "short, or is a regular expression without a literal of "
+                "at least 3 characters."
+            )
+        for ordinal, thing in things:
+            try:
+                files = self.index.files(thing, os.stat(thing))
+            except OSError:
+                files = None
+            if files is None or candidates is None:
+                yield ordinal, thing, None
+            elif thing in candidates:
+                yield ordinal, thing, candidates[thing]
+            else:
+                self._count("files_skipped_index", files, walk=True)
+
+    def _walk(self, thing=None, parent=None, file_bytes=None, listed=False):
+        """
+        Walk a tree based on thing.
+
+        Args:
+            thing -- A directory, file, or archive (Default: scan_root).
+            parent -- The pseudo-path of the enclosing archive, if any.
+            file_bytes -- The content of thing, if it has already been read.
+            listed -- True if thing is known to be a file, e.g. because it
+                came from _dir_walk(), and needn't be looked up again.
+        """
         if not thing:
             thing = self.scan_root
-        if os.path.isdir(thing):
-            yield from self._dir_walk(thing)
+        if not listed and os.path.isdir(thing):
+            paths = self._dir_walk(thing)
+            if self.prefetch_depth:
+                for path, prefetched in self._prefetch(paths):
+                    yield from self._walk(path, file_bytes=prefetched, listed=True)
+            else:
+                for path in paths:
+                    yield from self._walk(path, listed=True)
         elif self.scan_archives and (
             ZIP_REGEX.search(thing) or JAR_REGEX.search(thing)
         ):
@@ -91,47 +485,125 @@ class Scanner:
         elif ARCH_REGEX.search(thing):
             if self.scan_archives:
                 LOGGER.warning("Skipping unsupported archive %s", thing)
-            yield from self._file_walk(thing)
-        elif not os.path.isfile(thing):
+            yield from self._file_walk(thing, file_bytes)
+        elif file_bytes is None and not listed and not os.path.isfile(thing):
             LOGGER.warning("Thing '%s' is neither a directory nor a file", thing)
             return
         else:
-            yield from self._file_walk(thing)
+            yield from self._file_walk(thing, file_bytes)
 
-    def _file_walk(self, thing):
-        try:
-            with open(thing, "rb") as fid:
-                file_bytes = fid.read()
-                location = self.scan_root
-                if thing.startswith(location):
-                    location = os.path.dirname(thing)
-                else:
-                    location = os.path.join(location, os.path.dirname(thing))
-                yield (
-                    os.path.basename(thing),
-                    location,
-                    calculate_md5(file_bytes),
-                    file_bytes,
-                )
-        except FileNotFoundError:
-            LOGGER.error("Can't open file=%s", thing)
-            return
+    def _file_walk(self, thing, file_bytes=None):
+        """Generate a name, location, file object, path tuple for a single file."""
+        if file_bytes is not None:
+            fid = io.BytesIO(file_bytes)
+        else:
+            try:
+                fid = open(thing, "rb")
+            except FileNotFoundError:
+                LOGGER.error("Can't open file=%s", thing)
+                return
+        with fid:
+            location = self.scan_root
+            if thing.startswith(location):
+                location = os.path.dirname(thing)
+            else:
+                location = os.path.join(location, os.path.dirname(thing))
+            yield (os.path.basename(thing), location, fid, thing)
 
     def _dir_walk(self, path):
-        """Walk a directory."""
-        LOGGER.info("Walking dir=%s", path)
-        for entry in os.scandir(path):
-            if os.path.basename(entry.path).casefold() in self.exclusions:
+        """
+        Walk a directory, generating the path of every file under it.
+        Excluded subdirectories are pruned, without being listed. With a
+        shard, only the files assigned to it are generated.
+        """
+        excluded = self.exclusions.excluded if self.exclusions else None
+        for relative, entry in walk_dir(path, excluded, self.walk_threads):
+            if self.shard and shard_of(relative, self.shard[1]) != self.shard[0]:
                 continue
-            yield from self._walk(entry.path)
+            if not entry.is_file():
+                LOGGER.warning("Thing '%s' is neither a directory nor a file", entry.path)
+            elif not self._skipped(
+                entry.path, lambda: entry.stat().st_size, walk=True
+            ):
+                yield entry.path
+
+    def _prefetch(self, paths):
+        """
+        Generate a path, file bytes tuple for each path, in order, while a small
+        pool of threads reads up to prefetch_depth of the following files.
+
+        Only plain files that fit in the prefetch_memory budget are read ahead;
+        for anything else, the file bytes are None and _walk() reads the file
+        itself.
+
+        Args:
+            paths -- An iterable of file and archive paths.
+        """
+        budget = MemoryBudget(self.prefetch_memory)
+        pending = collections.deque()
+        threads = min(self.prefetch_depth, PREFETCH_THREADS)
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            for path in paths:
+                if self.cache and self._cached(path):
+                    # Don't read ahead files whose matches are already cached.
+                    future = Future()
+                    future.set_result((path, None, 0))
+                else:
+                    future = pool.submit(self._prefetch_file, path, budget)
+                pending.append(future)
+                if len(pending) > self.prefetch_depth:
+                    yield from self._prefetched(pending.popleft(), budget)
+            while pending:
+                yield from self._prefetched(pending.popleft(), budget)
+
+    @staticmethod
+    def _prefetched(future, budget):
+        """Generate the result of a _prefetch_file() call, then release its memory."""
+        path, file_bytes, reserved = future.result()
+        try:
+            yield path, file_bytes
+        finally:
+            budget.release(reserved)
+
+    def _prefetch_file(self, path, budget):
+        """
+        Read a plain file for _prefetch().
 
-    def _zip_walk(self, zip_file, parent=None):
+        Returns:
+            A path, file bytes (or None), reserved bytes tuple.
         """
-        Generate name, filebuf tuples from a recursive zip scan.
+        if self.scan_archives and (
+            ZIP_REGEX.search(path) or JAR_REGEX.search(path) or TAR_REGEX.search(path)
+        ):
+            return path, None, 0
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return path, None, 0
+        if (self.chunk_size and size > self.chunk_size) or (
+            self.mmap_threshold is not None and size >= self.mmap_threshold
+        ):
+            # These are better off streamed or memory-mapped.
+            return path, None, 0
+        if not budget.reserve(size):
+            return path, None, 0
+        try:
+            with open(path, "rb") as fid:
+                return path, fid.read(), size
+        except OSError:
+            budget.release(size)
+            return path, None, 0
+
+    def _zip_walk(self, zip_file, parent=None, fileobj=None):
+        """
+        Generate name, location, file object, path tuples from a recursive zip
+        scan. Archive members have no path of their own, so it is always None.
 
         Args:
-            zip_file -- The full path to the .zip file to scan.
-            parent - The root for the extraction if this is an inner archive.
+            zip_file -- The full path to the .zip file to scan, or its name
+                within the parent archive.
+            parent - The pseudo-path of the parent if this is an inner archive.
+            fileobj - The content of an inner archive, as a seekable file object.
         """
         archive_type = "jar" if JAR_REGEX.search(zip_file) else "zip"
         LOGGER.info("Walking %s file=%s", archive_type, zip_file)
@@ -140,22 +612,15 @@ class Scanner:
             parent = "/".join([parent, os.path.basename(zip_file)])
         else:
             parent = os.path.basename(zip_file)
-        with zipfile.ZipFile(zip_file) as zip_archive:
+        with zipfile.ZipFile(fileobj or zip_file) as zip_archive:
             for info in zip_archive.infolist():
                 name = info.filename
-                if (
-                    DIR_REGEX.search(name)
-                    or os.path.basename(name).casefold() in self.exclusions
-                ):
+                if DIR_REGEX.search(name) or self.exclusions.excluded_member(name):
                     continue
-                elif ARCH_REGEX.search(name):
-                    extract_dir = os.path.join(self.temp_dir, random_string())
-                    make_dir_safe(extract_dir)
-                    inner_archive = os.path.join(extract_dir, name)
+                elif self._inner_archive(name):
                     try:
-                        zip_archive.extract(name, extract_dir)
-                        if ARCH_REGEX.search(name):
-                            yield from self._walk(inner_archive, parent)
+                        with zip_archive.open(name) as member:
+                            yield from self._inner_walk(name, member, parent)
                     # pylint: disable=W0703
                     # W0703 = broad-except
                     except BaseException:
@@ -167,22 +632,11 @@ class Scanner:
                         )
                         continue
                     # pylint: enable=W0703
-                    finally:
-                        shutil.rmtree(extract_dir)
+                elif self._skipped(name, lambda: info.file_size):
+                    continue
                 else:
-                    fid = None
                     try:
-                        with zip_archive.open(name) as fid:
-                            # Pseudo-path, don't use os.path.join().
-                            file_bytes = fid.read()
-                            yield (
-                                os.path.basename(name),
-                                "/".join(
-                                    [self.scan_root, parent, os.path.dirname(name)]
-                                ),
-                                calculate_md5(file_bytes),
-                                file_bytes,
-                            )
+                        fid = zip_archive.open(name)
                     # pylint: disable=W0703
                     # W0703 = broad-except
                     except BaseException:
@@ -191,15 +645,27 @@ class Scanner:
                             sys.exc_info()[0],
                             sys.exc_info()[1],
                         )
+                        continue
                     # pylint: enable=W0703
+                    with fid:
+                        # Pseudo-path, don't use os.path.join().
+                        yield (
+                            os.path.basename(name),
+                            "/".join([self.scan_root, parent, os.path.dirname(name)]),
+                            fid,
+                            None,
+                        )
 
-    def _tar_walk(self, tar_file, parent=None):
+    def _tar_walk(self, tar_file, parent=None, fileobj=None):
         """
-        Generate name, filebuf tuples from a recursive tar scan.
+        Generate name, location, file object, path tuples from a recursive tar
+        scan. Archive members have no path of their own, so it is always None.
 
         Args:
             tar_file -- The name of the .tar (or compressed variant) file
-            to scan.
+            to scan, or its name within the parent archive.
+            parent - The pseudo-path of the parent if this is an inner archive.
+            fileobj - The content of an inner archive, as a seekable file object.
         """
         LOGGER.info("Walking tar file=%s", tar_file)
         # Pseudo-path, don't use os.path.join().
@@ -208,20 +674,16 @@ class Scanner:
             if parent
             else os.path.basename(tar_file)
         )
-        with tarfile.open(tar_file, "r") as tar_archive:
+        with tarfile.open(tar_file, "r", fileobj=fileobj) as tar_archive:
             for entry in tar_archive:
                 if not entry.isreg():
                     continue
-                elif os.path.basename(entry.name).casefold() in self.exclusions:
+                elif self.exclusions.excluded_member(entry.name):
                     continue
-                elif ARCH_REGEX.search(entry.name):
-                    extract_dir = os.path.join(self.temp_dir, random_string())
-                    make_dir_safe(extract_dir)
-                    inner_archive = os.path.join(extract_dir, entry.name)
+                elif self._inner_archive(entry.name):
                     try:
-                        tar_archive.extract(entry, extract_dir)
-                        if ARCH_REGEX.search(inner_archive):
-                            yield from self._walk(inner_archive, parent)
+                        with tar_archive.extractfile(entry) as member:
+                            yield from self._inner_walk(entry.name, member, parent)
                     # pylint: disable=W0703
                     # W0703 = broad-except
                     except BaseException:
@@ -233,22 +695,11 @@ class Scanner:
                         )
                         continue
                     # pylint: enable=W0703
-                    finally:
-                        shutil.rmtree(extract_dir)
-
+                elif self._skipped(entry.name, lambda: entry.size):
                     continue
                 else:
                     try:
-                        with tar_archive.extractfile(entry) as fid:
-                            file_bytes = fid.read()
-                            yield (
-                                os.path.basename(entry.name),
-                                os.path.join(
-                                    self.scan_root, parent, os.path.dirname(entry.name)
-                                ),
-                                calculate_md5(file_bytes),
-                                file_bytes,
-                            )
+                        fid = tar_archive.extractfile(entry)
                     # pylint: disable=W0703
                     # W0703 = broad-except
                     except BaseException:
@@ -257,38 +708,747 @@ class Scanner:
                             sys.exc_info()[0],
                             entry.name,
                         )
+                        continue
                     # pylint: enable=W0703
+                    with fid:
+                        yield (
+                            os.path.basename(entry.name),
+                            os.path.join(
+                                self.scan_root, parent, os.path.dirname(entry.name)
+                            ),
+                            fid,
+                            None,
+                        )
+
+    @staticmethod
+    def _inner_archive(name):
+        """True if name is a zip, jar, or tar archive member that can be walked."""
+        return bool(
+            ZIP_REGEX.search(name) or JAR_REGEX.search(name) or TAR_REGEX.search(name)
+        )
+
+    def _inner_walk(self, name, member, parent):
+        """
+        Walk an archive nested in another archive, without extracting it.
+
+        zip and tar need to seek, so the member is copied into a temporary file
+        that stays in memory up to spool_size bytes and only spills to temp_dir
+        beyond that.
+
+        Args:
+            name -- The name of the inner archive within its parent.
+            member -- The inner archive, as an open file object.
+            parent -- The pseudo-path of the parent archive.
+        """
+        if self.spool_size:
+            spool = tempfile.SpooledTemporaryFile(
+                max_size=self.spool_size, dir=self.temp_dir
+            )
+        else:
+            spool = tempfile.TemporaryFile(dir=self.temp_dir)
+        with spool:
+            shutil.copyfileobj(member, spool)
+            spool.seek(0)
+            if TAR_REGEX.search(name):
+                yield from self._tar_walk(name, parent, spool)
+            else:
+                yield from self._zip_walk(name, parent, spool)
+
+    def _skipped(self, name, size_of, walk=False):
+        """
+        Apply the name and size prefilters to a file or archive member,
+        counting the files skipped. Archives that will be walked are never
+        skipped, as their members are filtered in turn.
+
+        Args:
+            name -- The file path, or the name of the archive member.
+            size_of -- A function returning the size of the file.
+            walk -- True for the files on disk that _dir_walk() generates;
+                see _count() (Default: False).
+
+        Returns:
+            True if the file should be skipped.
+        """
+        if self.scan_archives and self._inner_archive(name):
+            return False
+        reason = self.prefilter.skip(os.path.basename(name), size_of)
+        if reason is None:
+            return False
+        self._count("files_skipped_" + reason, walk=walk)
+        return True
+
+    def _binary(self, fid):
+        """
+        True if the first few bytes of an open file look like binary content.
+        The file is left at its start.
+        """
+        if hasattr(fid, "peek"):
+            # Buffered and archive member files can look ahead without seeking.
+            head = fid.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+        else:
+            head = fid.read(SNIFF_SIZE)
+            fid.seek(0)
+        return self.prefilter.binary(head)
+
+    def _normalize(self, text, casefold=True):
+        """Normalize text (and optionally casefold it) for matching."""
+        text = unicodedata.normalize("NFKD", text)
+        if self.ignore_case and casefold:
+            text = text.casefold()
+        return text
+
+    def _texts(self, text):
+        """
+        Normalize decoded text for each of the text matchers.
+
+        Returns:
+            A list of (matcher, normalized text, casefold) tuples, where
+            casefold says whether the text was casefolded; see _normalize().
+        """
+        text = unicodedata.normalize("NFKD", text)
+        folded = text
+        if self.ignore_case and self.matcher:
+            folded = text.casefold()
+        return [
+            (matcher, folded if casefold else text, casefold)
+            for matcher, casefold in self.text_matchers
+        ]
+
+    def _count(self, stat, count=1, walk=False):
+        """
+        Add count to one of the scan statistics.
+
+        Args:
+            stat -- The statistic.
+            count -- The number to add (Default: 1).
+            walk -- True if the walk of the files and archives on disk counts
+                it, rather than their scan (Default: False).
+        """
+        with self.stats_lock:
+            self.stats[stat] = self.stats.get(stat, 0) + count
+            if walk:
+                self.walk_stats[stat] = self.walk_stats.get(stat, 0) + count
+
+    def _cached(self, path):
+        """True if the cache holds the matches for the current version of path."""
+        try:
+            return self.cache.get_file(path, os.stat(path)) is not None
+        except OSError:
+            return False
+
+    def _scan_fid(self, fid, path=None):
+        """
+        Read an open file and match its content.
+
+        Args:
+            fid -- A file object opened in binary mode.
+            path -- The file's path, if it is a regular file.
+
+        Returns:
+            A (digest, list of matches) tuple. The digest is None for files
+            that don't match when digest_matches_only is set. See _find()
+            for the matches.
+        """
+        stat = None
+        if self.cache and path:
+            stat = os.stat(path)
+            cached = self.cache.get_file(path, stat)
+            if cached is not None:
+                self._count("files_cached")
+                return cached
+        located = True
+        if self._mappable(fid):
+            result = self._scan_mapped(fid)
+        elif self.chunk_size:
+            result = self._scan_stream(fid)
+            located = not (self.offsets and result[1])
+        else:
+            result = self._scan_bytes(fid.read())
+        # Matches without offsets mustn't stand in for a later scan's located ones.
+        if stat is not None and located:
+            self.cache.put_file(path, stat, *result)
+        return result
+
+    def _scan_bytes(self, file_bytes):
+        """
+        Hash and match the content of a file.
+
+        Args:
+            file_bytes -- The content of a file, as a bytes-like object.
+
+        Returns:
+            A (digest, list of matched search strings) tuple.
+        """
+        if not self.hashing:
+            return None, self._find(file_bytes)
+        if self.digest_matches_only:
+            matched_strings = self._find(file_bytes)
+            if not matched_strings:
+                return None, matched_strings
+            return calculate_digest(file_bytes, self.digest_algorithm), matched_strings
+        digest = calculate_digest(file_bytes, self.digest_algorithm)
+        return digest, self._match(digest, file_bytes)
+
+    def _match(self, digest, file_bytes):
+        """
+        Match the content of a file, unless this scan or the cache already
+        matched the same content.
+
+        Args:
+            digest -- The digest of file_bytes.
+            file_bytes -- The content of a file, as a bytes-like object.
+
+        Returns:
+            A list of matched search strings.
+        """
+        if self.dedup is not None:
+            self._count("dedup_lookups")
+            matched_strings = self.dedup.get(digest)
+            if matched_strings is not None:
+                self._count("dedup_hits")
+                return list(matched_strings)
+        if self.cache:
+            matched_strings = self.cache.get_content(digest)
+            if matched_strings is not None:
+                self._count("files_cached")
+                self._remember(digest, matched_strings)
+                return matched_strings
+        matched_strings = self._find(file_bytes)
+        self._remember(digest, matched_strings)
+        if self.cache:
+            self.cache.put_content(digest, matched_strings)
+        return matched_strings
+
+    def _remember(self, digest, matched_strings):
+        """Keep the matches of the content with digest for the rest of the scan."""
+        if self.dedup is not None:
+            size = sys.getsizeof(digest) + sys.getsizeof(matched_strings)
+            for matched in matched_strings:
+                size += sys.getsizeof(matched)
+                if isinstance(matched, tuple):
+                    size += sum(sys.getsizeof(value) for value in matched)
+            self.dedup.put(digest, tuple(matched_strings), size)
+
+    def _mappable(self, fid):
+        """True if fid is a regular file at least mmap_threshold bytes long."""
+        if self.mmap_threshold is None:
+            return False
+        try:
+            fileno = fid.fileno()
+        except (AttributeError, OSError):
+            # Archive members have no file descriptor.
+            return False
+        size = os.fstat(fileno).st_size
+        return size > 0 and size >= self.mmap_threshold
+
+    def _scan_mapped(self, fid):
+        """
+        Match a regular file through a memory map, without copying it into a
+        Python bytes object. The page cache does the buffering instead.
+
+        Args:
+            fid -- A regular file opened in binary mode.
+
+        Returns:
+            A (digest, list of matched search strings) tuple.
+        """
+        with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                return self._scan_bytes(view)
+            finally:
+                view.release()
+
+    def _scan_stream(self, fid):
+        """
+        Read and match a file chunk by chunk, so that memory use is bounded
+        by chunk_size rather than by the size of the file.
+
+        Matching stops as soon as the outcome is known: once every string has
+        been found or, in the any and files match modes, once any string has.
+        Reading stops there too, unless the rest of the file is still needed
+        for its digest.
+
+        Args:
+            fid -- A file object opened in binary mode.
+
+        Returns:
+            A (digest, list of matched search strings) tuple.
+        """
+        digest = new_digest(self.digest_algorithm) if self.hashing else None
+        # Hash only after matching, if the file can be read a second time.
+        rehash = self.hashing and self.digest_matches_only and fid.seekable()
+        streams = []
+        if self.byte_matcher:
+            byte_stream = MatchStream(self.byte_matcher, self.first)
+            streams.append(byte_stream)
+        text_streams = [
+            MatchStream(matcher, self.first) for matcher, _ in self.text_matchers
+        ]
+        streams.extend(text_streams)
+        if text_streams:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        matching = True
+        while True:
+            chunk = fid.read(self.chunk_size)
+            if not chunk:
+                break
+            if digest is not None and not rehash:
+                digest.update(chunk)
+            if not matching:
+                continue
+            if self.byte_matcher:
+                byte_stream.feed(chunk.lower() if self.ignore_case else chunk)
+            if text_streams:
+                texts = self._texts(decoder.decode(chunk))
+                for text_stream, (_, text, _) in zip(text_streams, texts):
+                    text_stream.feed(text)
+            if self.first:
+                matching = not any(stream.found for stream in streams)
+            else:
+                matching = not all(stream.done for stream in streams)
+            if not matching and (digest is None or rehash):
+                self._count("files_stopped_early")
+                break
+        if matching:
+            for stream in streams:
+                stream.finish()
+        matched_strings = []
+        for stream in streams:
+            matched_strings.extend(stream.strings())
+            if self.first and matched_strings:
+                break
+        if self.offsets:
+            # Only one chunk is held at a time, so occurrences can't be located.
+            matched_strings = [
+                (matched_string, None, None, None) for matched_string in matched_strings
+            ]
+        if digest is None:
+            return None, matched_strings
+        if rehash:
+            if not matched_strings:
+                return None, matched_strings
+            fid.seek(0)
+            for chunk in iter(lambda: fid.read(self.chunk_size), b""):
+                digest.update(chunk)
+        # The digest is only known once the whole file is read, but later
+        # copies that are read whole can still reuse the matches, unless
+        # they would lose the offsets that reading them whole locates.
+        if not (self.offsets and matched_strings):
+            self._remember(digest.hexdigest(), matched_strings)
+            if self.cache:
+                self.cache.put_content(digest.hexdigest(), matched_strings)
+        return digest.hexdigest(), matched_strings
+
+    def _find(self, file_bytes):
+        """
+        Match the content of a file.
+
+        Args:
+            file_bytes -- The content of a file, as a bytes-like object.
+
+        Returns:
+            A list of the matched search strings or, when offsets are
+            recorded, a list of (search string, offset, line, context) tuples.
+        """
+        if self.offsets:
+            return list(self._scan_offsets(file_bytes))
+        return list(self._scan_file(file_bytes))
 
     def _scan_file(self, file_bytes):
         """
-        Generator method that yields matching search_strings.
+        Generator method that yields matching search_strings. In the any and
+        files match modes, it stops after the first one.
 
         Args:
-            file_bytes -- The content of a file, as a byte string.
+            file_bytes -- The content of a file, as a bytes-like object.
         """
+        found = False
+        if self.byte_matcher and file_bytes:
+            stream = MatchStream(self.byte_matcher, self.first)
+            for piece in self._byte_pieces(file_bytes):
+                stream.feed(piece)
+                if stream.done:
+                    break
+            for matched_string in stream.strings():
+                found = True
+                yield matched_string
+        if not self.text_matchers or (found and self.first):
+            return
+
         # Strip out all of the valid utf-8 characters from a byte stream
         # and normalize the result.
-        file_str = unicodedata.normalize(
-            "NFKD", codecs.decode(file_bytes, "utf-8", errors="ignore")
-        )
+        file_str = codecs.decode(file_bytes, "utf-8", errors="ignore")
         if not file_str:
             return
 
-        if self.ignore_case:
-            file_str = file_str.casefold()
-        for normal_str, search_str in self.search_strings:
-            if normal_str in file_str:
-                yield search_str
+        for matcher, text, _ in self._texts(file_str):
+            for matched_string in matcher.find(text, self.first):
+                found = True
+                yield matched_string
+            if found and self.first:
+                return
+
+    def _scan_offsets(self, file_bytes):
+        """
+        Like _scan_file(), but generate a (search string, offset, line,
+        context) tuple for each of the first max_offsets occurrences of each
+        matched search string, in a single pass over the file.
+
+        Offsets are in bytes from the start of the file, and lines are
+        numbered from 1. Matches against normalized text are mapped back to
+        the file's bytes. In the any match mode, only the occurrences of the
+        first string found are generated.
+
+        Args:
+            file_bytes -- The content of a file, as a bytes-like object.
+        """
+        if self.byte_matcher and file_bytes:
+            stream = MatchStream(self.byte_matcher)
+            counter = LineCounter(file_bytes)
+            found = self._first_spans(
+                self.byte_matcher,
+                itertools.chain.from_iterable(
+                    stream.iter_spans(piece) for piece in self._byte_pieces(file_bytes)
+                ),
+            )
+            spans = sorted(
+                (span, search_string)
+                for search_string, string_spans in found.items()
+                for span in string_spans
+            )
+            located = {
+                span: (span[0], span[1], counter.seek(span[0])) for span, _ in spans
+            }
+            yield from self._hits(file_bytes, found, located)
+            if found and self.first:
+                return
+        if not self.text_matchers:
+            return
+
+        file_str = codecs.decode(file_bytes, "utf-8", errors="ignore")
+        if not file_str:
+            return
+
+        for matcher, text, casefold in self._texts(file_str):
+            found = self._first_spans(matcher, matcher.iter_spans(text))
+            counter = LineCounter(file_bytes)
+            line_start = 0
+            located = {}
+            for start, end in sorted(
+                {span for string_spans in found.values() for span in string_spans}
+            ):
+                newlines = text.count("\n", line_start, start)
+                if newlines:
+                    counter.next_lines(newlines)
+                    line_start = text.rfind("\n", 0, start) + 1
+                located[(start, end)] = byte_span(
+                    file_bytes,
+                    counter.pos,
+                    start - line_start,
+                    end - line_start,
+                    lambda line, casefold=casefold: self._normalize(line, casefold),
+                ) + (counter.line,)
+            yield from self._hits(file_bytes, found, located)
+            if found and self.first:
+                return
+
+    def _byte_pieces(self, file_bytes):
+        """
+        Generate the content of a file for the byte matcher, lowercased with
+        ignore_case, in one or more pieces.
+
+        A memoryview has no lower(), and copying a memory-mapped file whole
+        to lowercase it would defeat the mapping, so it is lowercased
+        WINDOW_SIZE bytes at a time instead.
+
+        Args:
+            file_bytes -- The content of a file, as a bytes-like object.
+        """
+        if not self.ignore_case:
+            yield file_bytes
+        elif isinstance(file_bytes, bytes):
+            yield file_bytes.lower()
+        else:
+            for offset in range(0, len(file_bytes), WINDOW_SIZE):
+                yield bytes(file_bytes[offset : offset + WINDOW_SIZE]).lower()
+
+    def _first_spans(self, matcher, spans):
+        """
+        Find the first max_offsets occurrences of each search string.
+
+        Args:
+            matcher -- The Matcher that found the spans.
+            spans -- Its iter_spans() of the haystack.
+
+        Returns:
+            A dictionary of sorted (start, end) span lists, keyed by search
+            string, in the order that Matcher.find() would yield them. In the
+            any match mode, it only holds the first search string.
+        """
+        found_spans = {}
+        for start, end, index in spans:
+            needle_spans = found_spans.setdefault(index, [])
+            # The occurrences of each needle come in order.
+            if len(needle_spans) < self.max_offsets:
+                needle_spans.append((start, end))
+        found = {}
+        for index in sorted(found_spans):
+            for search_string in matcher.search_strings[index]:
+                found.setdefault(search_string, []).extend(found_spans[index])
+        if self.first:
+            found = dict(list(found.items())[:1])
+        return {
+            search_string: sorted(string_spans)[: self.max_offsets]
+            for search_string, string_spans in found.items()
+        }
+
+    def _hits(self, file_bytes, found, located):
+        """
+        Generate the _scan_offsets() tuples for the spans in found.
+
+        Args:
+            file_bytes -- The content of a file, as a bytes-like object.
+            found -- A _first_spans() dictionary.
+            located -- The (start, end, line) of each span in file_bytes.
+        """
+        for search_string, string_spans in found.items():
+            for span in string_spans:
+                start, end, line = located[span]
+                yield (
+                    search_string,
+                    start,
+                    line,
+                    snippet(file_bytes, start, end, self.context_bytes),
+                )
+
+    def _scan_walk(self, thing=None, listed=False, wanted=None, file_bytes=None):
+        """
+        Generate a name, location, digest, matched strings tuple for each
+        file under thing.
+
+        Args:
+            thing -- A directory, file, or archive (Default: scan_root).
+            listed -- True if thing is known to be a file.
+            wanted -- The (name, location) tuples of the only files to match
+                (Default: match every file).
+            file_bytes -- The content of thing, if it has already been read.
+        """
+        for name, location, fid, path in self._walk(
+            thing, file_bytes=file_bytes, listed=listed
+        ):
+            if wanted is not None and (name, location) not in wanted:
+                self._count("files_skipped_index")
+                continue
+            try:
+                if self.prefilter.skip_binary and self._binary(fid):
+                    self._count("files_skipped_binary")
+                    continue
+                digest, matched_strings = self._scan_fid(fid, path)
+            # pylint: disable=W0703
+            # W0703 = broad-except
+            except Exception:
+                LOGGER.error(
+                    "Caught an exception of type=%s while reading file=%s: %s",
+                    sys.exc_info()[0],
+                    name,
+                    sys.exc_info()[1],
+                )
+                continue
+            # pylint: enable=W0703
+            yield name, location, digest, matched_strings
+
+    def _parallel_scan_walk(self, things):
+        """
+        Like _scan_walk(), but the files and archives are read, hashed, and
+        matched by a pool of worker processes.
+
+        Results come back in walk order, so the output is identical to a
+        serial scan. The pool consumes things, and so the walk, on its task
+        thread; see stats_lock.
+
+        Args:
+            things -- (thing, wanted) tuples of the files and archives to
+                scan; see _scan_walk().
+
+        Returns:
+            A generator of the list of _scan_walk() tuples of each thing.
+        """
+        with multiprocessing.Pool(
+            self.jobs, initializer=_init_worker, initargs=(self.configs, LOGGER.level)
+        ) as pool:
+            for results, stats in pool.imap(
+                _scan_worker, things, PARALLEL_CHUNK_SIZE
+            ):
+                for stat, count in stats.items():
+                    self._count(stat, count)
+                yield results
+
+    def _units(self):
+        """
+        Generate an (ordinal, thing, wanted) tuple for each file and archive
+        on disk to scan, in walk order, where ordinal counts the things walked
+        and wanted is as for _scan_walk().
+
+        When resuming, the things that the checkpoint has already scanned are
+        walked, so that the files the walk skips are counted as before, but
+        not scanned.
+        """
+        things = enumerate(self._things(), 1)
+        if self.index:
+            units = self._indexed_things(things)
+        else:
+            units = ((ordinal, thing, None) for ordinal, thing in things)
+        for ordinal, thing, wanted in units:
+            if ordinal < self.resume_position:
+                continue
+            if ordinal == self.resume_position:
+                if thing != self.resume_thing:
+                    LOGGER.warning(
+                        "%s has changed since the checkpoint, which ended at %s, "
+                        "not %s. The results may differ from a fresh scan.",
+                        self.scan_root,
+                        self.resume_thing,
+                        thing,
+                    )
+                continue
+            yield ordinal, thing, wanted
+
+    def _scan_units(self, units):
+        """
+        Scan the files and archives of _units(), serially or in parallel.
+
+        Returns:
+            A generator of (ordinal, thing, results) tuples, where results
+            are the _scan_walk() tuples of the files under thing.
+        """
+        # The parallel and read-ahead scans hand back their results in order.
+        queued = collections.deque()
+
+        def queue(items):
+            for item in items:
+                queued.append(item)
+                yield item
+
+        if self.jobs > 1:
+            for results in self._parallel_scan_walk(
+                (thing, wanted) for _, thing, wanted in queue(units)
+            ):
+                ordinal, thing, _ = queued.popleft()
+                yield ordinal, thing, results
+        elif self.prefetch_depth:
+            for _, file_bytes in self._prefetch(thing for _, thing, _ in queue(units)):
+                ordinal, thing, wanted = queued.popleft()
+                yield ordinal, thing, self._scan_walk(
+                    thing, listed=True, wanted=wanted, file_bytes=file_bytes
+                )
+        else:
+            for ordinal, thing, wanted in units:
+                yield ordinal, thing, self._scan_walk(thing, listed=True, wanted=wanted)
 
-    def scan(self):
-        """Scan scan_root and print matches."""
+    def scan(self, sink=None):
+        """
+        Scan scan_root and collect matches.
+
+        Args:
+            sink -- A Sink to write each (string, digest, name, location) row,
+                followed by the offset, line, and context when offsets are
+                recorded, to as soon as it is found. The rows are then not kept in
+                memory, and get_results() returns nothing (Default: keep every
+                row for get_results()). In the files match mode, there is one
+                (digest, name, location) row for each matching file.
+        """
 
         LOGGER.info("Scanning %s", self.scan_root)
 
         self.scan_results = {}
-        md5s = set()
+        digests = set()
         self.stats = {"files_scanned": 0, "files_matched": 0}
-        for name, path, md5, file_bytes in self._walk(None):
+        self.walk_stats = {}
+        if self.cache:
+            self.stats["files_cached"] = 0
+        if self.dedup is not None:
+            self.stats["dedup_lookups"] = 0
+            self.stats["dedup_hits"] = 0
+        if self.chunk_size:
+            self.stats["files_stopped_early"] = 0
+        if self.prefilter.active:
+            for reason in ("extension", "size", "binary"):
+                self.stats["files_skipped_" + reason] = 0
+        if self.index:
+            self.stats["files_skipped_index"] = 0
+        checkpoint = self._resume(sink, digests)
+        if sink is not None:
+            sink.open(self.HEADERS)
+        try:
+            saved = time.monotonic()
+            for ordinal, thing, results in self._scan_units(self._units()):
+                self._collect(results, sink, digests, checkpoint)
+                if checkpoint and time.monotonic() - saved >= self.checkpoint_interval:
+                    checkpoint.save(ordinal, thing, self._checkpoint_stats())
+                    saved = time.monotonic()
+        finally:
+            if sink is not None:
+                sink.close()
+        if checkpoint:
+            checkpoint.remove()
+
+        if self.cache:
+            self.cache.commit()
+            LOGGER.info(
+                "Reused cached matches for %d of %d files.",
+                self.stats["files_cached"],
+                self.stats["files_scanned"],
+            )
+        if self.dedup is not None:
+            self.stats["dedup_hit_rate"] = self.stats["dedup_hits"] / max(
+                self.stats["dedup_lookups"], 1
+            )
+            LOGGER.info(
+                "Reused the matches of duplicate content for %d of %d files (%.1f%%).",
+                self.stats["dedup_hits"],
+                self.stats["dedup_lookups"],
+                100 * self.stats["dedup_hit_rate"],
+            )
+        if self.chunk_size:
+            LOGGER.info(
+                "Stopped reading %d of %d files once their matches were known.",
+                self.stats["files_stopped_early"],
+                self.stats["files_scanned"],
+            )
+        if self.index:
+            LOGGER.info(
+                "Skipped %d files that the index ruled out.",
+                self.stats["files_skipped_index"],
+            )
+        if self.prefilter.active:
+            LOGGER.info(
+                "Skipped %d files by extension, %d by size, and %d as binary.",
+                self.stats["files_skipped_extension"],
+                self.stats["files_skipped_size"],
+                self.stats["files_skipped_binary"],
+            )
+        LOGGER.info(
+            "Scan complete. Matched %d of %d files.",
+            self.stats["files_matched"],
+            self.stats["files_scanned"],
+        )
+
+    def _collect(self, scanned, sink, digests, checkpoint=None):
+        """
+        Turn the matched strings of each scanned file into result rows, for
+        scan().
+
+        Args:
+            scanned -- The _scan_walk() tuples of the scanned files.
+            sink -- The Sink to write the rows to, or None to keep them in
+                scan_results.
+            digests -- The set of the digests of the matched files so far,
+                which is added to.
+            checkpoint -- A Checkpoint to add the rows kept in scan_results
+                to (Default: None).
+        """
+        for name, path, digest, matched_strings in scanned:
             self.stats["files_scanned"] += 1
             if self.stats["files_scanned"] % 1000 == 0:
                 LOGGER.info(
@@ -296,36 +1456,222 @@ class Scanner:
                     self.stats["files_matched"],
                     self.stats["files_scanned"],
                 )
-            for matched_string in self._scan_file(file_bytes):
-                if matched_string not in self.scan_results.keys():
-                    self.scan_results[matched_string] = []
-                self.scan_results[matched_string].append((name, md5, path))
+            if self.match_mode == "files" and matched_strings:
+                # Group the files under one key.
+                matched_strings = [None]
+            for matched_string in matched_strings:
+                located = ()
+                if self.offsets:
+                    matched_string, located = matched_string[0], matched_string[1:]
+                row = (matched_string, digest, name, path) + located
+                if self.match_mode == "files":
+                    row = row[1:]
+                if sink is not None:
+                    sink.write(row)
+                else:
+                    if matched_string not in self.scan_results.keys():
+                        self.scan_results[matched_string] = []
+                    self.scan_results[matched_string].append(row)
+                    if checkpoint:
+                        checkpoint.add(row)
                 LOGGER.debug(
-                    "Matched String=%s, Name=%s, MD5 Digest=%s, Location=%s",
+                    "Matched String=%s, Name=%s, %s=%s, Location=%s",
                     matched_string,
                     name,
-                    md5,
+                    self.digest_label,
+                    digest,
                     path,
                 )
-                if md5 not in md5s:
-                    md5s.add(md5)
+                # Without digests, every matching file counts.
+                if digest is None or digest not in digests:
+                    digests.add(digest)
                     self.stats["files_matched"] += 1
+            if sink is not None:
+                sink.flush()
+
+    def _checkpoint_key(self):
+        """Fingerprint the scan root, search strings, and options that decide the results."""
+        return fingerprint(
+            self.configs["search_strings"],
+            scan_root=os.path.abspath(self.scan_root),
+            walk=self._index_key(),
+            headers=self.HEADERS,
+            ignore_case=self.ignore_case,
+            byte_match=self.byte_match,
+            digest_matches_only=self.digest_matches_only,
+            first=self.first,
+            max_offsets=self.max_offsets,
+            context_bytes=self.context_bytes,
+            skip_binary=self.prefilter.skip_binary,
+            shard=self.shard,
+            # They decide which files' offsets are located.
+            chunk_size=self.chunk_size,
+            mmap_threshold=self.mmap_threshold,
+        )
+
+    def _checkpoint_stats(self):
+        """
+        Return the scan statistics to checkpoint: all but the part of them
+        that the walk counted, which a resumed scan counts again. The files
+        skipped within the archives scanned so far stay counted.
+        """
+        with self.stats_lock:
+            return {
+                stat: count - self.walk_stats.get(stat, 0)
+                for stat, count in self.stats.items()
+            }
 
+    def _resume(self, sink, digests):
+        """
+        Open the checkpoint of a scan, and pick up where it left off.
+
+        Args:
+            sink -- The scan's Sink, if any. Streamed rows aren't kept, so
+                they can't be checkpointed.
+            digests -- The set of the digests of the matched files, for scan().
+
+        Returns:
+            The Checkpoint, or None if the scan isn't checkpointed.
+        """
+        self.resume_position = 0
+        self.resume_thing = None
+        if not self.checkpoint_dir:
+            return None
+        if sink is not None:
+            LOGGER.warning("Streamed scans can't be checkpointed or resumed.")
+            return None
+        key = self._checkpoint_key()
+        checkpoint = Checkpoint(
+            os.path.join(self.checkpoint_dir, "scan-{0}.checkpoint".format(key[:16])),
+            key,
+        )
+        saved = checkpoint.load() if self.resume else None
+        if saved is None:
+            checkpoint.clear()
+            LOGGER.info("Checkpointing the scan to %s", checkpoint.path)
+            return checkpoint
+        self.resume_position, self.resume_thing, stats, rows = saved
+        self.stats.update(stats)
+        digest = self.HEADERS.index(self.digest_label)
+        for row in rows:
+            self.scan_results.setdefault(
+                None if self.match_mode == "files" else row[0], []
+            ).append(row)
+            digests.add(row[digest])
         LOGGER.info(
-            "Scan complete. Matched %d of %d files.",
+            "Resuming the scan from %s, after %d files and archives, with %d "
+            "matching files so far.",
+            checkpoint.path,
+            self.resume_position,
             self.stats["files_matched"],
-            self.stats["files_scanned"],
         )
+        return checkpoint
+
+    def watch(self, changes, new_sink, roll_interval=None):
+        """
+        Scan the files that change under scan_root, for as long as changes
+        come, and write the matches to a rolling series of sinks.
+
+        Only the changed files (and archives) go through _scan_walk(), after
+        the same exclusions and prefilter as a full scan. Files that are
+        already there when watching starts are not scanned.
+
+        Args:
+            changes -- An iterable of lists of changed file paths, such as
+                watcher.watch() generates.
+            new_sink -- A function returning a new, unopened Sink.
+            roll_interval -- Close the sink and start a new one once it has
+                been open this many seconds, checked as changes come in
+                (Default: one sink for the whole watch).
+        """
+        self.stats = {"files_scanned": 0, "files_matched": 0}
+
+        def skipped(path):
+            try:
+                return self._skipped(path, lambda: os.path.getsize(path))
+            except OSError as err:
+                # Moved or deleted since the change was seen.
+                LOGGER.debug("Skipping %s: %s", path, err)
+                return True
+
+        sink = None
+        opened = None
+        try:
+            for paths in changes:
+                now = time.monotonic()
+                if sink is not None and roll_interval and now - opened >= roll_interval:
+                    sink.close()
+                    sink = None
+                if sink is None:
+                    sink = new_sink()
+                    sink.open(self.HEADERS)
+                    opened = now
+                # Excluded files are never reported, but the prefilter still applies.
+                paths = [path for path in paths if not skipped(path)]
+                scanned, matched = self.stats["files_scanned"], self.stats["files_matched"]
+                self._collect(
+                    itertools.chain.from_iterable(
+                        self._scan_walk(path, listed=True) for path in paths
+                    ),
+                    sink,
+                    set(),
+                )
+                if self.cache:
+                    self.cache.commit()
+                LOGGER.info(
+                    "Matched %d of %d changed files.",
+                    self.stats["files_matched"] - matched,
+                    self.stats["files_scanned"] - scanned,
+                )
+        finally:
+            if sink is not None:
+                sink.close()
 
     def get_results(self):
         """Flatten search_results into a list of tuples."""
         results = []
-        for match_str, result_rows in self.scan_results.items():
-            for name, md5, path in result_rows:
-                results.append((match_str, md5, name, path))
+        for result_rows in self.scan_results.values():
+            results.extend(result_rows)
         return results
 
 
+# The Scanner used by each worker process of a parallel scan.
+_WORKER_SCANNER = None
+
+
+def _init_worker(configs, log_level):
+    """Set up a worker process for Scanner._parallel_scan_walk()."""
+    # pylint: disable=W0603
+    # W0603 = global-statement
+    global _WORKER_SCANNER
+    # pylint: enable=W0603
+    LOGGER.setLevel(log_level)
+    # The parent process does the index lookups.
+    _WORKER_SCANNER = Scanner(dict(configs, jobs=1, index_file=None))
+
+
+def _scan_worker(item):
+    """
+    Scan one file or archive in a worker process.
+
+    Args:
+        item -- A (thing, wanted) tuple; see Scanner._scan_walk().
+
+    Returns:
+        A list of _scan_walk() tuples, and the scan statistics they added.
+    """
+    _WORKER_SCANNER.stats = {}
+    # pylint: disable=W0212
+    # W0212 = protected-access
+    # Workers are handed files and archives, never directories.
+    thing, wanted = item
+    results = list(_WORKER_SCANNER._scan_walk(thing, listed=True, wanted=wanted))
+    # pylint: enable=W0212
+    if _WORKER_SCANNER.cache:
+        _WORKER_SCANNER.cache.commit()
+    return results, _WORKER_SCANNER.stats
+
+
 # pylint: disable=R0903
 # R0903 = too-few-public-methods
 class Output:
@@ -353,19 +1699,44 @@ class Output:
         self.branding_logo = configs["branding_logo"]
         self.branding_text = configs["branding_text"]
 
+    @staticmethod
+    def _output_file(configs, extension):
+        """Set configs["output_file"] to a timestamped file in output_dir."""
+        parts = ["scan", strftime("%Y%m%d%H%M")]
+        if configs.get("shard"):
+            # Shards of the same scan run at different times.
+            parts.append("shard{0}of{1}".format(*configs["shard"]))
+        configs["output_file"] = os.path.join(configs["output_dir"], "-".join(parts))
+        configs["output_file"] += extension
+
     @classmethod
     def get_output(cls, headers, rows, configs):
         """Factory method for constructing the output object."""
-        configs["output_file"] = os.path.join(
-            configs["output_dir"], "-".join(["scan", strftime("%Y%m%d%H%M")])
-        )
         if configs["excel_output"]:
-            configs["output_file"] += ".xlsx"
+            cls._output_file(configs, ".xlsx")
             return ExcelOutput(headers, rows, configs)
+        if configs.get("parquet_output"):
+            cls._output_file(configs, ".parquet")
+            return ParquetOutput(headers, rows, configs)
 
-        configs["output_file"] += ".csv"
+        cls._output_file(configs, ".csv")
         return CSVOutput(headers, rows, configs)
 
+    @classmethod
+    def get_sink(cls, configs):
+        """
+        Factory method for constructing a Sink that writes the rows in the
+        stream_output format while the scan runs.
+        """
+        cls._output_file(configs, "." + configs["stream_output"])
+        return get_sink(
+            configs["stream_output"],
+            configs["output_file"],
+            configs["branding_text"],
+            configs["branding_logo"],
+            configs.get("flush_interval"),
+        )
+
     @abstractmethod
     def output(self):
         """Output the rows."""
@@ -380,21 +1751,14 @@ class CSVOutput(Output):
 
     def output(self):
         """Output the rows."""
-        out_fh = sys.stdout
-        if self.output_file:
+        with CSVSink(self.output_file, self.branding_text) as sink:
             try:
-                make_dir_safe(os.path.dirname(self.output_file))
+                sink.open(self.header)
             except IOError:
                 LOGGER.error("Can't open file=%s", self.output_file)
                 raise
-        LOGGER.info("Writing output to %s", self.output_file)
-        with open(self.output_file, newline="", encoding="utf-8", mode="w") as out_fh:
-            csv_writer = csv.writer(out_fh, dialect="excel")
-            if self.branding_text:
-                csv_writer.writerow(self.branding_text)
-            csv_writer.writerow(self.header)
             for row in self.rows:
-                csv_writer.writerow(row)
+                sink.write(row)
 
 
 class ExcelOutput(Output):
@@ -403,51 +1767,26 @@ class ExcelOutput(Output):
 
     """
 
-    CELL_BUFFER_CHARS = 1
-    CHAR_PIXEL_WIDTH = 8.63
-    CHAR_PIXEL_HEIGHT = 16
+    def output(self):
+        """Output the rows."""
+        with ExcelSink(self.output_file, self.branding_text, self.branding_logo) as sink:
+            sink.open(self.header)
+            for row in self.rows:
+                sink.write(row)
 
-    def set_col_widths(self, sheet):
-        """
-        Calculate sheet column widths sufficient to fit the longest data value.
 
-        Args:
-            workbook - An XlsxWriter Workbook containing the columns to resize.
-            logo_img_char_width - If using a branding_logo, the width, in 12-pica "characters",
-            of the image.
-        """
-        for col_num, col_vals in enumerate(tuple(zip(self.header, *self.rows))):
-            max_width = 1
-            for col_val in col_vals:
-                if len(col_val) > max_width:
-                    max_width = len(col_val)
-            sheet.set_column(col_num, col_num, max_width + self.CELL_BUFFER_CHARS)
+class ParquetOutput(Output):
+    """
+    Outputter for columnar Parquet (.parquet) output. Requires the optional
+    pyarrow package.
+    """
 
     def output(self):
         """Output the rows."""
-        workbook = xlsxwriter.Workbook(self.output_file)
-        sheet = workbook.add_worksheet()
-        row_num = 0
-        if self.branding_logo and os.path.exists(self.branding_logo):
-            sheet.insert_image(row_num, 0, self.branding_logo)
-            with Image.open(self.branding_logo) as img:
-                row_num += math.ceil(img.size[1] / self.CHAR_PIXEL_HEIGHT)
-        if self.branding_text:
-            sheet.write(row_num, 0, self.branding_text)
-            row_num += 2
-
-        for col_num, cell_value in enumerate(self.header):
-            sheet.write(row_num, col_num, cell_value)
-
-        for row in self.rows:
-            row_num += 1
-            for col_num, cell_value in enumerate(row):
-                sheet.write(row_num, col_num, cell_value)
-
-        self.set_col_widths(sheet)
-
-        LOGGER.info("Writing output to %s", self.output_file)
-        workbook.close()
+        with ParquetSink(self.output_file) as sink:
+            sink.open(self.header)
+            for row in self.rows:
+                sink.write(row)
 
 
 # pylint: enable=R0903
@@ -0,0 +1,145 @@
+"""Split a scan into shards that run on separate hosts, and merge their results."""
+
+# Import Python standard modules.
+import csv
+import json
+import zlib
+
+# Import 3rd party modules.
+
+# Import project modules.
+from .sinks import INTEGER_COLUMNS
+from .utils import LOGGER
+
+# Define constants.
+# Formats of the partial results that merge_results() reads.
+MERGE_FORMATS = (".csv", ".jsonl")
+
+
+def parse_shard(spec):
+    """
+    Parse a shard spec.
+
+    Args:
+        spec -- A string such as "3/16", for the third of 16 shards.
+
+    Raises:
+        ValueError
+
+    Returns:
+        An (index, count) tuple, with index counted from 1.
+    """
+    index, _, count = spec.partition("/")
+    index, count = int(index), int(count)
+    if not 1 <= index <= count:
+        raise ValueError("Invalid shard {0}".format(spec))
+    return index, count
+
+
+def shard_of(relative, count):
+    """
+    Assign a file to a shard by the CRC-32 of its path, which spreads files
+    evenly, and is the same on every host, whatever the order of the walk.
+
+    Args:
+        relative -- The "/"-separated path of the file, relative to the
+            scan root.
+        count -- The number of shards.
+
+    Returns:
+        The shard, counted from 1.
+    """
+    return zlib.crc32(relative.encode("utf-8", "surrogateescape")) % count + 1
+
+
+def _read_csv(path):
+    """Read the header and rows of a CSV results file."""
+    with open(path, newline="", encoding="utf-8") as fid:
+        reader = csv.reader(fid, dialect="excel")
+        # Skip the branding text, if any.
+        for header in reader:
+            if "Name" in header and "Location" in header:
+                break
+        else:
+            return None, []
+        integers = [i for i, label in enumerate(header) if label in INTEGER_COLUMNS]
+        rows = []
+        for row in reader:
+            for i in integers:
+                row[i] = int(row[i]) if row[i] else None
+            rows.append(tuple(row))
+    return tuple(header), rows
+
+
+def _read_jsonl(path):
+    """Read the header and rows of a JSON Lines results file."""
+    header = None
+    rows = []
+    with open(path, encoding="utf-8") as fid:
+        for line in fid:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if header is None:
+                header = tuple(record)
+            rows.append(tuple(record.get(label) for label in header))
+    return header, rows
+
+
+def merge_results(paths):
+    """
+    Merge the partial results of the shards of a scan.
+
+    Rows that more than one file holds, such as those of a shard that was run
+    twice, are only kept once. A row is keyed by all of its columns, digest
+    included, as copies of the same content at different locations are
+    reported separately by a single scan too.
+
+    Args:
+        paths -- The CSV (.csv) or JSON Lines (.jsonl) results of each shard,
+            as written by --shard.
+
+    Raises:
+        ValueError -- If a file isn't in one of MERGE_FORMATS, or the files
+            have different columns.
+
+    Returns:
+        A (header, rows) tuple.
+    """
+    header = None
+    seen = set()
+    rows = []
+    digests = set()
+    for path in paths:
+        if path.endswith(".csv"):
+            file_header, file_rows = _read_csv(path)
+        elif path.endswith(".jsonl"):
+            file_header, file_rows = _read_jsonl(path)
+        else:
+            raise ValueError(
+                "Can't merge {0}; use one of: {1}".format(path, ", ".join(MERGE_FORMATS))
+            )
+        if file_header is None:
+            LOGGER.warning("No results in %s", path)
+            continue
+        if header is None:
+            header = file_header
+        elif file_header != header:
+            raise ValueError(
+                "{0} has columns {1}, not {2}".format(path, file_header, header)
+            )
+        digest = header.index("Name") - 1
+        kept = 0
+        for row in file_rows:
+            if row not in seen:
+                seen.add(row)
+                rows.append(row)
+                digests.add(row[digest])
+                kept += 1
+        LOGGER.info(
+            "Merged %d of %d rows from %s.", kept, len(file_rows), path
+        )
+    LOGGER.info(
+        "Merge complete. %d rows, for %d distinct digests.", len(rows), len(digests)
+    )
+    return header, rows
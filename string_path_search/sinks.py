@@ -0,0 +1,457 @@
+"""Destinations for result rows, written while the scan is still running."""
+
+# Import Python standard modules.
+from abc import ABC, abstractmethod
+import csv
+import json
+import math
+import os
+import sqlite3
+import time
+
+# Import 3rd party modules.
+import xlsxwriter
+from PIL import Image
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Import project modules.
+from .utils import LOGGER, make_dir_safe
+
+# Define constants.
+SINK_FORMATS = ("csv", "jsonl", "parquet", "sqlite", "xlsx")
+# Commit to disk after this many SQLite inserts.
+SQLITE_COMMIT_INTERVAL = 10000
+# Default number of seconds between flushes of streamed output.
+FLUSH_INTERVAL = 5.0
+# Number of rows buffered for each Parquet row group.
+PARQUET_ROW_GROUP_SIZE = 100000
+# Labels of the columns that hold integers rather than text.
+INTEGER_COLUMNS = ("Offset", "Line")
+# Labels of the columns whose values repeat a lot.
+REPETITIVE_COLUMNS = ("String", "Name", "Location")
+
+
+class Sink:
+    """
+    Base class for the result sinks.
+
+    Scanner.scan(sink) calls open() with the column labels, write() once for
+    each (string, digest, name, location) row as soon as it is found, and
+    close() when the scan is over, so only one row is held at a time. Rows
+    may have other columns, such as the offset, line, and context of a match,
+    or no string when only files are reported; the labels tell them apart.
+    Columns in INTEGER_COLUMNS hold integers (or None).
+    """
+
+    def open(self, header):
+        """
+        Start writing.
+
+        Args:
+            header -- The column labels.
+        """
+
+    def write(self, row):
+        """
+        Write one row.
+
+        Args:
+            row -- A tuple with one value per column label.
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Called by Scanner.scan() after each file, so that sinks can make the
+        rows written so far visible to readers now and then.
+        """
+
+    def close(self):
+        """Finish writing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CallbackSink(Sink):
+    """Hand each row to a function."""
+
+    def __init__(self, callback):
+        """
+        Set it up.
+
+        Args:
+            callback -- A function called with each row.
+        """
+        self.callback = callback
+
+    def write(self, row):
+        self.callback(row)
+
+
+class FileSink(Sink, ABC):
+    """
+    Abstract base class for the sinks that write to a file. Subclasses
+    write the rows, and count them in rows.
+    """
+
+    def __init__(self, output_file, flush_interval=None):
+        """
+        Set it up.
+
+        Args:
+            output_file -- The file to write.
+            flush_interval -- Flush the file to disk at most this often, in
+                seconds, while it is being written (Default: only flush as
+                buffers fill up and on close).
+        """
+        self.output_file = output_file
+        self.flush_interval = flush_interval
+        self.flushed = time.monotonic()
+        self.rows = 0
+
+    def open(self, header):
+        make_dir_safe(os.path.dirname(self.output_file) or ".")
+        LOGGER.info("Writing output to %s", self.output_file)
+
+    @abstractmethod
+    def write(self, row):
+        """Write one row; see Sink.write()."""
+
+    def flush(self):
+        if self.flush_interval is None:
+            return
+        now = time.monotonic()
+        if now - self.flushed >= self.flush_interval:
+            self._flush()
+            self.flushed = now
+
+    def _flush(self):
+        """Make the rows written so far visible to readers of the file."""
+
+
+class CSVSink(FileSink):
+    """Write rows to a CSV file."""
+
+    def __init__(self, output_file, branding_text=None, flush_interval=None):
+        """
+        Set it up.
+
+        Args:
+            output_file -- The file to write.
+            branding_text -- A row to write before the header (Default: None).
+            flush_interval -- See FileSink (Default: None).
+        """
+        super().__init__(output_file, flush_interval)
+        self.branding_text = branding_text
+        self.out_fh = None
+        self.csv_writer = None
+
+    def open(self, header):
+        super().open(header)
+        self.out_fh = open(self.output_file, newline="", encoding="utf-8", mode="w")
+        self.csv_writer = csv.writer(self.out_fh, dialect="excel")
+        if self.branding_text:
+            self.csv_writer.writerow(self.branding_text)
+        self.csv_writer.writerow(header)
+
+    def write(self, row):
+        self.csv_writer.writerow(row)
+        self.rows += 1
+
+    def _flush(self):
+        self.out_fh.flush()
+
+    def close(self):
+        if self.out_fh:
+            self.out_fh.close()
+            self.out_fh = None
+
+
+class JSONLSink(FileSink):
+    """
+    Write rows to a JSON Lines file, as one object keyed by the header per line.
+
+    With a flush_interval, consumers such as log shippers can follow the file
+    while the scan is still running.
+    """
+
+    def __init__(self, output_file, flush_interval=None):
+        super().__init__(output_file, flush_interval)
+        self.out_fh = None
+        self.header = None
+
+    def open(self, header):
+        super().open(header)
+        self.header = header
+        self.out_fh = open(self.output_file, encoding="utf-8", mode="w")
+
+    def write(self, row):
+        self.out_fh.write(json.dumps(dict(zip(self.header, row)), ensure_ascii=False))
+        self.out_fh.write("\n")
+        self.rows += 1
+
+    def _flush(self):
+        self.out_fh.flush()
+
+    def close(self):
+        if self.out_fh:
+            self.out_fh.close()
+            self.out_fh = None
+
+
+class SQLiteSink(FileSink):
+    """
+    Write rows to the results table of an SQLite database. The header labels
+    are kept in the columns table.
+
+    Columns are named after their lowercased labels, except that the digest
+    column is always named digest, whatever the algorithm.
+    """
+
+    def __init__(self, output_file, flush_interval=None):
+        super().__init__(output_file, flush_interval)
+        self.connection = None
+        self.insert = None
+
+    def open(self, header):
+        super().open(header)
+        names = tuple(
+            "digest" if label.endswith("Digest") else label.lower().replace(" ", "_")
+            for label in header
+        )
+        columns = ", ".join(
+            "{0} {1}".format(name, "INTEGER" if label in INTEGER_COLUMNS else "TEXT")
+            for name, label in zip(names, header)
+        )
+        self.connection = sqlite3.connect(self.output_file)
+        self.connection.executescript(
+            "DROP TABLE IF EXISTS results;"
+            "DROP TABLE IF EXISTS columns;"
+            "CREATE TABLE results ({0});"
+            "CREATE TABLE columns (name TEXT, label TEXT);".format(columns)
+        )
+        self.connection.executemany(
+            "INSERT INTO columns VALUES (?, ?)", zip(names, header)
+        )
+        self.insert = "INSERT INTO results VALUES ({0})".format(
+            ", ".join("?" for _ in header)
+        )
+
+    def write(self, row):
+        self.connection.execute(self.insert, row)
+        self.rows += 1
+        if self.rows % SQLITE_COMMIT_INTERVAL == 0:
+            self.connection.commit()
+
+    def _flush(self):
+        self.connection.commit()
+
+    def close(self):
+        if self.connection:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+
+class ExcelSink(FileSink):
+    """
+    Write rows to a Microsoft Excel (.xlsx) workbook.
+
+    In constant_memory mode, xlsxwriter flushes each row to disk as soon as
+    the next one starts. Column widths are tracked as the rows go by, and rows
+    past the end of a worksheet continue on a new one, under a copy of the
+    header.
+    """
+
+    CELL_BUFFER_CHARS = 1
+    CHAR_PIXEL_WIDTH = 8.63
+    CHAR_PIXEL_HEIGHT = 16
+    # The most rows an Excel worksheet can hold.
+    MAX_ROWS = 1048576
+
+    def __init__(
+        self, output_file, branding_text=None, branding_logo=None, constant_memory=True
+    ):
+        """
+        Set it up.
+
+        Args:
+            output_file -- The file to write.
+            branding_text -- A cell value written before the header on the
+                first worksheet (Default: None).
+            branding_logo -- An image inserted before the header on the first
+                worksheet (Default: None).
+            constant_memory -- Flush each row to disk as soon as it is
+                written (Default: True).
+        """
+        super().__init__(output_file)
+        self.branding_text = branding_text
+        self.branding_logo = branding_logo
+        self.constant_memory = constant_memory
+        self.workbook = None
+        self.sheets = []
+        self.header = None
+        self.row_num = 0
+        self.col_widths = []
+
+    def open(self, header):
+        super().open(header)
+        self.header = header
+        self.col_widths = [max(len(label), 1) for label in header]
+        self.workbook = xlsxwriter.Workbook(
+            self.output_file, {"constant_memory": self.constant_memory}
+        )
+        self._add_sheet()
+
+    def _add_sheet(self):
+        """Start a new worksheet, and write the header to it."""
+        sheet = self.workbook.add_worksheet()
+        self.row_num = 0
+        if not self.sheets:
+            if self.branding_logo and os.path.exists(self.branding_logo):
+                sheet.insert_image(self.row_num, 0, self.branding_logo)
+                with Image.open(self.branding_logo) as img:
+                    self.row_num += math.ceil(img.size[1] / self.CHAR_PIXEL_HEIGHT)
+            if self.branding_text:
+                sheet.write(self.row_num, 0, self.branding_text)
+                self.row_num += 2
+        self.sheets.append(sheet)
+        sheet.write_row(self.row_num, 0, self.header)
+
+    def write(self, row):
+        self.row_num += 1
+        if self.row_num >= self.MAX_ROWS:
+            self._add_sheet()
+            self.row_num += 1
+        self.sheets[-1].write_row(self.row_num, 0, row)
+        for col_num, cell_value in enumerate(row):
+            if cell_value is None:
+                continue
+            width = len(str(cell_value))
+            if width > self.col_widths[col_num]:
+                self.col_widths[col_num] = width
+        self.rows += 1
+
+    def close(self):
+        if self.workbook:
+            for sheet in self.sheets:
+                for col_num, width in enumerate(self.col_widths):
+                    sheet.set_column(col_num, col_num, width + self.CELL_BUFFER_CHARS)
+            self.workbook.close()
+            self.workbook = None
+
+
+class ParquetSink(FileSink):
+    """
+    Write rows to a compressed, columnar Parquet file with the optional pyarrow
+    package.
+
+    Rows are buffered column by column and written out one row group at a
+    time. The REPETITIVE_COLUMNS are dictionary encoded; digests are not.
+    Columns in INTEGER_COLUMNS are stored as 64-bit integers, and the rest as
+    strings.
+    """
+
+    def __init__(
+        self, output_file, row_group_size=PARQUET_ROW_GROUP_SIZE, compression="zstd"
+    ):
+        """
+        Set it up.
+
+        Args:
+            output_file -- The file to write.
+            row_group_size -- The number of rows in each row group
+                (Default: PARQUET_ROW_GROUP_SIZE).
+            compression -- The Parquet compression codec (Default: zstd).
+        """
+        if pyarrow is None:
+            raise ValueError("Parquet output requires the pyarrow package")
+        super().__init__(output_file)
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.schema = None
+        self.writer = None
+        self.columns = []
+
+    def open(self, header):
+        super().open(header)
+        self.schema = pyarrow.schema(
+            [
+                pyarrow.field(
+                    label,
+                    pyarrow.int64() if label in INTEGER_COLUMNS else pyarrow.string(),
+                )
+                for label in header
+            ]
+        )
+        self.writer = pyarrow.parquet.ParquetWriter(
+            self.output_file,
+            self.schema,
+            compression=self.compression,
+            use_dictionary=[label for label in header if label in REPETITIVE_COLUMNS],
+        )
+        self.columns = [[] for _ in header]
+
+    def write(self, row):
+        for column, cell_value in zip(self.columns, row):
+            column.append(cell_value)
+        self.rows += 1
+        if len(self.columns[0]) >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self):
+        """Write the buffered rows as one row group."""
+        if self.columns and self.columns[0]:
+            self.writer.write_table(
+                pyarrow.Table.from_arrays(self.columns, schema=self.schema),
+                row_group_size=self.row_group_size,
+            )
+            self.columns = [[] for _ in self.columns]
+
+    def close(self):
+        if self.writer:
+            self._write_row_group()
+            self.writer.close()
+            self.writer = None
+
+
+def get_sink(
+    output_format,
+    output_file,
+    branding_text=None,
+    branding_logo=None,
+    flush_interval=None,
+):
+    """
+    Factory method for constructing a file sink.
+
+    Args:
+        output_format -- One of SINK_FORMATS.
+        output_file -- The file to write.
+        branding_text -- A row written before the header, CSV and xlsx only
+            (Default: None).
+        branding_logo -- An image inserted before the header, xlsx only
+            (Default: None).
+        flush_interval -- Seconds between flushes, CSV, JSONL, and SQLite only
+            (Default: None).
+    """
+    if output_format == "xlsx":
+        return ExcelSink(output_file, branding_text, branding_logo)
+    if output_format == "csv":
+        return CSVSink(output_file, branding_text, flush_interval)
+    if output_format == "jsonl":
+        return JSONLSink(output_file, flush_interval)
+    if output_format == "parquet":
+        return ParquetSink(output_file)
+    if output_format == "sqlite":
+        return SQLiteSink(output_file, flush_interval)
+    raise ValueError("Unknown output format {0}".format(output_format))
@@ -1,14 +1,21 @@
 """Grab-bag of utility functions."""
 
 # Import Python standard modules.
+from collections import OrderedDict
+import hashlib
 from hashlib import md5
 import logging
 import os
 import random
 import string
 import sys
+import threading
 
 # Import 3rd party modules.
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
 
 # Define constants.
 
@@ -21,6 +28,16 @@ LEVEL_STRINGS = {
     logging.CRITICAL: "CRITICAL",
     logging.NOTSET: "NOTSET",
 }
+SIZE_SUFFIXES = {"K": 2 ** 10, "M": 2 ** 20, "G": 2 ** 30}
+# Digest algorithms, and their names in report headers. xxh64 is a fast,
+# non-cryptographic hash from the optional xxhash package.
+DIGEST_ALGORITHMS = {
+    "md5": "MD5",
+    "sha1": "SHA-1",
+    "sha256": "SHA-256",
+    "blake2b": "BLAKE2b",
+    "xxh64": "XXH64",
+}
 LOGGER = None
 
 
@@ -62,6 +79,145 @@ def calculate_md5(data):
     return md5(my_bytes).hexdigest()
 
 
+def new_digest(algorithm="md5"):
+    """
+    Start a new digest.
+
+    Arguments:
+        algorithm -- One of DIGEST_ALGORITHMS (Default: md5).
+
+    Raises:
+        ValueError
+
+    Returns:
+        A hashlib-style object with update() and hexdigest() methods.
+    """
+    if algorithm not in DIGEST_ALGORITHMS:
+        raise ValueError("Unknown digest algorithm {0}".format(algorithm))
+    if algorithm == "xxh64":
+        if xxhash is None:
+            raise ValueError("The xxh64 digest requires the xxhash package")
+        return xxhash.xxh64()
+    return hashlib.new(algorithm)
+
+
+def calculate_digest(data, algorithm="md5"):
+    """
+    Calculate the digest of a bytes-like object or string.
+
+    Arguments:
+        data -- A string or bytes-like object for which to calculate a digest.
+        algorithm -- One of DIGEST_ALGORITHMS (Default: md5).
+
+    Returns:
+        The digest as a (lowercase) hexidecimal string.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    digest = new_digest(algorithm)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def parse_size(size):
+    """
+    Convert a size string, with an optional K, M, or G suffix, into bytes.
+
+    Arguments:
+        size -- A size, e.g. "4096", "64K", or "1G".
+
+    Raises:
+        ValueError
+
+    Returns:
+        The size as an integer number of bytes.
+    """
+    size = size.strip().upper()
+    multiplier = 1
+    if size and size[-1] in SIZE_SUFFIXES:
+        multiplier = SIZE_SUFFIXES[size[-1]]
+        size = size[:-1]
+    value = int(size) * multiplier
+    if value < 0:
+        raise ValueError("Size must not be negative")
+    return value
+
+
+class MemoryBudget:
+    """A thread-safe count of bytes that may still be held in memory."""
+
+    def __init__(self, limit):
+        """
+        Set it up.
+
+        Args:
+            limit -- The number of bytes in the budget.
+        """
+        self.available = limit
+        self.lock = threading.Lock()
+
+    def reserve(self, size):
+        """Take size bytes from the budget. Return False if they aren't available."""
+        with self.lock:
+            if size > self.available:
+                return False
+            self.available -= size
+            return True
+
+    def release(self, size):
+        """Return size bytes to the budget."""
+        with self.lock:
+            self.available += size
+
+
+class LRUCache:
+    """
+    A mapping that holds at most limit bytes of values, evicting the least
+    recently used entries first. Callers give the size of each value.
+    """
+
+    def __init__(self, limit):
+        """
+        Set it up.
+
+        Args:
+            limit -- The number of bytes the cached values may hold.
+        """
+        self.limit = limit
+        self.used = 0
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """Return the value for key, marking it most recently used."""
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key][0]
+
+    def put(self, key, value, size):
+        """
+        Add or replace the value for key.
+
+        Args:
+            key -- The key.
+            value -- The value.
+            size -- The approximate number of bytes held by key and value.
+                Values larger than the limit are not cached.
+        """
+        if key in self.entries:
+            self.used -= self.entries.pop(key)[1]
+        if size > self.limit:
+            return
+        self.entries[key] = (value, size)
+        self.used += size
+        while self.used > self.limit:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.used -= evicted
+
+
 def make_dir_safe(path, raise_errors=True):
     """
     Create a directory. Optionally, suppress exceptions.
@@ -0,0 +1,138 @@
+"""Walk directory trees without recursion, optionally listing them in several threads."""
+
+# Import Python standard modules.
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+# Import 3rd party modules.
+
+# Import project modules.
+from .utils import LOGGER
+
+# Define constants.
+# Most directories listed ahead of the walk, for each listing thread.
+WALK_AHEAD = 64
+
+
+def _list_dir(path):
+    """List a directory, returning its entries, or the OSError raised trying to."""
+    try:
+        with os.scandir(path) as entries:
+            return list(entries)
+    except OSError as err:
+        return err
+
+
+class _Lister:
+    """
+    List directories on demand, while a pool of threads lists the directories
+    expected next, up to WALK_AHEAD for each thread.
+    """
+
+    def __init__(self, threads):
+        """
+        Set it up.
+
+        Args:
+            threads -- The number of listing threads. With 1, directories are
+                only listed on demand.
+        """
+        self.pool = None
+        if threads > 1:
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.limit = WALK_AHEAD * threads
+        # Directories being listed, and those waiting for a thread, by path.
+        self.listing = {}
+        self.waiting = collections.OrderedDict()
+
+    def expect(self, path):
+        """Start listing a directory that the walk will need."""
+        if self.pool is None:
+            return
+        if len(self.listing) < self.limit:
+            self.listing[path] = self.pool.submit(_list_dir, path)
+        else:
+            self.waiting[path] = None
+
+    def get(self, path):
+        """
+        List a directory, or wait for its listing to finish.
+
+        Returns:
+            The directory entries, or the OSError raised trying to list them.
+        """
+        future = self.listing.pop(path, None)
+        self.waiting.pop(path, None)
+        while self.waiting and len(self.listing) < self.limit:
+            waiting = self.waiting.popitem(last=False)[0]
+            self.listing[waiting] = self.pool.submit(_list_dir, waiting)
+        return _list_dir(path) if future is None else future.result()
+
+    def close(self):
+        """Abandon any listings in progress."""
+        if self.pool is not None:
+            for future in self.listing.values():
+                future.cancel()
+            self.pool.shutdown()
+
+
+def walk_dir(root, excluded=None, threads=1):
+    """
+    Walk a directory tree depth first, in os.scandir() order, from an explicit
+    stack rather than by recursion.
+
+    The file type that os.scandir() returns with each entry is used, rather
+    than a separate stat() call. Directories that can't be listed are logged
+    and skipped.
+
+    Args:
+        root -- The directory.
+        excluded -- A function of the "/"-separated path of an entry relative
+            to root and whether the entry is a directory, returning True if
+            the entry is excluded. Excluded directories are never listed
+            (Default: exclude nothing).
+        threads -- The number of threads listing directories ahead of the
+            walk, which helps on network filesystems (Default: 1).
+
+    Returns:
+        A generator of (relative path, os.DirEntry) tuples, for every entry
+        but the directories.
+    """
+    lister = _Lister(threads)
+    stack = []
+
+    def listed(path, relative):
+        """Push the (relative path, entry, is directory) tuples of a directory."""
+        LOGGER.info("Walking dir=%s", path)
+        entries = lister.get(path)
+        if isinstance(entries, OSError):
+            LOGGER.error("Can't list dir=%s: %s", path, entries)
+            entries = []
+        children = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if excluded is not None and excluded(relative + entry.name, is_dir):
+                continue
+            if is_dir:
+                lister.expect(entry.path)
+            children.append((relative + entry.name, entry, is_dir))
+        stack.append(iter(children))
+
+    try:
+        listed(root, "")
+        while stack:
+            child = next(stack[-1], None)
+            if child is None:
+                stack.pop()
+                continue
+            relative, entry, is_dir = child
+            if is_dir:
+                listed(entry.path, relative + "/")
+            else:
+                yield relative, entry
+    finally:
+        lister.close()
@@ -0,0 +1,320 @@
+"""Watch a directory tree for changed files, with inotify or by polling."""
+
+# Import Python standard modules.
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+
+# Import 3rd party modules.
+
+# Import project modules.
+from .utils import LOGGER
+from .walker import walk_dir
+
+# Define constants.
+# Seconds without a change before a burst of changes is reported.
+DEBOUNCE = 1.0
+# Report a burst that keeps going after this many debounce periods anyway.
+DEBOUNCE_LIMIT = 10
+# Seconds between polls, when inotify isn't available.
+POLL_INTERVAL = 5.0
+# inotify(7) event flags.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+)
+# struct inotify_event, up to its variable length name.
+EVENT_HEADER = struct.Struct("iIII")
+EVENT_BUFFER_SIZE = 2 ** 16
+
+
+def _libc():
+    """Return the C library, if it has the inotify functions."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+class _Tree:
+    """Base class for the watchers: the files under root, less the excluded ones."""
+
+    def __init__(self, root, excluded=None, walk_threads=1):
+        """
+        Set it up.
+
+        Args:
+            root -- The directory to watch.
+            excluded -- A function of a "/"-separated path relative to root
+                and whether it is a directory, returning True if the path is
+                excluded; see walk_dir() (Default: exclude nothing).
+            walk_threads -- The number of threads listing directories when
+                the tree is walked (Default: 1).
+        """
+        self.root = root
+        self.excluded = excluded
+        self.walk_threads = walk_threads
+
+    def _relative(self, path):
+        """Return path relative to root, "/"-separated."""
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def _files(self, path):
+        """Generate the (path, os.DirEntry) tuples of the files under a directory."""
+        prefix = "" if path == self.root else self._relative(path) + "/"
+
+        def excluded(relative, is_dir):
+            return self.excluded is not None and self.excluded(prefix + relative, is_dir)
+
+        for relative, entry in walk_dir(path, excluded, self.walk_threads):
+            yield os.path.join(path, relative.replace("/", os.sep)), entry
+
+    def changes(self, timeout):
+        """
+        Wait for files to change.
+
+        Args:
+            timeout -- The most seconds to wait, or None to wait for as long
+                as it takes.
+
+        Returns:
+            A set of the paths of the added and changed files, empty if none
+            changed in time.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Stop watching."""
+
+
+class Inotify(_Tree):
+    """
+    Watch a tree with Linux inotify, which costs nothing while nothing
+    changes. Every directory gets a watch, so very large trees can run into
+    the fs.inotify.max_user_watches limit, which raises OSError.
+    """
+
+    def __init__(self, root, excluded=None, walk_threads=1):
+        """
+        Set up the watches; see _Tree.
+
+        Raises:
+            OSError -- If inotify isn't available, or a watch can't be added.
+        """
+        super().__init__(root, excluded, walk_threads)
+        self.libc = _libc()
+        if self.libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = self.libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watched directories, by watch descriptor.
+        self.watches = {}
+        try:
+            self._watch_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _watch(self, path):
+        """Watch one directory."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, "Can't watch dir: {0}".format(os.strerror(err)), path)
+        self.watches[wd] = path
+
+    def _watch_tree(self, path):
+        """
+        Watch a directory and the directories under it.
+
+        Returns:
+            A set of the files under it.
+        """
+        self._watch(path)
+        files = set()
+        stack = [path]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as err:
+                LOGGER.error("Can't list dir=%s: %s", directory, err)
+                continue
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    is_dir = False
+                if self.excluded is not None and self.excluded(
+                    self._relative(entry.path), is_dir
+                ):
+                    continue
+                if is_dir:
+                    self._watch(entry.path)
+                    stack.append(entry.path)
+                else:
+                    files.add(entry.path)
+        return files
+
+    def _unwatch_tree(self, path):
+        """Forget the watches of a directory that was moved away."""
+        for wd, watched in list(self.watches.items()):
+            if watched == path or watched.startswith(path + os.sep):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def changes(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                LOGGER.warning("Missed some changes under %s; rescanning it", self.root)
+                changed.update(path for path, _ in self._files(self.root))
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            if wd not in self.watches or not name:
+                continue
+            path = os.path.join(self.watches[wd], name)
+            is_dir = bool(mask & IN_ISDIR)
+            if self.excluded is not None and self.excluded(self._relative(path), is_dir):
+                continue
+            if not is_dir:
+                changed.add(path)
+            elif mask & (IN_CREATE | IN_MOVED_TO):
+                # Files may have landed in the directory before it was watched.
+                try:
+                    changed.update(self._watch_tree(path))
+                except OSError as err:
+                    LOGGER.error("Can't watch dir=%s: %s", path, err)
+            elif mask & IN_MOVED_FROM:
+                self._unwatch_tree(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class Poller(_Tree):
+    """Watch a tree by walking it every poll_interval seconds and comparing stat()s."""
+
+    def __init__(self, root, excluded=None, walk_threads=1, poll_interval=POLL_INTERVAL):
+        """
+        Take the first snapshot; see _Tree.
+
+        Args:
+            poll_interval -- Seconds between walks (Default: POLL_INTERVAL).
+        """
+        super().__init__(root, excluded, walk_threads)
+        self.poll_interval = poll_interval
+        self.snapshot = self._snapshot()
+        self.polled = time.monotonic()
+
+    def _snapshot(self):
+        """Map the path of each file to its (size, mtime_ns)."""
+        snapshot = {}
+        for path, entry in self._files(self.root):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def changes(self, timeout):
+        # Changes can only be seen by polling, so a burst ends with a poll
+        # that finds nothing new, however short the timeout.
+        wait = self.polled + self.poll_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        snapshot = self._snapshot()
+        self.polled = time.monotonic()
+        changed = {
+            path for path, stat in snapshot.items() if self.snapshot.get(path) != stat
+        }
+        self.snapshot = snapshot
+        return changed
+
+
+def watch(
+    root, excluded=None, walk_threads=1, debounce=DEBOUNCE, poll_interval=None
+):
+    """
+    Watch a directory tree, and generate the files added or changed under it
+    in bursts.
+
+    Changes are collected until debounce seconds pass without another, so
+    that a file being written, or a batch of files being copied in, is
+    reported once, when it is done. A burst that doesn't let up is reported
+    after DEBOUNCE_LIMIT debounce periods anyway. Removed files are not
+    reported.
+
+    Args:
+        root -- The directory.
+        excluded -- See walk_dir() (Default: exclude nothing).
+        walk_threads -- See walk_dir() (Default: 1).
+        debounce -- Seconds of quiet that end a burst (Default: DEBOUNCE).
+        poll_interval -- Poll every poll_interval seconds rather than use
+            inotify (Default: use inotify, or poll every POLL_INTERVAL
+            seconds where it isn't available).
+
+    Returns:
+        A generator of sorted lists of file paths, one per burst, that never
+        ends.
+    """
+    watcher = None
+    if poll_interval is None:
+        try:
+            watcher = Inotify(root, excluded, walk_threads)
+            LOGGER.info("Watching %s with inotify", root)
+        except OSError as err:
+            LOGGER.warning("Can't use inotify (%s); polling %s instead", err, root)
+            poll_interval = POLL_INTERVAL
+    if watcher is None:
+        watcher = Poller(root, excluded, walk_threads, poll_interval)
+        LOGGER.info("Polling %s every %.1f seconds", root, poll_interval)
+    try:
+        pending = set()
+        started = None
+        while True:
+            changed = watcher.changes(debounce if pending else None)
+            if changed:
+                pending.update(changed)
+                started = started or time.monotonic()
+                if time.monotonic() - started < DEBOUNCE_LIMIT * debounce:
+                    continue
+            if pending:
+                # Files may be gone again by now.
+                burst = sorted(path for path in pending if os.path.isfile(path))
+                pending = set()
+                started = None
+                if burst:
+                    yield burst
+    finally:
+        watcher.close()
@@ -7,12 +7,54 @@ import sys
 import os
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from string_path_search.scanner import Scanner, CSVOutput, ExcelOutput, Output
+from string_path_search.cache import ScanCache, fingerprint
+from string_path_search.checkpoint import Checkpoint
+from string_path_search.filters import Exclusions, Prefilter
+from string_path_search import index
+from string_path_search.index import TrigramIndex, file_trigrams, trigrams
+from string_path_search import matchers
+from string_path_search.matchers import (
+    AhoCorasickMatcher,
+    MatchStream,
+    RegexMatcher,
+    SubstringMatcher,
+    TrieMatcher,
+    get_matcher,
+)
+from string_path_search import offsets
+from string_path_search.offsets import LineCounter, byte_span, snippet
+from string_path_search.sinks import (
+    CallbackSink,
+    CSVSink,
+    ExcelSink,
+    FileSink,
+    JSONLSink,
+    ParquetSink,
+    SQLiteSink,
+    get_sink,
+)
+from string_path_search import scanner
+from string_path_search.scanner import (
+    Scanner,
+    CSVOutput,
+    ExcelOutput,
+    Output,
+    ParquetOutput,
+)
+from string_path_search.shards import merge_results, parse_shard, shard_of
+from string_path_search import walker
+from string_path_search.walker import walk_dir
+from string_path_search import watcher
+from string_path_search.watcher import Inotify, Poller, watch
 from string_path_search.utils import (
     random_string,
+    calculate_digest,
     calculate_file_md5,
     calculate_md5,
     make_dir_safe,
+    parse_size,
+    LRUCache,
+    MemoryBudget,
     eprint,
     get_logger,
 )
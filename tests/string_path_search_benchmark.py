@@ -0,0 +1,442 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks for string_path_search.
+
+Usage:
+    python tests/string_path_search_benchmark.py [<benchmark> [...]]
+    where:
+        <benchmark> = One or more of the names in BENCHMARKS (Default: all).
+"""
+
+import codecs
+import csv
+import os
+import random
+import re
+import shutil
+import string
+import sys
+import time
+import unicodedata
+
+try:
+    import pyarrow.csv
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from string_path_search.matchers import RegexMatcher, ahocorasick, get_matcher
+from string_path_search.scanner import CSVOutput, ParquetOutput, Scanner
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+LARGE_DIR = os.path.join(DATA_DIR, "large", "files")
+
+
+def load_corpus(normalize=True):
+    """Read every file under tests/data/large, as normalized text by default."""
+    corpus = []
+    for entry in sorted(os.scandir(LARGE_DIR), key=lambda entry: entry.name):
+        with open(entry.path, "rb") as fid:
+            file_bytes = fid.read()
+        if normalize:
+            file_bytes = unicodedata.normalize(
+                "NFKD", codecs.decode(file_bytes, "utf-8", errors="ignore")
+            )
+        corpus.append(file_bytes)
+    return corpus
+
+
+def scanner_configs(**kwargs):
+    """Build a Scanner config dictionary for scanning tests/data/large."""
+    configs = dict(
+        ignore_case=False,
+        temp_dir=os.path.join(DATA_DIR, "..", "temp"),
+        scan_archives=False,
+        scan_root=LARGE_DIR,
+        search_strings=set(random_terms(100)),
+        exclusions=set(),
+    )
+    configs.update(kwargs)
+    return configs
+
+
+def random_terms(count, seed=1):
+    """Generate count random search terms, plus a few that occur in the corpus."""
+    rnd = random.Random(seed)
+    terms = {"Copyright (c)", "http://", "License", "return", "#include"}
+    while len(terms) < count:
+        terms.add("".join(rnd.choices(string.ascii_letters, k=rnd.randint(6, 20))))
+    return sorted(terms)
+
+
+def bench_match_engines():
+    """Compare matching engine throughput as the number of search strings grows."""
+    corpus = load_corpus()
+    megabytes = sum(len(text) for text in corpus) / 2 ** 20
+    engines = ["substring", "trie"]
+    if ahocorasick is not None:
+        engines.append("aho-corasick")
+    print("Searching {0} files, {1:.1f} MB".format(len(corpus), megabytes))
+    print("{0:>8} {1:>14} {2:>10} {3:>10}".format("strings", "engine", "compile s", "MB/s"))
+    for count in (10, 100, 1000, 10000, 50000):
+        terms = [(term, term) for term in random_terms(count)]
+        for engine in engines:
+            if engine == "substring" and count > 10000:
+                print("{0:>8} {1:>14} {2:>10}".format(count, engine, "skipped"))
+                continue
+            start = time.perf_counter()
+            matcher = get_matcher(terms, engine)
+            compiled = time.perf_counter()
+            for text in corpus:
+                for _ in matcher.find(text):
+                    pass
+            done = time.perf_counter()
+            print(
+                "{0:>8} {1:>14} {2:>10.2f} {3:>10.1f}".format(
+                    count, engine, compiled - start, megabytes / (done - compiled)
+                )
+            )
+
+
+def bench_byte_match():
+    """Compare the normalizing and raw byte matching paths of Scanner._scan_file."""
+    corpus = load_corpus(normalize=False)
+    megabytes = sum(len(file_bytes) for file_bytes in corpus) / 2 ** 20
+    print("Searching {0} files, {1:.1f} MB".format(len(corpus), megabytes))
+    print(
+        "{0:>8} {1:>12} {2:>12} {3:>10}".format(
+            "strings", "byte_match", "ignore_case", "MB/s"
+        )
+    )
+    for count in (5, 100):
+        for byte_match in (False, True):
+            for ignore_case in (False, True):
+                scanner = Scanner(
+                    scanner_configs(
+                        search_strings=set(random_terms(count)),
+                        byte_match=byte_match,
+                        ignore_case=ignore_case,
+                    )
+                )
+                start = time.perf_counter()
+                for file_bytes in corpus:
+                    for _ in scanner._scan_file(file_bytes):
+                        pass
+                elapsed = time.perf_counter() - start
+                print(
+                    "{0:>8} {1:>12} {2:>12} {3:>10.1f}".format(
+                        count, str(byte_match), str(ignore_case), megabytes / elapsed
+                    )
+                )
+
+
+def bench_parallel_scan():
+    """Compare Scanner.scan() wall time on tests/data/large as jobs increases."""
+    jobs = 1
+    serial = None
+    print("{0:>5} {1:>10} {2:>8}".format("jobs", "seconds", "speedup"))
+    while jobs <= max(os.cpu_count() or 1, 2):
+        # Many strings with the trie engine keep the scan CPU-bound.
+        scanner = Scanner(
+            scanner_configs(
+                search_strings=set(random_terms(1000)), match_engine="trie", jobs=jobs
+            )
+        )
+        start = time.perf_counter()
+        scanner.scan()
+        elapsed = time.perf_counter() - start
+        serial = serial or elapsed
+        print("{0:>5} {1:>10.2f} {2:>8.2f}".format(jobs, elapsed, serial / elapsed))
+        jobs *= 2
+
+
+def bench_regex_terms():
+    """Compare RegexMatcher with a separate re.search() for each pattern."""
+    corpus = load_corpus()
+    megabytes = sum(len(text) for text in corpus) / 2 ** 20
+    print("Searching {0} files, {1:.1f} MB".format(len(corpus), megabytes))
+    print("{0:>8} {1:>14} {2:>10}".format("patterns", "method", "MB/s"))
+    for count in (10, 100, 300, 1000):
+        patterns = [re.escape(term) + r"\w*" for term in random_terms(count)]
+        matcher = RegexMatcher([(pattern, pattern) for pattern in patterns])
+        compiled = [re.compile(pattern) for pattern in patterns]
+        methods = [
+            ("RegexMatcher", lambda text: list(matcher.find(text))),
+            (
+                "separate",
+                lambda text: [
+                    pattern.pattern for pattern in compiled if pattern.search(text)
+                ],
+            ),
+        ]
+        for method, find in methods:
+            start = time.perf_counter()
+            for text in corpus:
+                find(text)
+            elapsed = time.perf_counter() - start
+            print("{0:>8} {1:>14} {2:>10.1f}".format(count, method, megabytes / elapsed))
+
+
+def bench_early_exit():
+    """Compare chunked scans of large logs whose matches are near the top."""
+    temp_dir = os.path.join(DATA_DIR, "..", "temp", "early-exit")
+    os.makedirs(temp_dir, exist_ok=True)
+    line = b"2020-01-01 00:00:00 INFO Nothing to see here, moving right along\n"
+    for num in range(4):
+        with open(os.path.join(temp_dir, "log{0}.txt".format(num)), "wb") as fid:
+            fid.write(b"2020-01-01 00:00:00 ERROR Connection refused\n")
+            fid.write(line * (64 * 2 ** 20 // len(line)))
+    print("Scanning 4 files, 256 MB")
+    print("{0:>8} {1:>8} {2:>10} {3:>8}".format("mode", "digest", "seconds", "stopped"))
+    for match_mode, digest_algorithm in (
+        ("all", "md5"),
+        ("all", "none"),
+        ("any", "none"),
+        ("files", "none"),
+    ):
+        scanner = Scanner(
+            scanner_configs(
+                scan_root=temp_dir,
+                search_strings={"ERROR", "Connection refused", "Traceback"},
+                chunk_size=2 ** 20,
+                match_mode=match_mode,
+                digest_algorithm=digest_algorithm,
+            )
+        )
+        start = time.perf_counter()
+        scanner.scan()
+        print(
+            "{0:>8} {1:>8} {2:>10.2f} {3:>8}".format(
+                match_mode,
+                digest_algorithm,
+                time.perf_counter() - start,
+                scanner.stats["files_stopped_early"],
+            )
+        )
+    for entry in os.scandir(temp_dir):
+        os.remove(entry.path)
+    os.rmdir(temp_dir)
+
+
+def make_tree(root, files, files_per_dir=1000, fanout=10):
+    """Create a tree of empty files, fanout subdirectories wide at each level."""
+    dirs = [root]
+    while len(dirs) * files_per_dir < files:
+        dirs = [
+            os.path.join(parent, "d{0}".format(num))
+            for parent in dirs
+            for num in range(fanout)
+        ]
+    for num in range(files):
+        directory = dirs[num // files_per_dir]
+        if num % files_per_dir == 0:
+            os.makedirs(directory, exist_ok=True)
+        open(os.path.join(directory, "f{0}.txt".format(num)), "wb").close()
+
+
+def recursive_dir_walk(path):
+    """The recursive Scanner._dir_walk() that walk_dir() replaced, for comparison."""
+    for entry in os.scandir(path):
+        if os.path.isdir(entry.path):
+            yield from recursive_dir_walk(entry.path)
+        elif os.path.isfile(entry.path):
+            yield entry.path
+
+
+def bench_dir_walk():
+    """Compare listing a synthetic tree of a million files, recursively and not."""
+    temp_dir = os.path.join(DATA_DIR, "..", "temp", "dir-walk")
+    files = 10 ** 6
+    start = time.perf_counter()
+    make_tree(temp_dir, files)
+    print(
+        "Walking {0} files in {1} directories (built in {2:.0f} s)".format(
+            files, files // 1000, time.perf_counter() - start
+        )
+    )
+    scanners = {
+        threads: Scanner(scanner_configs(scan_root=temp_dir, walk_threads=threads))
+        for threads in (1, 2, 4)
+    }
+    walkers = [("recursive", recursive_dir_walk)] + [
+        ("walk_dir x{0}".format(threads), scanner._dir_walk)
+        for threads, scanner in scanners.items()
+    ]
+    print("{0:>14} {1:>10} {2:>12}".format("walker", "seconds", "files/s"))
+    for name, walk in walkers:
+        start = time.perf_counter()
+        count = sum(1 for _ in walk(temp_dir))
+        elapsed = time.perf_counter() - start
+        assert count == files
+        print("{0:>14} {1:>10.2f} {2:>12.0f}".format(name, elapsed, files / elapsed))
+    shutil.rmtree(temp_dir)
+
+
+def bench_trigram_index():
+    """Compare full and indexed scans of 40 copies of tests/data/large."""
+    temp_dir = os.path.join(DATA_DIR, "..", "temp", "trigram-index")
+    scan_root = os.path.join(temp_dir, "root")
+    for num in range(40):
+        shutil.copytree(LARGE_DIR, os.path.join(scan_root, "copy{0}".format(num)))
+    index_file = os.path.join(temp_dir, "index.db")
+    megabytes = 40 * sum(entry.stat().st_size for entry in os.scandir(LARGE_DIR)) / 2 ** 20
+    start = time.perf_counter()
+    indexed = Scanner(
+        scanner_configs(
+            scan_root=scan_root, index_file=index_file, build_index=True
+        )
+    ).build_index()
+    print(
+        "Indexed {0} files, {1:.1f} MB, in {2:.2f} s; the index is {3:.1f} MB".format(
+            indexed,
+            megabytes,
+            time.perf_counter() - start,
+            os.path.getsize(index_file) / 2 ** 20,
+        )
+    )
+    print("{0:>22} {1:>8} {2:>10} {3:>8}".format("string", "index", "seconds", "matched"))
+    for search_string in ("build.internal.example", "GNU General Public", "License"):
+        for use_index in (False, True):
+            scanner = Scanner(
+                scanner_configs(
+                    scan_root=scan_root,
+                    search_strings={search_string},
+                    index_file=index_file if use_index else None,
+                    # The copies would otherwise only be matched once.
+                    dedup_memory=0,
+                )
+            )
+            start = time.perf_counter()
+            scanner.scan()
+            print(
+                "{0:>22} {1:>8} {2:>10.2f} {3:>8}".format(
+                    search_string,
+                    str(use_index),
+                    time.perf_counter() - start,
+                    scanner.stats["files_matched"],
+                )
+            )
+    shutil.rmtree(temp_dir)
+
+
+def bench_index_update():
+    """Compare rebuilding and updating an index of 40 copies of tests/data/large."""
+    temp_dir = os.path.join(DATA_DIR, "..", "temp", "index-update")
+    scan_root = os.path.join(temp_dir, "root")
+    for num in range(40):
+        shutil.copytree(LARGE_DIR, os.path.join(scan_root, "copy{0}".format(num)))
+    configs = scanner_configs(
+        scan_root=scan_root,
+        index_file=os.path.join(temp_dir, "index.db"),
+        build_index=True,
+    )
+    start = time.perf_counter()
+    Scanner(configs).build_index()
+    print("Built the index in {0:.2f} s".format(time.perf_counter() - start))
+    # Change, add, and remove a handful of files.
+    copy = os.path.join(scan_root, "copy0")
+    names = sorted(os.listdir(copy))
+    for name in names[:5]:
+        with open(os.path.join(copy, name), "a") as fid:
+            fid.write("changed\n")
+    for name in names[5:10]:
+        os.remove(os.path.join(copy, name))
+    for num in range(5):
+        with open(os.path.join(copy, "added{0}.txt".format(num)), "w") as fid:
+            fid.write("added\n")
+    start = time.perf_counter()
+    stats = Scanner(configs).update_index()
+    print(
+        "Updated the index in {0:.2f} s: {1}".format(time.perf_counter() - start, stats)
+    )
+    start = time.perf_counter()
+    Scanner(configs).build_index()
+    print("Rebuilt the index in {0:.2f} s".format(time.perf_counter() - start))
+    shutil.rmtree(temp_dir)
+
+
+def read_csv(path):
+    """Load a CSV report with the standard library, returning the row count."""
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        return sum(1 for _ in csv.reader(csv_file, dialect="excel"))
+
+
+def bench_parquet_output():
+    """Compare the size and load time of CSV and Parquet reports."""
+    if pyarrow is None:
+        print("Skipped, pyarrow isn't installed")
+        return
+    rnd = random.Random(1)
+    terms = random_terms(100)
+    rows = [
+        (
+            rnd.choice(terms),
+            "%032x" % rnd.getrandbits(128),
+            "file{0}.c".format(rnd.randrange(10 ** 6)),
+            "/src/project{0}/module{1}/lib.jar/com/acme".format(
+                rnd.randrange(100), rnd.randrange(1000)
+            ),
+        )
+        for _ in range(10 ** 6)
+    ]
+    temp_dir = os.path.join(DATA_DIR, "..", "temp")
+    os.makedirs(temp_dir, exist_ok=True)
+    loaders = {
+        "csv": [
+            ("csv.reader", read_csv),
+            ("pyarrow.csv", lambda path: pyarrow.csv.read_csv(path).num_rows),
+        ],
+        "parquet": [
+            ("pyarrow.parquet", lambda path: pyarrow.parquet.read_table(path).num_rows)
+        ],
+    }
+    print("{0} rows".format(len(rows)))
+    print(
+        "{0:>8} {1:>8} {2:>9} {3:>16} {4:>8}".format(
+            "format", "MB", "write s", "loader", "load s"
+        )
+    )
+    for output_format, output_class in (("csv", CSVOutput), ("parquet", ParquetOutput)):
+        output_file = os.path.join(temp_dir, "benchmark." + output_format)
+        output = output_class(
+            Scanner.HEADERS,
+            rows,
+            dict(output_file=output_file, branding_logo=None, branding_text=None),
+        )
+        start = time.perf_counter()
+        output.output()
+        written = time.perf_counter() - start
+        megabytes = os.path.getsize(output_file) / 2 ** 20
+        for loader, load in loaders[output_format]:
+            start = time.perf_counter()
+            load(output_file)
+            print(
+                "{0:>8} {1:>8.1f} {2:>9.2f} {3:>16} {4:>8.2f}".format(
+                    output_format,
+                    megabytes,
+                    written,
+                    loader,
+                    time.perf_counter() - start,
+                )
+            )
+        os.remove(output_file)
+
+
+BENCHMARKS = {
+    "match-engines": bench_match_engines,
+    "byte-match": bench_byte_match,
+    "parallel-scan": bench_parallel_scan,
+    "parquet-output": bench_parquet_output,
+    "regex-terms": bench_regex_terms,
+    "early-exit": bench_early_exit,
+    "dir-walk": bench_dir_walk,
+    "trigram-index": bench_trigram_index,
+    "index-update": bench_index_update,
+}
+
+if __name__ == "__main__":
+    for name in sys.argv[1:] or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Scan cache unit tests."""
+
+import os
+
+from .context import ScanCache, fingerprint
+
+
+class TestScanCache:
+    """ScanCache class unit test class."""
+
+    @staticmethod
+    def test_fingerprint():
+        key = fingerprint({"foo", "bar"}, ignore_case=False)
+        assert key == fingerprint({"bar", "foo"}, ignore_case=False)
+        assert key != fingerprint({"foo", "bar"}, ignore_case=True)
+        assert key != fingerprint({"foo"}, ignore_case=False)
+
+    @staticmethod
+    def test_file_cache(tmp_path):
+        path = tmp_path / "file.txt"
+        path.write_text("foo")
+        stat = os.stat(path)
+        cache = ScanCache(str(tmp_path / "cache.db"), "key")
+        assert cache.get_file(str(path), stat) is None
+        cache.put_file(str(path), stat, "digest", ["foo"])
+        cache.close()
+
+        cache = ScanCache(str(tmp_path / "cache.db"), "key")
+        assert cache.get_file(str(path), stat) == ("digest", ["foo"])
+        path.write_text("foo bar")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert cache.get_file(str(path), os.stat(path)) is None
+        cache.close()
+
+        cache = ScanCache(str(tmp_path / "cache.db"), "other-key")
+        assert cache.get_file(str(path), stat) is None
+        cache.close()
+
+    @staticmethod
+    def test_content_cache(tmp_path):
+        cache = ScanCache(str(tmp_path / "cache.db"), "key")
+        assert cache.get_content("digest") is None
+        cache.put_content("digest", [])
+        assert cache.get_content("digest") == []
+        cache.close()
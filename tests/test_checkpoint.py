@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Scan checkpoint unit tests."""
+
+import os
+
+from .context import Checkpoint
+
+
+class TestCheckpoint:
+    """Scan checkpoint unit test class."""
+
+    @staticmethod
+    def test_save_and_load(tmp_path):
+        path = str(tmp_path / "scan.checkpoint")
+        checkpoint = Checkpoint(path, "key")
+        assert checkpoint.load() is None
+        checkpoint.add(("gpl", "d1", "a.c", "/src"))
+        checkpoint.save(3, "/src/a.c", {"files_scanned": 3})
+        # Rows added after the last save are lost with the scan.
+        checkpoint.add(("gpl", "d2", "b.c", "/src"))
+        checkpoint.connection.close()
+
+        checkpoint = Checkpoint(path, "key")
+        assert checkpoint.load() == (
+            3,
+            "/src/a.c",
+            {"files_scanned": 3},
+            [("gpl", "d1", "a.c", "/src")],
+        )
+        checkpoint.add(("gpl", None, "c.c", "/src", 10, 2, "the gpl"))
+        checkpoint.save(4, "/src/c.c", {"files_scanned": 4})
+        assert checkpoint.load()[3] == [
+            ("gpl", "d1", "a.c", "/src"),
+            ("gpl", None, "c.c", "/src", 10, 2, "the gpl"),
+        ]
+        checkpoint.remove()
+        assert not os.path.exists(path)
+
+    @staticmethod
+    def test_other_scan(tmp_path):
+        path = str(tmp_path / "scan.checkpoint")
+        checkpoint = Checkpoint(path, "key")
+        checkpoint.add(("gpl", "d1", "a.c", "/src"))
+        checkpoint.save(1, "/src/a.c", {})
+        checkpoint.connection.close()
+        # The checkpoint of another scan is discarded.
+        assert Checkpoint(path, "other").load() is None
+        assert Checkpoint(path, "key").load() is None
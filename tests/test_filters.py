@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Prefilter unit tests."""
+
+import os
+
+import pytest
+
+from .context import Exclusions, Prefilter
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+TEXT = "Copyright (c) 2019 The Regents of the University.\n" * 40
+
+
+class TestPrefilter:
+    """Prefilter unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "head, binary",
+        [
+            (b"", False),
+            (TEXT.encode("utf-8"), False),
+            ("Grüße aus Köln\n".encode("utf-8") * 100, False),
+            (TEXT.encode("utf-16"), False),
+            (TEXT.encode("utf-16-le"), False),
+            (TEXT.encode("utf-16-be"), False),
+            (b"\x89PNG\r\n\x1a\n" + b"IHDR" * 100, True),
+            (b"\x1f\x8b\x08" + b"x" * 100, True),
+            (b"\x00\x00\x00\x18ftypmp42" + b"x" * 100, True),
+            (TEXT.encode("utf-8")[:1000] + b"\x00" * 20, True),
+        ],
+    )
+    def test_binary(head, binary):
+        assert Prefilter.binary(head) is binary
+
+    @staticmethod
+    def test_binary_object():
+        with open(os.path.join(DATA_DIR, "small", "main.o"), "rb") as fid:
+            head = fid.read(4096)
+        assert Prefilter.binary(head)
+        # Object files without their magic number still have too many NULs.
+        assert Prefilter.binary(b"\x00" * 4 + head[4:])
+
+    @staticmethod
+    def test_skip():
+        sizes = []
+
+        def size_of():
+            sizes.append(1)
+            return 100
+
+        prefilter = Prefilter()
+        assert not prefilter.active
+        assert prefilter.skip("main.o", size_of) is None
+        # Sizes are only looked up when there is a size limit.
+        assert not sizes
+        prefilter = Prefilter(
+            min_size=10, max_size=1000, exclude_extensions={"o", ".PNG"}
+        )
+        assert prefilter.active
+        assert prefilter.skip("main.o", size_of) == "extension"
+        assert prefilter.skip("logo.png", size_of) == "extension"
+        assert prefilter.skip("main.c", size_of) is None
+        assert prefilter.skip("main.c", lambda: 9) == "size"
+        assert prefilter.skip("main.c", lambda: 1001) == "size"
+        prefilter = Prefilter(include_extensions={".c", ".tar.gz"})
+        assert prefilter.skip("MAIN.C", size_of) is None
+        assert prefilter.skip("zfs-1.7.0.tar.gz", size_of) is None
+        assert prefilter.skip("main.o", size_of) == "extension"
+        assert prefilter.skip("Makefile", size_of) == "extension"
+        assert len(sizes) == 1
+
+
+class TestExclusions:
+    """Exclusions unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "pattern, path, is_dir, excluded",
+        [
+            ("Value.java", "src/VALUE.java", False, True),
+            ("Value.java", "src/Value.java.bak", False, False),
+            ("*.min.js", "static/app.min.js", False, True),
+            ("*.min.js", "static/app.js", False, False),
+            ("build/", "x/build", True, True),
+            ("build/", "x/build", False, False),
+            ("/docs/api", "docs/api", True, True),
+            ("/docs/api", "x/docs/api", True, False),
+            ("docs/*.md", "docs/a.md", False, True),
+            ("docs/*.md", "docs/x/a.md", False, False),
+            ("**/node_modules/**", "node_modules", True, True),
+            ("**/node_modules/**", "a/b/node_modules", True, True),
+            ("**/node_modules/**", "a/node_modules.txt", False, False),
+            ("a/**/b", "a/b", True, True),
+            ("a/**/b", "a/x/y/b", False, True),
+            ("log[0-9].txt", "log7.txt", False, True),
+            ("log[!0-9].txt", "log7.txt", False, False),
+            ("# comment", "# comment", False, False),
+        ],
+    )
+    def test_excluded(pattern, path, is_dir, excluded):
+        assert Exclusions([pattern]).excluded(path, is_dir) is excluded
+
+    @staticmethod
+    def test_excluded_member():
+        exclusions = Exclusions(["node_modules", "/docs/api/", "*.pyc"])
+        assert exclusions.excluded_member("./pkg/node_modules/x/index.js")
+        assert exclusions.excluded_member("docs/api/index.html")
+        assert not exclusions.excluded_member("src/docs/api/index.html")
+        assert exclusions.excluded_member("src/a.pyc")
+        assert not exclusions.excluded_member("src/a.py")
+        assert not Exclusions().excluded_member("src/a.pyc")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Trigram index unit tests."""
+
+import io
+import os
+
+import pytest
+
+from .context import TrigramIndex, file_trigrams, index, trigrams
+
+
+def brute_force(data):
+    """Every trigram of data, one slice at a time."""
+    return {int.from_bytes(data[i : i + 3], "little") for i in range(len(data) - 2)}
+
+
+class TestIndex:
+    """Trigram index unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "data", [b"", b"ab", b"abc", b"abcd", b"abcdefghij", os.urandom(1001)]
+    )
+    def test_trigrams(data):
+        assert trigrams(data) == brute_force(data)
+
+    @staticmethod
+    @pytest.mark.parametrize("block_size", [1, 5, 2 ** 22])
+    def test_file_trigrams(monkeypatch, block_size):
+        monkeypatch.setattr(index, "INDEX_BLOCK_SIZE", block_size)
+        text = "Ünïcode ﬁle, Copyright (c)"
+        found = file_trigrams(io.BytesIO(text.encode("utf-8")))
+        for term in ("ﬁle", "FILE", "copyright (C)", "ünı"[:3]):
+            assert trigrams(index.normalized_bytes(term)) <= found
+        assert not trigrams(b"xyz") <= found
+        # ASCII text in UTF-16 is indexed as if it were UTF-8 too.
+        found = file_trigrams(io.BytesIO("Copyright (c)".encode("utf-16-le")))
+        assert trigrams(b"copyright") <= found
+
+    @staticmethod
+    def test_candidates(monkeypatch, tmp_path):
+        # Write each file's postings in a batch of its own.
+        monkeypatch.setattr(index, "INDEX_BATCH_SIZE", 1)
+        contents = {
+            "a.txt": "Copyright (c) 2019 Acme",
+            "b.txt": "copyright nobody",
+            "c.txt": "nothing to see here",
+        }
+        stat = os.stat(str(tmp_path))
+        trigram_index = TrigramIndex(str(tmp_path / "index.db"), "key")
+        trigram_index.clear()
+        for name, text in contents.items():
+            trigram_index.add_file(
+                name,
+                name,
+                "here",
+                "digest",
+                file_trigrams(io.BytesIO(text.encode("utf-8"))),
+            )
+            trigram_index.add_thing(name, stat, 1)
+        trigram_index.finish(str(tmp_path))
+        trigram_index.close()
+
+        trigram_index = TrigramIndex(str(tmp_path / "index.db"), "key")
+        assert trigram_index.usable(str(tmp_path))
+        assert not trigram_index.usable(str(tmp_path / "other"))
+        assert not TrigramIndex(str(tmp_path / "index.db"), "other").usable(
+            str(tmp_path)
+        )
+        assert trigram_index.candidates(["COPYRIGHT"]) == {
+            "a.txt": {("a.txt", "here")},
+            "b.txt": {("b.txt", "here")},
+        }
+        assert trigram_index.candidates(["Acme", "see"]) == {
+            "a.txt": {("a.txt", "here")},
+            "c.txt": {("c.txt", "here")},
+        }
+        assert trigram_index.candidates(["Copyright", "Mega"]) == {
+            "a.txt": {("a.txt", "here")},
+            "b.txt": {("b.txt", "here")},
+        }
+        assert trigram_index.candidates(["zzz"]) == {}
+        # Too short to rule anything out.
+        assert trigram_index.candidates(["Acme", "ab"]) is None
+        assert trigram_index.candidates([None]) is None
+        assert trigram_index.files("a.txt", stat) == 1
+        assert trigram_index.files("d.txt", stat) is None
+        trigram_index.close()
+
+    @staticmethod
+    def test_tombstones(tmp_path):
+        stat = os.stat(str(tmp_path))
+        path = str(tmp_path / "index.db")
+        trigram_index = TrigramIndex(path, "key")
+        for name in ("a.txt", "b.txt"):
+            trigram_index.add_file(
+                "x.zip", name, "x.zip", name, file_trigrams(io.BytesIO(b"copyright"))
+            )
+        trigram_index.add_thing("x.zip", stat, 2)
+        trigram_index.add_file(
+            "c.txt", "c.txt", "here", "c.txt", file_trigrams(io.BytesIO(b"copyright"))
+        )
+        trigram_index.add_thing("c.txt", stat, 1)
+        trigram_index.finish(str(tmp_path))
+        trigram_index.close()
+
+        # An update carries on numbering the files, and tombstones the old ones.
+        trigram_index = TrigramIndex(path, "key")
+        assert trigram_index.next_id == 3
+        assert trigram_index.entries("x.zip") == {
+            ("a.txt", "x.zip"): [(0, "a.txt")],
+            ("b.txt", "x.zip"): [(1, "b.txt")],
+        }
+        trigram_index.remove_file(0)
+        assert trigram_index.remove_thing("c.txt") == 1
+        trigram_index.add_file(
+            "x.zip", "a.txt", "x.zip", "new", file_trigrams(io.BytesIO(b"copyleft"))
+        )
+        trigram_index.finish(str(tmp_path))
+        assert sorted(trigram_index.things()) == ["x.zip"]
+        assert trigram_index.candidates(["copyright"]) == {"x.zip": {("b.txt", "x.zip")}}
+        assert trigram_index.candidates(["copy"]) == {
+            "x.zip": {("a.txt", "x.zip"), ("b.txt", "x.zip")}
+        }
+        trigram_index.close()
+
+    @staticmethod
+    def test_old_version(tmp_path):
+        path = str(tmp_path / "index.db")
+        trigram_index = TrigramIndex(path, "key")
+        trigram_index.finish(str(tmp_path))
+        trigram_index.connection.execute("UPDATE meta SET value = '1' WHERE key = 'version'")
+        trigram_index.close()
+        # Indexes with another schema are dropped, and so never usable.
+        trigram_index = TrigramIndex(path, "key")
+        assert not trigram_index.usable(str(tmp_path))
+        trigram_index.close()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Matching engine unit tests."""
+
+import pytest
+
+from .context import (
+    AhoCorasickMatcher,
+    MatchStream,
+    RegexMatcher,
+    SubstringMatcher,
+    TrieMatcher,
+    get_matcher,
+    matchers,
+)
+
+ENGINES = ["substring", "trie", "aho-corasick"]
+
+
+def make_matcher(engine, strings):
+    """Helper function to build a matcher, skipping engines that aren't installed."""
+    if engine == "aho-corasick":
+        pytest.importorskip("ahocorasick")
+    return get_matcher([(string, string) for string in strings], engine)
+
+
+class TestMatchers:
+    """Matching engine unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find(engine):
+        matcher = make_matcher(engine, ["foo", "bar", "baz", "qux"])
+        assert list(matcher.find("a foo walks into a baz")) == ["foo", "baz"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_overlapping(engine):
+        matcher = make_matcher(engine, ["foobar", "foo", "oba", "barx", "o"])
+        assert list(matcher.find("foobarx")) == ["foobar", "foo", "oba", "barx", "o"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_shared_needle(engine):
+        if engine == "aho-corasick":
+            pytest.importorskip("ahocorasick")
+        matcher = get_matcher([("fi", "fi"), ("fi", "ﬁ")], engine)
+        assert list(matcher.find("define")) == ["fi", "ﬁ"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_regex_metacharacters(engine):
+        matcher = make_matcher(engine, ["Copyright (c)", "a.b", "[x]"])
+        assert list(matcher.find("Copyright (c) axb [x]")) == ["Copyright (c)", "[x]"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_bytes(engine):
+        if engine == "aho-corasick":
+            pytest.importorskip("ahocorasick")
+        matcher = get_matcher([(b"foo", "foo"), (b"\xffbar", "bar")], engine)
+        assert list(matcher.find(b"xx\xffbar foo")) == ["foo", "bar"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_once_per_search_string(engine):
+        if engine == "aho-corasick":
+            pytest.importorskip("ahocorasick")
+        matcher = get_matcher(
+            [(b"foo", "foo"), ("foo".encode("utf-16-le"), "foo"), (b"bar", "bar")],
+            engine,
+        )
+        assert list(matcher.find("foo, f\0o\0o\0".encode("latin-1"))) == ["foo"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_empty_string(engine):
+        matcher = make_matcher(engine, ["", "foo"])
+        assert list(matcher.find("bar")) == [""]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_iter_matches(engine):
+        matcher = make_matcher(engine, ["ab", "abc", "bc"])
+        assert sorted(matcher.iter_matches("xabcab")) == [(3, 0), (4, 1), (4, 2), (6, 0)]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_first(engine):
+        matcher = make_matcher(engine, ["foo", "bar", "baz"])
+        found = list(matcher.find("bar baz foo", first=True))
+        assert len(found) == 1
+        assert found[0] in ("foo", "bar", "baz")
+        assert list(matcher.find("qux", first=True)) == []
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_iter_spans(engine):
+        matcher = make_matcher(engine, ["", "ab", "abc", "bc"])
+        assert sorted(matcher.iter_spans("xabcab")) == [
+            (0, 0, 0),
+            (1, 3, 1),
+            (1, 4, 2),
+            (2, 4, 3),
+            (4, 6, 1),
+        ]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ["trie", "aho-corasick"])
+    def test_engines_agree(engine):
+        words = ["alpha", "alp", "pha", "beta", "et", "gamma", "mm", "delta", "a"]
+        text = "the alphabet of gammas and deltas"
+        expected = list(make_matcher("substring", words).find(text))
+        assert list(make_matcher(engine, words).find(text)) == expected
+
+    @staticmethod
+    def test_auto_engine():
+        few = get_matcher([(str(num), str(num)) for num in range(10)])
+        assert isinstance(few, SubstringMatcher)
+        many = get_matcher([(str(num), str(num)) for num in range(1000)])
+        assert isinstance(many, (TrieMatcher, AhoCorasickMatcher))
+
+    @staticmethod
+    def test_unknown_engine():
+        with pytest.raises(ValueError):
+            get_matcher([("foo", "foo")], "grep")
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_match_stream(engine):
+        matcher = make_matcher(engine, ["foobar", "baz", "qux"])
+        stream = MatchStream(matcher)
+        for piece in ("xxfo", "o", "bar ba", "", "z"):
+            stream.feed(piece)
+        assert list(stream.strings()) == ["foobar", "baz"]
+        assert not stream.done
+        stream.feed("qux")
+        assert stream.done
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_find_buffer_windows(monkeypatch, engine):
+        # A memoryview, as of a memory-mapped file, is searched in windows.
+        monkeypatch.setattr(matchers, "WINDOW_SIZE", 4)
+        matcher = make_matcher(engine, [b"foobar", b"bar", b"x"])
+        haystack = b"xxfoobar barfoobarx"
+        expected = list(matcher.iter_spans(haystack))
+        assert list(matcher.iter_spans(memoryview(haystack))) == expected
+        assert list(matcher.find(memoryview(haystack))) == [b"foobar", b"bar", b"x"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_match_stream_spans(engine):
+        matcher = make_matcher(engine, ["", "foobar", "bar", "o"])
+        text = "xxfoobar barfoobarx"
+        expected = sorted(matcher.iter_spans(text))
+        for size in (1, 3, 7, len(text)):
+            stream = MatchStream(matcher)
+            spans = []
+            for offset in range(0, len(text), size):
+                spans.extend(stream.iter_spans(text[offset : offset + size]))
+            assert sorted(spans) == expected
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ENGINES)
+    def test_match_stream_first(engine):
+        matcher = make_matcher(engine, ["foobar", "baz"])
+        stream = MatchStream(matcher, first=True)
+        stream.feed("xxfoo")
+        assert not stream.done
+        stream.feed("bar baz")
+        assert stream.done
+        assert len(list(stream.strings())) == 1
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ["auto"] + ENGINES)
+    def test_regex_find(engine):
+        if engine == "aho-corasick":
+            pytest.importorskip("ahocorasick")
+        patterns = [r"Copyright \(c\) \d{4}", r"fo+bar", r"\bqux\b", r"[xy]z"]
+        matcher = RegexMatcher([(pattern, pattern) for pattern in patterns], engine=engine)
+        text = "Copyright (c) 2019 foooobar quxx"
+        assert list(matcher.find(text)) == patterns[:2]
+
+    @staticmethod
+    def test_regex_find_many():
+        # Enough patterns that the auto engine uses a literal prefilter.
+        patterns = [r"<{0}>\d+".format(num) for num in range(200)] + [r"\d{3}-x"]
+        matcher = RegexMatcher([(pattern, pattern) for pattern in patterns])
+        assert matcher.prefilter is not None
+        assert list(matcher.find("<7> <42>x <99>123 555-x")) == [
+            r"<99>\d+",
+            r"\d{3}-x",
+        ]
+
+    @staticmethod
+    def test_regex_ignore_case():
+        matcher = RegexMatcher([(r"Foo\w+", "Foo")], ignore_case=True, engine="trie")
+        assert list(matcher.find("foobar")) == ["Foo"]
+
+    @staticmethod
+    @pytest.mark.parametrize("engine", ["auto", "trie"])
+    def test_regex_ignore_case_non_ascii(engine):
+        # The haystack isn't casefolded, so a pattern with ß still matches.
+        matcher = RegexMatcher(
+            [("Straße", "Straße"), (r"licen[cs]e \w+", "license")],
+            ignore_case=True,
+            engine=engine,
+        )
+        assert list(matcher.find("STRAßE LICENSE Foo")) == ["Straße", "license"]
+
+    @staticmethod
+    def test_regex_iter_spans():
+        patterns = [r"a\d+", r"[xy]z", r"b+c"]
+        matcher = RegexMatcher([(pattern, pattern) for pattern in patterns])
+        assert list(matcher.iter_spans("a1 a22 bbc")) == [(0, 2, 0), (3, 6, 0), (7, 10, 2)]
+
+    @staticmethod
+    def test_regex_find_first():
+        patterns = [r"a\d+", r"b+c"]
+        matcher = RegexMatcher([(pattern, pattern) for pattern in patterns])
+        assert len(list(matcher.find("a1 bbc", first=True))) == 1
+
+    @staticmethod
+    def test_regex_match_stream(monkeypatch):
+        # Anchors, word boundaries and lookaround assertions see the text on
+        # either side of a piece, so none of these match at a piece boundary.
+        monkeypatch.setattr(matchers, "REGEX_OVERLAP", 8)
+        monkeypatch.setattr(matchers, "REGEX_CONTEXT", 2)
+        patterns = [r"^cd", r"\bcd", r"(?<=x)cd", r"cd\b", r"cd(?=y)", r"cd$", r"c+d"]
+        matcher = RegexMatcher([(pattern, pattern) for pattern in patterns])
+        text = "abcdefghijklmnopqrstuvwcdefghijklmncdzzzzzzzzzzzzzccdz"
+        expected = list(matcher.find(text))
+        assert expected == [r"c+d"]
+        for size in (1, 3, 7, 24, 37, len(text)):
+            stream = MatchStream(matcher)
+            for offset in range(0, len(text), size):
+                stream.feed(text[offset : offset + size])
+            stream.finish()
+            assert list(stream.strings()) == expected
+
+    @staticmethod
+    def test_regex_invalid():
+        with pytest.raises(ValueError):
+            RegexMatcher([("foo(", "foo(")])
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "pattern, ignore_case, literal",
+        [
+            (r"Copyright \(c\) \d{4}", False, "Copyright (c) "),
+            (r"Copyright \(c\) \d{4}", True, "copyright (c) "),
+            (r"a\d+bcd", False, "bcd"),
+            (r"ab|cd", False, None),
+            (r"(?i)foobar", False, None),
+            (r"\d+", False, None),
+        ],
+    )
+    def test_regex_required_literal(pattern, ignore_case, literal):
+        assert RegexMatcher._required_literal(pattern, ignore_case) == literal
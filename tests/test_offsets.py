@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Match location unit tests."""
+
+import unicodedata
+
+import pytest
+
+from .context import LineCounter, byte_span, offsets, snippet
+
+DATA = b"line one\n" + "ﬁle café foo\n".encode("utf-8") + b"\xff\xfebad foo\nend"
+
+
+def normalize(text):
+    """The Scanner's normalization, without casefolding."""
+    return unicodedata.normalize("NFKD", text)
+
+
+class TestOffsets:
+    """Match location unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize("block_size", [3, 2 ** 16])
+    def test_line_counter(monkeypatch, block_size):
+        monkeypatch.setattr(offsets, "BLOCK_SIZE", block_size)
+        counter = LineCounter(memoryview(DATA))
+        assert counter.seek(0) == 1
+        assert counter.seek(DATA.index(b"foo")) == 2
+        assert counter.seek(DATA.rindex(b"foo")) == 3
+        counter = LineCounter(DATA)
+        assert counter.next_lines(2) == DATA.index(b"\xff")
+        assert counter.line == 3
+        assert counter.next_lines(1) == DATA.index(b"end")
+        # There are no more lines to move to.
+        assert counter.next_lines(1) == len(DATA)
+
+    @staticmethod
+    @pytest.mark.parametrize("block_size", [3, 2 ** 16])
+    def test_byte_span(monkeypatch, block_size):
+        monkeypatch.setattr(offsets, "BLOCK_SIZE", block_size)
+        lines = normalize(DATA.decode("utf-8", errors="ignore")).split("\n")
+        line_start = DATA.index(b"\n") + 1
+        # The ligature and the accent both normalize to longer text.
+        for word in ("ﬁle", "café", "foo"):
+            start = lines[1].index(normalize(word))
+            end = start + len(normalize(word))
+            expected = DATA.index(word.encode("utf-8"))
+            assert byte_span(DATA, line_start, start, end, normalize) == (
+                expected,
+                expected + len(word.encode("utf-8")),
+            )
+        # The undecodable bytes are dropped from the text.
+        line_start = DATA.index(b"\xff")
+        assert byte_span(DATA, line_start, 4, 7, normalize) == (
+            DATA.rindex(b"foo"),
+            DATA.rindex(b"foo") + 3,
+        )
+        assert byte_span(DATA, line_start, 0, 0, normalize) == (
+            line_start + 2,
+            line_start + 2,
+        )
+
+    @staticmethod
+    def test_snippet():
+        start = DATA.index(b"caf")
+        # Characters cut in two by the edges of the context are dropped.
+        assert snippet(DATA, start, start + 5, 4) == "le café fo"
+        # Line breaks are squeezed out, and the start of the file limits the context.
+        assert snippet(DATA, 5, 8, 6) == "line one ﬁle"
+        # Long matches are cut short.
+        assert snippet(DATA, 0, len(DATA), 2) == "line"
@@ -4,20 +4,32 @@
 """Scanner class unit tests."""
 
 import csv
+import io
+import json
 import logging
 import os
 from pathlib import Path
+import re
 import pytest
 import shutil
+import unicodedata
+import zipfile
 import openpyxl
 
 from .context import (
+    CallbackSink,
     CSVOutput,
+    CSVSink,
     ExcelOutput,
+    JSONLSink,
     Output,
+    ParquetOutput,
     Scanner,
+    calculate_digest,
     calculate_file_md5,
     make_dir_safe,
+    matchers,
+    scanner,
 )
 
 DATA_DIR = "tests/data"
@@ -39,14 +51,46 @@ class TestScanner:
         return dict(
             branding_text=None,
             branding_logo=None,
+            build_index=False,
+            byte_match=False,
+            cache_file=None,
+            checkpoint_dir=None,
+            checkpoint_interval=60.0,
+            chunk_size=None,
+            context_bytes=40,
+            dedup_memory=16 * 2 ** 20,
+            digest_algorithm="md5",
+            digest_matches_only=False,
             excel_output=False,
+            exclude_extensions=set(),
+            flush_interval=5.0,
             ignore_case=False,
+            include_extensions=set(),
+            index_file=None,
+            jobs=1,
+            match_engine="auto",
+            match_mode="all",
+            max_offsets=10,
+            max_size=None,
+            min_size=None,
+            mmap_threshold=None,
+            offsets=False,
             log_level=logging.INFO,
             output_dir=OUTPUT_DIR,
+            parquet_output=False,
+            prefetch_depth=0,
+            prefetch_memory=64 * 2 ** 20,
+            resume=False,
             search_strings_file=None,
+            shard=None,
+            skip_binary=False,
             temp_dir=TEMP_DIR,
             scan_archives=False,
             scan_root=DATA_DIR,
+            spool_size=64 * 2 ** 20,
+            stream_output=None,
+            update_index=False,
+            walk_threads=1,
             exclusions_file=None,
             search_strings={"foo", "bar", "baz"},
             exclusions=set(),
@@ -165,6 +209,39 @@ class TestScanner:
         actual = obj.get_results()
         assert expected == actual
 
+    def test_byte_match_binary_file_scan(self, config):
+        file_to_scan = "main.o"
+        string_to_find = "(C) Aaron Newman"
+        scan_dir = os.path.join(DATA_DIR, "small")
+        expected = [generate_scan_result(string_to_find, scan_dir, file_to_scan)]
+        config["scan_root"] = os.path.join(scan_dir, file_to_scan)
+        config["search_strings"] = {string_to_find}
+        config["byte_match"] = True
+        obj = Scanner(config)
+        obj.scan()
+        actual = obj.get_results()
+        assert expected == actual
+
+    @pytest.mark.parametrize("byte_match", [False, True])
+    def test_byte_match_encodings(self, config, byte_match):
+        scan_dir = os.path.join(TEMP_DIR, "encodings")
+        make_dir_safe(scan_dir)
+        with open(os.path.join(scan_dir, "utf16.txt"), mode="wb") as f_h:
+            f_h.write("Copyright (C) ACME".encode("utf-16-le"))
+        with open(os.path.join(scan_dir, "nfkd.txt"), mode="wb") as f_h:
+            f_h.write(unicodedata.normalize("NFKD", "un café naïve").encode("utf-8"))
+        config["scan_root"] = scan_dir
+        config["search_strings"] = {"copyright (c)", "café"}
+        config["ignore_case"] = True
+        config["byte_match"] = byte_match
+        obj = Scanner(config)
+        obj.scan()
+        desired_results = {"café": ["nfkd.txt"]}
+        if byte_match:
+            desired_results["copyright (c)"] = ["utf16.txt"]
+        assert len(obj.get_results()) == len(desired_results)
+        assert self.contains_result(obj.get_results(), desired_results) is True
+
     def test_dir_scan(self, config):
         files_to_scan = [
             "setup.ksh",
@@ -186,6 +263,632 @@ class TestScanner:
         actual = obj.get_results()
         assert sorted(expected) == sorted(actual)
 
+    @pytest.mark.parametrize(
+        "algorithm, header",
+        [
+            ("md5", "MD5 Digest"),
+            ("sha256", "SHA-256 Digest"),
+            ("blake2b", "BLAKE2b Digest"),
+        ],
+    )
+    def test_digest_algorithm(self, config, algorithm, header):
+        scan_dir = os.path.join(DATA_DIR, "small/level1/level2/level3")
+        config["scan_root"] = scan_dir
+        config["search_strings"] = {"Copyright (c)"}
+        config["digest_algorithm"] = algorithm
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.HEADERS[1] == header
+        for _, digest, name, path in obj.get_results():
+            with open(os.path.join(path, name), "rb") as fid:
+                assert digest == calculate_digest(fid.read(), algorithm)
+        assert len(obj.get_results()) > 0
+
+    @staticmethod
+    def test_unknown_digest_algorithm(config):
+        config["digest_algorithm"] = "crc32"
+        with pytest.raises(ValueError):
+            Scanner(config)
+
+    @pytest.mark.parametrize("chunk_size", [None, 7])
+    def test_digest_matches_only(self, config, chunk_size):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        config["chunk_size"] = chunk_size
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["digest_matches_only"] = True
+        obj = Scanner(config)
+        obj.scan()
+        assert expected == obj.get_results()
+        assert obj.stats["files_matched"] > 0
+        assert "dedup_hits" not in obj.stats
+
+    @pytest.mark.parametrize("engine", ["substring", "trie"])
+    def test_match_engine(self, config, engine):
+        dir_to_scan = "small/level1"
+        string_to_find = "Copyright (c)"
+        desired_results = {
+            string_to_find: [
+                "setup.ksh",
+                "test_helper.tcl",
+                "test_invoice.py",
+                "time.c",
+                "reason.ml",
+                "rtems.ads",
+                "screen_title.c",
+                "scroll2.tk",
+            ]
+        }
+        config["scan_root"] = os.path.join(DATA_DIR, dir_to_scan)
+        config["search_strings"] = {string_to_find, "foo", "bar", "baz"}
+        config["ignore_case"] = True
+        config["match_engine"] = engine
+        obj = Scanner(config)
+        obj.scan()
+        assert self.contains_result(obj.get_results(), desired_results) is True
+
+    @pytest.mark.parametrize("byte_match", [False, True])
+    def test_chunked_scan(self, config, byte_match):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        config["ignore_case"] = True
+        config["byte_match"] = byte_match
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        # Small chunks, so that many matches straddle a chunk boundary.
+        config["chunk_size"] = 7
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(expected) == sorted(obj.get_results())
+        assert len(expected) > 0
+
+    @pytest.mark.parametrize("ignore_case", [False, True])
+    def test_regex_scan(self, config, ignore_case):
+        pattern = r"re:TVisWaptExit\.Set\w+"
+        file_to_scan = "uwaptexit.pas"
+        scan_dir = os.path.join(DATA_DIR, "small")
+        expected = [generate_scan_result(pattern, scan_dir, file_to_scan)]
+        config["scan_root"] = os.path.join(scan_dir, file_to_scan)
+        config["search_strings"] = {pattern, r"re:NoSuch\d+Thing"}
+        config["ignore_case"] = ignore_case
+        obj = Scanner(config)
+        obj.scan()
+        assert expected == obj.get_results()
+
+    @pytest.mark.parametrize("ignore_case", [False, True])
+    @pytest.mark.parametrize("chunk_size, offsets", [(None, False), (7, False), (None, True)])
+    def test_non_ascii_regex_scan(self, config, tmp_path, ignore_case, chunk_size, offsets):
+        (tmp_path / "de.txt").write_text("Straße und MASSE", encoding="utf-8")
+        config["scan_root"] = str(tmp_path)
+        # ß casefolds to ss, which a pattern with ß can't match.
+        config["search_strings"] = {"Straße", "re:Straße", "re:St\\w+ße"}
+        config["ignore_case"] = ignore_case
+        config["chunk_size"] = chunk_size
+        config["offsets"] = offsets
+        obj = Scanner(config)
+        obj.scan()
+        results = obj.get_results()
+        assert sorted(row[0] for row in results) == sorted(config["search_strings"])
+        if offsets:
+            assert {row[4] for row in results} == {0}
+
+    @pytest.mark.parametrize("byte_match", [False, True])
+    def test_chunked_regex_scan(self, config, byte_match):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {r"re:copyright \(c\) \d{4}", "foo"}
+        config["ignore_case"] = True
+        config["byte_match"] = byte_match
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["chunk_size"] = 7
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(expected) == sorted(obj.get_results())
+        assert any(row[0].startswith("re:") for row in expected)
+
+    @pytest.mark.parametrize("chunk_size", [None, 7])
+    def test_chunked_regex_boundaries(self, config, tmp_path, chunk_size):
+        # With 7 byte chunks, a tail of the text before it starts at "Copyright".
+        text = "x" * 5005 + "Copyright" + "y" * 5000 + " done"
+        (tmp_path / "long.txt").write_text(text, encoding="utf-8")
+        config["scan_root"] = str(tmp_path)
+        config["search_strings"] = {
+            "re:^Copyright",
+            r"re:\bCopyright",
+            "re:(?<!x)Copyright",
+            "re:Copyright",
+            "re:done$",
+        }
+        config["chunk_size"] = chunk_size
+        obj = Scanner(config)
+        obj.scan()
+        results = obj.get_results()
+        assert sorted(row[0] for row in results) == ["re:Copyright", "re:done$"]
+
+    @pytest.mark.parametrize("byte_match", [False, True])
+    def test_offsets_scan(self, config, byte_match):
+        search_strings = {"Copyright (c)", "http://", "re:[Ll]icen[sc]e"}
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = search_strings
+        config["byte_match"] = byte_match
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+
+        config["offsets"] = True
+        config["max_offsets"] = 3
+        config["context_bytes"] = 10
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.HEADERS[4:] == ("Offset", "Line", "Context")
+        results = obj.get_results()
+        # The same strings match the same files, with at most 3 rows apiece.
+        assert {row[:4] for row in results} == set(expected)
+        for row in expected:
+            assert 1 <= [result[:4] for result in results].count(row) <= 3
+        for string, _, name, path, offset, line, context in results:
+            with open(os.path.join(path, name), "rb") as fid:
+                file_bytes = fid.read()
+            found = file_bytes[offset:]
+            if string.startswith("re:"):
+                assert re.match(string[3:].encode("utf-8"), found)
+            else:
+                assert found.startswith(string.encode("utf-8"))
+                assert string in context
+            assert line == file_bytes[:offset].count(b"\n") + 1
+            assert len(context) <= 20 + len(string)
+
+    @pytest.mark.parametrize("match_engine", ["substring", "aho-corasick"])
+    @pytest.mark.parametrize("offsets", [False, True])
+    def test_mapped_windows(self, config, monkeypatch, match_engine, offsets):
+        if match_engine == "aho-corasick":
+            pytest.importorskip("ahocorasick")
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"COPYRIGHT (c)", "http://"}
+        config["byte_match"] = True
+        config["ignore_case"] = True
+        config["match_engine"] = match_engine
+        config["offsets"] = offsets
+        obj = Scanner(config)
+        obj.scan()
+        expected = sorted(obj.get_results())
+        # Mapped files are lowercased and searched a few bytes at a time.
+        monkeypatch.setattr(scanner, "WINDOW_SIZE", 64)
+        monkeypatch.setattr(matchers, "WINDOW_SIZE", 64)
+        config["mmap_threshold"] = 1
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(obj.get_results()) == expected
+        assert expected
+
+    @pytest.mark.parametrize("mmap_threshold, chunk_size", [(1, None), (None, 7)])
+    def test_offsets_read_modes(self, config, mmap_threshold, chunk_size):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        config["offsets"] = True
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["mmap_threshold"] = mmap_threshold
+        config["chunk_size"] = chunk_size
+        obj = Scanner(config)
+        obj.scan()
+        if chunk_size:
+            # Files read in chunks report which strings match, but not where.
+            assert {row[:4] + (None, None, None) for row in expected} == set(
+                obj.get_results()
+            )
+        else:
+            assert sorted(expected) == sorted(obj.get_results())
+
+    def test_offsets_cached_scan(self, config, tmp_path):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        config["cache_file"] = str(tmp_path / "cache.db")
+        obj = Scanner(config)
+        obj.scan()
+        config["offsets"] = True
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        # Matches without offsets aren't reused for a scan with them.
+        assert obj.stats["files_cached"] < obj.stats["files_scanned"]
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.stats["files_cached"] == obj.stats["files_scanned"]
+        assert expected == obj.get_results()
+
+    def test_offsets_after_chunked_scan(self, config, tmp_path):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        config["offsets"] = True
+        obj = Scanner(config)
+        obj.scan()
+        expected = sorted(obj.get_results())
+        config["cache_file"] = str(tmp_path / "cache.db")
+        Scanner(dict(config, chunk_size=7)).scan()
+        # The chunked scan's matches, which have no offsets, weren't cached.
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(obj.get_results()) == expected
+
+    def test_offsets_dedup_chunked_copy(self, config, tmp_path):
+        content = "Some text.\nCopyright (c) Acme\n"
+        with zipfile.ZipFile(str(tmp_path / "a.zip"), "w") as zip_file:
+            zip_file.writestr("member.txt", content)
+        (tmp_path / "b.txt").write_text(content)
+        config["scan_root"] = str(tmp_path)
+        config["search_strings"] = {"Copyright (c)"}
+        config["scan_archives"] = True
+        config["offsets"] = True
+        # The archive member is read in chunks, and the file on disk mapped.
+        config["chunk_size"] = 7
+        config["mmap_threshold"] = 1
+        rows = []
+        # Scan the archive first, then its copy, in one scan.
+        changes = [[str(tmp_path / "a.zip")], [str(tmp_path / "b.txt")]]
+        Scanner(config).watch(changes, lambda: CallbackSink(rows.append))
+        offsets = {row[2]: row[4:6] for row in rows}
+        assert offsets == {"member.txt": (None, None), "b.txt": (11, 2)}
+
+    @pytest.mark.parametrize("chunk_size", [None, 7])
+    def test_any_match_scan(self, config, chunk_size):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://", "License"}
+        config["chunk_size"] = chunk_size
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["match_mode"] = "any"
+        obj = Scanner(config)
+        obj.scan()
+        results = obj.get_results()
+        # One of the matching strings is reported for each matching file.
+        assert set(results) <= set(expected)
+        assert sorted(row[1:] for row in results) == sorted(
+            set(row[1:] for row in expected)
+        )
+
+    @pytest.mark.parametrize("offsets", [False, True])
+    def test_files_only_scan(self, config, offsets):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://", "License"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = set(row[1:] for row in obj.get_results())
+        config["match_mode"] = "files"
+        config["offsets"] = offsets
+        if offsets:
+            with pytest.raises(ValueError):
+                Scanner(config)
+            return
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.HEADERS == ("MD5 Digest", "Name", "Location")
+        assert sorted(obj.get_results()) == sorted(expected)
+        assert obj.stats["files_matched"] == len(
+            set(digest for digest, _, _ in expected)
+        )
+
+    @pytest.mark.parametrize(
+        "match_mode, digest_algorithm, search_strings, stopped",
+        [
+            ("all", "none", {"foo", "bar"}, True),
+            ("all", "none", {"foo", "qux"}, False),
+            ("any", "none", {"foo", "qux"}, True),
+            ("any", "md5", {"foo", "qux"}, False),
+        ],
+    )
+    def test_stream_early_exit(
+        self, config, match_mode, digest_algorithm, search_strings, stopped
+    ):
+        file_bytes = b"foo bar " + b"x" * 10000
+        config["search_strings"] = search_strings
+        config["match_mode"] = match_mode
+        config["digest_algorithm"] = digest_algorithm
+        config["chunk_size"] = 64
+        obj = Scanner(config)
+        fid = io.BytesIO(file_bytes)
+        digest, matched_strings = obj._scan_fid(fid)
+        assert "foo" in matched_strings
+        # Reading stops once the matches are known, unless the digest needs it.
+        assert (fid.tell() < len(file_bytes)) is stopped
+        if digest_algorithm == "none":
+            assert digest is None
+        else:
+            assert digest == calculate_digest(file_bytes)
+
+    @staticmethod
+    def test_no_digest_scan(config):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["digest_algorithm"] = "none"
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.HEADERS[1] == "Digest"
+        assert obj.dedup is None
+        assert sorted(obj.get_results()) == sorted(
+            (row[0], None) + row[2:] for row in expected
+        )
+
+    @staticmethod
+    @pytest.mark.parametrize("scan_archives", [False, True])
+    def test_prefiltered_scan(config, scan_archives):
+        config["scan_archives"] = scan_archives
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["exclude_extensions"] = {"vhd", ".VHDL"}
+        config["max_size"] = 64 * 2 ** 10
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.stats["files_skipped_extension"] > 0
+        assert obj.stats["files_skipped_size"] > 0
+        assert obj.stats["files_skipped_binary"] == 0
+        assert 0 < len(obj.get_results()) < len(expected)
+        for row in obj.get_results():
+            assert not row[2].casefold().endswith((".vhd", ".vhdl"))
+        assert set(obj.get_results()) <= set(expected)
+
+    @staticmethod
+    def test_skip_binary_scan(config):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"GCC:", "Copyright (c)"}
+        config["skip_binary"] = True
+        obj = Scanner(config)
+        obj.scan()
+        names = {row[2] for row in obj.get_results()}
+        assert "main.o" not in names
+        assert not any(name.endswith((".jar", ".tgz", ".zip")) for name in names)
+        assert names
+        assert obj.stats["files_skipped_binary"] >= 6
+
+    @staticmethod
+    @pytest.mark.parametrize("scan_archives", [False, True])
+    @pytest.mark.parametrize(
+        "search_strings, byte_match, ignore_case, jobs",
+        [
+            ({"Copyright (c)", "http://sakaiproject.org/"}, False, False, 1),
+            ({"COPYRIGHT (C)", "re:[Cc]opyright [0-9]{4}"}, False, True, 1),
+            ({"Apache License", "Nacional"}, True, False, 1),
+            ({"Copyright (c)", "re:x.y"}, False, False, 1),
+            ({"Copyright (c)", "Apache"}, False, False, 2),
+        ],
+    )
+    def test_indexed_scan(
+        config, tmp_path, scan_archives, search_strings, byte_match, ignore_case, jobs
+    ):
+        config["scan_archives"] = scan_archives
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = search_strings
+        config["byte_match"] = byte_match
+        config["ignore_case"] = ignore_case
+        config["jobs"] = jobs
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        assert expected
+        config["index_file"] = str(tmp_path / "index.db")
+        build_config = dict(config, build_index=True, search_strings=set())
+        assert Scanner(build_config).build_index() == obj.stats["files_scanned"]
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(obj.get_results()) == sorted(expected)
+        if "re:x.y" in search_strings:
+            # The regular expression has no literal to look up.
+            assert obj.stats["files_skipped_index"] == 0
+        else:
+            assert obj.stats["files_skipped_index"] > 0
+
+    @staticmethod
+    def test_stale_index(config, tmp_path):
+        scan_root = tmp_path / "root"
+        shutil.copytree(os.path.join(DATA_DIR, "small", "level1"), str(scan_root))
+        config["scan_root"] = str(scan_root)
+        config["search_strings"] = {"Copyright (c)", "Leaked hostname"}
+        config["index_file"] = str(tmp_path / "index.db")
+        Scanner(dict(config, build_index=True)).build_index()
+        (scan_root / "new.txt").write_text("leaked hostname")
+        changed = scan_root / "level2" / "reg.bas"
+        changed.write_text(changed.read_text() + "Leaked hostname")
+        obj = Scanner(config)
+        obj.scan()
+        assert {row[2] for row in obj.get_results() if row[0] == "Leaked hostname"} == {
+            "reg.bas"
+        }
+        # The index is ignored if it was built with other walk options.
+        config["exclusions"] = {"reg.bas"}
+        obj = Scanner(config)
+        assert obj.index is None
+        obj.scan()
+        assert "reg.bas" not in {row[2] for row in obj.get_results()}
+
+    @staticmethod
+    def test_update_index(config, tmp_path):
+        scan_root = tmp_path / "root"
+        shutil.copytree(os.path.join(DATA_DIR, "small", "level1"), str(scan_root))
+        members = {"a.txt": "same", "b.txt": "before", "c.txt": "gone"}
+        archive = scan_root / "archive.zip"
+
+        def write_archive():
+            with zipfile.ZipFile(str(archive), "w") as zip_file:
+                for name, text in members.items():
+                    zip_file.writestr(name, text)
+
+        write_archive()
+        config["scan_archives"] = True
+        config["scan_root"] = str(scan_root)
+        config["search_strings"] = {"Leaked hostname", "Copyright (c)"}
+        config["index_file"] = str(tmp_path / "index.db")
+        build_config = dict(config, build_index=True, update_index=True)
+        built = Scanner(build_config).build_index()
+
+        (scan_root / "new.txt").write_text("Leaked hostname")
+        changed = scan_root / "level2" / "reg.bas"
+        changed.write_text(changed.read_text() + "Leaked hostname")
+        (scan_root / "level2" / "level3" / "setup.sh").unlink()
+        touched = str(scan_root / "level2" / "level3" / "time.c")
+        os.utime(touched, ns=(0, os.stat(touched).st_mtime_ns + 10 ** 9))
+        members.update({"b.txt": "Leaked hostname after", "d.txt": "added"})
+        del members["c.txt"]
+        write_archive()
+
+        stats = Scanner(build_config).update_index()
+        assert stats == {
+            "files_added": 2,
+            "files_changed": 2,
+            "files_removed": 2,
+            "files_unchanged": built - 4,
+        }
+        # Nothing has changed since.
+        stats = Scanner(build_config).update_index()
+        assert stats["files_unchanged"] == built
+        assert stats["files_added"] + stats["files_changed"] + stats["files_removed"] == 0
+
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.stats["files_skipped_index"] > 0
+        indexed = sorted(obj.get_results())
+        obj = Scanner(dict(config, index_file=None))
+        obj.scan()
+        assert indexed == sorted(obj.get_results())
+        assert {row[2] for row in indexed if row[0] == "Leaked hostname"} == {
+            "new.txt",
+            "reg.bas",
+            "b.txt",
+        }
+
+    @staticmethod
+    def test_invalid_regex(config):
+        config["search_strings"] = {"re:foo("}
+        with pytest.raises(ValueError):
+            Scanner(config)
+
+    @pytest.mark.parametrize(
+        "byte_match, engine",
+        [(False, "auto"), (True, "substring"), (True, "trie"), (True, "aho-corasick")],
+    )
+    def test_mmap_scan(self, config, byte_match, engine):
+        if engine == "aho-corasick":
+            pytest.importorskip("ahocorasick")
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "(C) Aaron Newman"}
+        config["ignore_case"] = True
+        config["byte_match"] = byte_match
+        config["match_engine"] = engine
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["mmap_threshold"] = 0
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(expected) == sorted(obj.get_results())
+        assert len(expected) > 0
+
+    # The walk and the workers both count files skipped by extension.
+    @pytest.mark.parametrize("exclude_extensions", [set(), {".java", ".MF"}])
+    def test_parallel_scan(self, config, exclude_extensions):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["exclude_extensions"] = exclude_extensions
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        expected_stats = obj.stats
+        config["jobs"] = 2
+        obj = Scanner(config)
+        obj.scan()
+        assert expected == obj.get_results()
+        assert expected_stats == obj.stats
+        assert len(expected) > 0
+
+    @pytest.mark.parametrize("prefetch_memory", [64 * 2 ** 20, 2048])
+    def test_prefetch_scan(self, config, prefetch_memory):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["prefetch_depth"] = 4
+        config["prefetch_memory"] = prefetch_memory
+        obj = Scanner(config)
+        obj.scan()
+        assert expected == obj.get_results()
+        assert len(expected) > 0
+
+    @pytest.mark.parametrize("dedup_memory", [16 * 2 ** 20, 2048])
+    def test_dedup_scan(self, config, dedup_memory):
+        config["scan_archives"] = True
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        config["dedup_memory"] = 0
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        assert "dedup_hits" not in obj.stats
+
+        config["dedup_memory"] = dedup_memory
+        obj = Scanner(config)
+        obj.scan()
+        assert sorted(expected) == sorted(obj.get_results())
+        assert obj.stats["dedup_lookups"] == obj.stats["files_scanned"]
+        assert 0 < obj.stats["dedup_hits"] < obj.stats["dedup_lookups"]
+        assert obj.stats["dedup_hit_rate"] == pytest.approx(
+            obj.stats["dedup_hits"] / obj.stats["dedup_lookups"]
+        )
+        assert obj.dedup.used <= dedup_memory
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_cached_scan(self, config, jobs, tmp_path):
+        scan_dir = tmp_path / "scan"
+        shutil.copytree(os.path.join(DATA_DIR, "small"), scan_dir)
+        config["scan_archives"] = True
+        config["scan_root"] = str(scan_dir)
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        config["cache_file"] = str(tmp_path / "cache.db")
+        config["dedup_memory"] = 0
+        config["jobs"] = jobs
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        # Only duplicated content is reused within the first scan.
+        assert obj.stats["files_cached"] < obj.stats["files_scanned"]
+
+        obj = Scanner(config)
+        obj.scan()
+        assert expected == obj.get_results()
+        assert obj.stats["files_cached"] == obj.stats["files_scanned"]
+
+        # Only the changed file is matched again.
+        changed = scan_dir / "time_manager.F90"
+        changed.write_text("Copyright (c) ACME")
+        os.utime(changed, ns=(0, 10 ** 9))
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.stats["files_cached"] == obj.stats["files_scanned"] - 1
+        assert ("Copyright (c)", "time_manager.F90") in [
+            (result[0], result[2]) for result in obj.get_results()
+        ]
+
+        # Different search strings can't reuse the cached matches.
+        config["search_strings"] = {"Copyright (c)"}
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.stats["files_cached"] < obj.stats["files_scanned"]
+
     def test_jar_scan(self, config):
         file_to_scan = "sakai-calendar-util-19.2.jar"
         string_to_find = "http://sakaiproject.org/"
@@ -327,6 +1030,71 @@ class TestScanner:
         obj.scan()
         assert self.contains_result(obj.get_results(), desired_results) is True
 
+    @staticmethod
+    @pytest.mark.parametrize("prefetch_depth", [0, 4])
+    def test_threaded_walk(config, prefetch_depth):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        config["prefetch_depth"] = prefetch_depth
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["walk_threads"] = 4
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.get_results() == expected
+
+    @staticmethod
+    def test_excluded_subtree(config, monkeypatch):
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        config["exclusions"] = {"**/level3/**", "*.vhd*", "reg.bas"}
+        listed = []
+        scandir = os.scandir
+
+        def recording_scandir(path):
+            listed.append(path)
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", recording_scandir)
+        obj = Scanner(config)
+        obj.scan()
+        assert not any(path.endswith("level3") for path in listed)
+        assert any(path.endswith("level2") for path in listed)
+        names = {row[2] for row in obj.get_results()}
+        assert names
+        assert "setup.ksh" not in names
+        assert "reg.bas" not in names
+        assert not any(name.endswith((".vhd", ".vhdl")) for name in names)
+
+    @staticmethod
+    @pytest.mark.parametrize("archive", ["zfs-1.7.0.zip", "zfs-1.7.0.tgz"])
+    @pytest.mark.parametrize(
+        "exclusion, excluded",
+        [
+            ("*.hpp", {"IDDiskInfoLogger.hpp", "IDDAHandlerIdle.hpp"}),
+            ("**/InvariantDisks/ID*.cpp", {"IDDiskInfoLogger.cpp", "IDException.cpp"}),
+            ("/openzfsonosx-*/cmd", None),
+            ("InvariantDisks/", None),
+        ],
+    )
+    def test_excluded_archive_members(config, archive, exclusion, excluded):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small", archive)
+        config["search_strings"] = {"Copyright", "include"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        assert len({row[2] for row in expected}) == 5
+        config["exclusions"] = {exclusion}
+        obj = Scanner(config)
+        obj.scan()
+        # Every member is in the excluded directory if nothing else is listed.
+        assert sorted(obj.get_results()) == sorted(
+            row for row in expected if excluded is not None and row[2] not in excluded
+        )
+
     def test_inner_archive_scan(self, config):
         file_to_scan = "zipped-tar-jar.zip"
         string_to_find = "Copyright (c)"
@@ -344,6 +1112,195 @@ class TestScanner:
         obj.scan()
         assert self.contains_result(obj.get_results(), desired_results) is True
 
+    @pytest.mark.parametrize("spool_size", [64 * 2 ** 20, 1024, 0])
+    def test_inner_archive_spool(self, config, spool_size, tmp_path):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small", "zipped-tar-jar.zip")
+        config["search_strings"] = {"Copyright (c)", "Apache"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        config["temp_dir"] = str(tmp_path)
+        config["spool_size"] = spool_size
+        obj = Scanner(config)
+        obj.scan()
+        assert expected == obj.get_results()
+        assert len(expected) > 0
+        # Nothing is left behind in temp_dir.
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.parametrize("jobs", [1, 2])
+    def test_sink_scan(self, config, jobs):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://sakaiproject.org/"}
+        config["jobs"] = jobs
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        expected_stats = obj.stats
+        rows = []
+        obj = Scanner(config)
+        obj.scan(CallbackSink(rows.append))
+        assert sorted(expected) == sorted(rows)
+        assert expected_stats == obj.stats
+        # Streamed rows aren't kept in memory.
+        assert obj.get_results() == []
+
+    @staticmethod
+    def test_watch(config, tmp_path):
+        (tmp_path / "a.txt").write_text("Leaked hostname")
+        (tmp_path / "b.bin").write_text("Leaked hostname")
+        (tmp_path / "c.txt").write_text("nothing")
+        config["scan_root"] = str(tmp_path)
+        config["search_strings"] = {"Leaked hostname"}
+        config["exclude_extensions"] = {".bin"}
+        sinks = []
+
+        def new_sink():
+            sinks.append([])
+            return CallbackSink(sinks[-1].append)
+
+        changes = [
+            [str(tmp_path / "a.txt"), str(tmp_path / "b.bin")],
+            [str(tmp_path / "c.txt")],
+            [str(tmp_path / "a.txt")],
+        ]
+        obj = Scanner(config)
+        obj.watch(changes, new_sink)
+        assert [row[2] for row in sinks[0]] == ["a.txt", "a.txt"]
+        assert obj.stats["files_scanned"] == 3
+        assert obj.stats["files_matched"] == 2
+        assert obj.stats["files_skipped_extension"] == 1
+        # Roll over to a new sink for every burst.
+        sinks = []
+        Scanner(config).watch(changes, new_sink, roll_interval=1e-9)
+        assert [[row[2] for row in rows] for rows in sinks] == [["a.txt"], [], ["a.txt"]]
+
+    @staticmethod
+    @pytest.mark.parametrize("size_option", ["min_size", "max_size"])
+    def test_watch_gone(config, tmp_path, size_option):
+        (tmp_path / "a.txt").write_text("Leaked hostname")
+        config["scan_root"] = str(tmp_path)
+        config["search_strings"] = {"Leaked hostname"}
+        config[size_option] = 1 if size_option == "min_size" else 2 ** 20
+        rows = []
+        # gone.txt was deleted before its burst was scanned.
+        changes = [[str(tmp_path / "gone.txt"), str(tmp_path / "a.txt")]]
+        obj = Scanner(config)
+        obj.watch(changes, lambda: CallbackSink(rows.append))
+        assert [row[2] for row in rows] == ["a.txt"]
+        assert obj.stats["files_scanned"] == 1
+
+    @staticmethod
+    @pytest.mark.parametrize("scan_archives", [False, True])
+    def test_sharded_scan(config, scan_archives):
+        config["scan_archives"] = scan_archives
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        scanned = obj.stats["files_scanned"]
+        results = []
+        shard_scanned = []
+        for index in range(1, 4):
+            obj = Scanner(dict(config, shard=(index, 3)))
+            obj.scan()
+            results.extend(obj.get_results())
+            shard_scanned.append(obj.stats["files_scanned"])
+        assert sorted(results) == sorted(expected)
+        assert sum(shard_scanned) == scanned
+        assert all(shard_scanned)
+
+    @staticmethod
+    def test_shard_output_file(config):
+        config["stream_output"] = "jsonl"
+        config["shard"] = (3, 16)
+        assert Output.get_sink(config).output_file.endswith("-shard3of16.jsonl")
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "jobs, prefetch_depth, match_mode, prefilter",
+        [
+            (1, 0, "all", False),
+            (1, 0, "all", True),
+            (1, 4, "files", True),
+            (2, 0, "all", True),
+        ],
+    )
+    def test_resume(config, tmp_path, jobs, prefetch_depth, match_mode, prefilter):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small")
+        config["search_strings"] = {"Copyright (c)", "http://"}
+        config["match_mode"] = match_mode
+        config["jobs"] = jobs
+        config["prefetch_depth"] = prefetch_depth
+        if prefilter:
+            # Both the walk and the archives scanned before the crash skip files.
+            config["exclude_extensions"] = {".java", ".MF"}
+            config["max_size"] = 64 * 2 ** 10
+        obj = Scanner(config)
+        obj.scan()
+        expected = obj.get_results()
+        expected_stats = obj.stats
+
+        # Checkpoint after every file, and crash part of the way through.
+        config["checkpoint_dir"] = str(tmp_path)
+        config["checkpoint_interval"] = 0
+        config["resume"] = True
+        crash = os.path.join(config["scan_root"], "zfs-1.7.0.tgz")
+        obj = Scanner(config)
+        scan_units = obj._scan_units
+
+        def crashing_scan_units(units):
+            for ordinal, thing, results in scan_units(units):
+                if thing == crash:
+                    raise MemoryError
+                yield ordinal, thing, results
+
+        obj._scan_units = crashing_scan_units
+        with pytest.raises(MemoryError):
+            obj.scan()
+        assert len(os.listdir(str(tmp_path))) == 1
+
+        obj = Scanner(config)
+        obj.scan()
+        assert obj.resume_position > 0
+        assert obj.get_results() == expected
+        for stat in (
+            "files_scanned",
+            "files_matched",
+            "files_skipped_extension",
+            "files_skipped_size",
+            "files_skipped_index",
+        ):
+            assert obj.stats.get(stat) == expected_stats.get(stat)
+        # The checkpoint is gone once the scan is complete.
+        assert os.listdir(str(tmp_path)) == []
+
+    @staticmethod
+    def test_checkpoint_key(config):
+        config["offsets"] = True
+        keys = {
+            Scanner(dict(config, **options))._checkpoint_key()
+            for options in (
+                {},
+                {"chunk_size": 2 ** 20},
+                {"mmap_threshold": 2 ** 20},
+                {"search_strings": {"foo"}},
+            )
+        }
+        # Each of them changes which rows, or which offsets, a scan reports.
+        assert len(keys) == 4
+
+    @staticmethod
+    def test_get_sink(config):
+        config["stream_output"] = "csv"
+        sink = Output.get_sink(config)
+        assert isinstance(sink, CSVSink)
+        assert sink.output_file.endswith(".csv")
+
     @staticmethod
     def test_get_csv_output(config):
         config["excel_output"] = False
@@ -392,3 +1349,34 @@ class TestScanner:
         wb = openpyxl.load_workbook(output.output_file)
         sheet = wb.active
         assert sheet.max_row - 1 == len(scanner.get_results())
+
+    def test_parquet_output(self, config):
+        parquet = pytest.importorskip("pyarrow.parquet")
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small", "zipped-tar-jar.zip")
+        config["search_strings"] = {"Copyright (c)"}
+        scanner = Scanner(config)
+        scanner.scan()
+        config["parquet_output"] = True
+        output = Output.get_output(scanner.HEADERS, scanner.get_results(), config)
+        assert isinstance(output, ParquetOutput)
+        output.output()
+        table = parquet.read_table(output.output_file)
+        assert [tuple(row.values()) for row in table.to_pylist()] == (
+            scanner.get_results()
+        )
+
+    def test_jsonl_output(self, config):
+        config["scan_archives"] = True
+        config["scan_root"] = os.path.join(DATA_DIR, "small", "zipped-tar-jar.zip")
+        config["search_strings"] = {"Copyright (c)"}
+        scanner = Scanner(config)
+        scanner.scan()
+        # --jsonl-output streams the rows to a JSONLSink during the scan.
+        config["stream_output"] = "jsonl"
+        sink = Output.get_sink(config)
+        assert isinstance(sink, JSONLSink)
+        Scanner(config).scan(sink)
+        with open(sink.output_file, encoding="utf-8") as jsonl_file:
+            rows = [tuple(json.loads(line).values()) for line in jsonl_file]
+        assert rows == scanner.get_results()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Shard and merge unit tests."""
+
+import collections
+import json
+import os
+import sys
+
+import pytest
+
+from .context import CSVSink, JSONLSink, main, merge_results, parse_shard, shard_of
+
+HEADER = ("String", "MD5 Digest", "Name", "Location")
+OFFSETS_HEADER = HEADER + ("Offset", "Line", "Context")
+
+
+def write_results(sink, header, rows):
+    """Write rows to a results file, as a scan would."""
+    with sink:
+        sink.open(header)
+        for row in rows:
+            sink.write(row)
+
+
+class TestShards:
+    """Shard and merge unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "spec, expected", [("1/1", (1, 1)), ("3/16", (3, 16)), ("16/16", (16, 16))]
+    )
+    def test_parse_shard(spec, expected):
+        assert parse_shard(spec) == expected
+
+    @staticmethod
+    @pytest.mark.parametrize("spec", ["0/4", "5/4", "3", "a/b", "1/0"])
+    def test_parse_bad_shard(spec):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+    @staticmethod
+    def test_shard_of():
+        paths = ["dir{0}/file{1}.txt".format(i % 7, i) for i in range(4000)]
+        counts = collections.Counter(shard_of(path, 4) for path in paths)
+        assert sorted(counts) == [1, 2, 3, 4]
+        assert min(counts.values()) > 800
+        assert shard_of("a/b.txt", 16) == shard_of("a/b.txt", 16)
+
+    @staticmethod
+    def test_merge_results(tmp_path):
+        rows = [
+            ("gpl", "d1", "a.c", "/src"),
+            ("gpl", "d1", "b.c", "/src/copy"),
+            ("bsd", "d2", "c.c", "/src"),
+        ]
+        first = str(tmp_path / "scan-shard1of2.csv")
+        second = str(tmp_path / "scan-shard2of2.jsonl")
+        write_results(CSVSink(first, branding_text=["Acme"]), HEADER, rows[:2])
+        # The second shard was run twice, and wrote a row of the first again.
+        write_results(JSONLSink(second), HEADER, rows[1:])
+        header, merged = merge_results([first, second])
+        assert header == HEADER
+        assert merged == rows
+
+    @staticmethod
+    def test_merge_offsets(tmp_path):
+        rows = [
+            ("gpl", "d1", "a.c", "/src", 10, 2, "the gpl"),
+            ("gpl", "", "b.c", "/", None, None, ""),
+        ]
+        path = str(tmp_path / "scan-shard1of1.csv")
+        write_results(CSVSink(path), OFFSETS_HEADER, rows)
+        assert merge_results([path]) == (OFFSETS_HEADER, rows)
+
+    @staticmethod
+    def test_merge_mismatch(tmp_path):
+        first = str(tmp_path / "first.csv")
+        second = str(tmp_path / "second.csv")
+        write_results(CSVSink(first), HEADER, [])
+        write_results(CSVSink(second), HEADER[1:], [])
+        with pytest.raises(ValueError):
+            merge_results([first, second])
+        with pytest.raises(ValueError):
+            merge_results([str(tmp_path / "first.xlsx")])
+
+    @staticmethod
+    @pytest.mark.parametrize(
+        "option, extension",
+        [(None, ".csv"), ("--jsonl-output", ".jsonl"), ("--stream-output=jsonl", ".jsonl")],
+    )
+    def test_merge_command(monkeypatch, tmp_path, option, extension):
+        rows = [("gpl", "d1", "a.c", "/src"), ("bsd", "d2", "c.c", "/src")]
+        partial = [str(tmp_path / "scan-shard{0}of2.jsonl".format(i)) for i in (1, 2)]
+        write_results(JSONLSink(partial[0]), HEADER, rows[:1])
+        write_results(JSONLSink(partial[1]), HEADER, rows)
+        output_dir = tmp_path / "out"
+        output_dir.mkdir()
+        argv = ["string_path_search", "merge", "-o", str(output_dir)]
+        argv += ["-t", str(tmp_path / "temp")] + ([option] if option else [])
+        monkeypatch.setattr(sys, "argv", argv + partial)
+        main()
+        (output,) = os.listdir(output_dir)
+        assert output.endswith(extension)
+        output = str(output_dir / output)
+        if extension == ".jsonl":
+            with open(output, encoding="utf-8") as fid:
+                assert [tuple(json.loads(line).values()) for line in fid] == rows
+        assert merge_results([output]) == (HEADER, rows)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Result sink unit tests."""
+
+import csv
+import json
+import sqlite3
+
+import openpyxl
+import pytest
+
+from .context import (
+    CallbackSink,
+    CSVSink,
+    ExcelSink,
+    FileSink,
+    JSONLSink,
+    ParquetSink,
+    SQLiteSink,
+    get_sink,
+)
+
+HEADER = ("String", "MD5 Digest", "Name", "Location")
+ROWS = [
+    ("foo", "0123", "a.txt", "root/dir"),
+    ("café", "4567", "b.txt", "root/archive.zip/dir"),
+]
+
+OFFSET_HEADER = HEADER + ("Offset", "Line", "Context")
+OFFSET_ROWS = [
+    ROWS[0] + (120, 7, "the foo bar"),
+    ROWS[1] + (None, None, None),
+]
+
+class TestSinks:
+    """Sink classes unit test class."""
+
+    @staticmethod
+    def write_rows(sink):
+        with sink:
+            sink.open(HEADER)
+            for row in ROWS:
+                sink.write(row)
+
+    def test_callback_sink(self):
+        rows = []
+        self.write_rows(CallbackSink(rows.append))
+        assert rows == ROWS
+
+    def test_csv_sink(self, tmp_path):
+        output_file = str(tmp_path / "out" / "scan.csv")
+        self.write_rows(CSVSink(output_file))
+        with open(output_file, newline="", encoding="utf-8") as csv_file:
+            rows = [tuple(row) for row in csv.reader(csv_file, dialect="excel")]
+        assert rows == [HEADER] + ROWS
+
+    def test_jsonl_sink(self, tmp_path):
+        output_file = str(tmp_path / "scan.jsonl")
+        self.write_rows(JSONLSink(output_file))
+        with open(output_file, encoding="utf-8") as jsonl_file:
+            rows = [json.loads(line) for line in jsonl_file]
+        assert rows == [dict(zip(HEADER, row)) for row in ROWS]
+
+    @staticmethod
+    @pytest.mark.parametrize("flush_interval, visible", [(0, 1), (None, 0)])
+    def test_jsonl_sink_flush(tmp_path, flush_interval, visible):
+        output_file = str(tmp_path / "scan.jsonl")
+        with JSONLSink(output_file, flush_interval) as sink:
+            sink.open(HEADER)
+            sink.write(ROWS[0])
+            sink.flush()
+            # Readers see the flushed rows while the sink is still open.
+            with open(output_file, encoding="utf-8") as jsonl_file:
+                assert len(jsonl_file.readlines()) == visible
+
+    def test_sqlite_sink(self, tmp_path):
+        output_file = str(tmp_path / "scan.sqlite")
+        self.write_rows(SQLiteSink(output_file))
+        # Writing again replaces the previous results.
+        self.write_rows(SQLiteSink(output_file))
+        with sqlite3.connect(output_file) as connection:
+            rows = connection.execute("SELECT * FROM results").fetchall()
+            labels = connection.execute("SELECT label FROM columns").fetchall()
+        assert rows == ROWS
+        assert tuple(label for (label,) in labels) == HEADER
+
+    @staticmethod
+    def test_sqlite_sink_offsets(tmp_path):
+        output_file = str(tmp_path / "scan.sqlite")
+        with SQLiteSink(output_file) as sink:
+            sink.open(OFFSET_HEADER)
+            for row in OFFSET_ROWS:
+                sink.write(row)
+        with sqlite3.connect(output_file) as connection:
+            rows = connection.execute(
+                "SELECT * FROM results WHERE offset > 100"
+            ).fetchall()
+            names = connection.execute("SELECT name FROM columns").fetchall()
+        assert rows == OFFSET_ROWS[:1]
+        assert [name for (name,) in names][4:] == ["offset", "line", "context"]
+
+    @staticmethod
+    def test_sqlite_sink_files_only(tmp_path):
+        output_file = str(tmp_path / "scan.sqlite")
+        with SQLiteSink(output_file) as sink:
+            sink.open(HEADER[1:])
+            for row in ROWS:
+                sink.write(row[1:])
+        with sqlite3.connect(output_file) as connection:
+            rows = connection.execute("SELECT digest, name, location FROM results")
+            assert rows.fetchall() == [row[1:] for row in ROWS]
+
+    def test_excel_sink(self, tmp_path):
+        output_file = str(tmp_path / "scan.xlsx")
+        self.write_rows(ExcelSink(output_file))
+        workbook = openpyxl.load_workbook(output_file)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        assert rows == [HEADER] + ROWS
+        # The widest cell is "root/archive.zip/dir", plus one.
+        assert workbook.active.column_dimensions["D"].width == pytest.approx(21, abs=1)
+
+    def test_excel_sink_rollover(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(ExcelSink, "MAX_ROWS", 5)
+        output_file = str(tmp_path / "scan.xlsx")
+        sink = ExcelSink(output_file, branding_text="ACME")
+        with sink:
+            sink.open(HEADER)
+            for _ in range(3):
+                for row in ROWS:
+                    sink.write(row)
+        workbook = openpyxl.load_workbook(output_file)
+        sheets = [
+            list(sheet.iter_rows(values_only=True)) for sheet in workbook.worksheets
+        ]
+        # The branding is only on the first worksheet.
+        assert sheets[0] == [("ACME", None, None, None), (None,) * 4, HEADER] + ROWS
+        assert sheets[1] == [HEADER] + ROWS * 2
+        assert len(sheets) == 2
+
+    def test_parquet_sink(self, tmp_path):
+        parquet = pytest.importorskip("pyarrow.parquet")
+        output_file = str(tmp_path / "scan.parquet")
+        sink = ParquetSink(output_file, row_group_size=3)
+        with sink:
+            sink.open(HEADER)
+            for _ in range(4):
+                for row in ROWS:
+                    sink.write(row)
+        parquet_file = parquet.ParquetFile(output_file)
+        assert parquet_file.metadata.num_row_groups == 3
+        table = parquet_file.read()
+        assert table.column_names == list(HEADER)
+        assert [tuple(row.values()) for row in table.to_pylist()] == ROWS * 4
+        # The repetitive columns are dictionary encoded.
+        encodings = parquet_file.metadata.row_group(0).column(0).encodings
+        assert "RLE_DICTIONARY" in encodings
+
+    @staticmethod
+    def test_parquet_sink_offsets(tmp_path):
+        pyarrow = pytest.importorskip("pyarrow")
+        parquet = pytest.importorskip("pyarrow.parquet")
+        output_file = str(tmp_path / "scan.parquet")
+        with ParquetSink(output_file) as sink:
+            sink.open(OFFSET_HEADER)
+            for row in OFFSET_ROWS:
+                sink.write(row)
+        table = parquet.read_table(output_file)
+        assert table.schema.field("Offset").type == pyarrow.int64()
+        assert [tuple(row.values()) for row in table.to_pylist()] == OFFSET_ROWS
+
+    @staticmethod
+    def test_get_sink(tmp_path):
+        assert isinstance(get_sink("csv", str(tmp_path / "scan.csv")), CSVSink)
+        assert isinstance(get_sink("jsonl", str(tmp_path / "scan.jsonl")), JSONLSink)
+        with pytest.raises(ValueError):
+            get_sink("xml", str(tmp_path / "scan.xml"))
+        # FileSink is only a base class.
+        with pytest.raises(TypeError):
+            FileSink(str(tmp_path / "scan.txt"))
@@ -9,7 +9,9 @@ import os
 import shutil
 import unittest
 
-from .context import Scanner
+import pytest
+
+from .context import LRUCache, MemoryBudget, Scanner, calculate_digest, calculate_md5, parse_size
 
 class ScannerTestSuite(unittest.TestCase):
     """Scanner class unit test class."""
@@ -39,3 +41,56 @@ class ScannerTestSuite(unittest.TestCase):
         for f in os.listdir(self.config['output_dir']):
             os.remove(os.path.join(self.config['output_dir'], f))
 
+
+
+class TestUtils:
+    """Utility function unit test class."""
+
+    @staticmethod
+    def test_parse_size():
+        assert parse_size("4096") == 4096
+        assert parse_size(" 64k") == 64 * 1024
+        assert parse_size("2M") == 2 * 1024 * 1024
+        assert parse_size("1G") == 1024 ** 3
+
+    @staticmethod
+    @pytest.mark.parametrize("size", ["", "M", "1.5M", "-1", "12Q"])
+    def test_parse_size_invalid(size):
+        with pytest.raises(ValueError):
+            parse_size(size)
+
+    @staticmethod
+    def test_memory_budget():
+        budget = MemoryBudget(100)
+        assert budget.reserve(60) is True
+        assert budget.reserve(60) is False
+        budget.release(60)
+        assert budget.reserve(100) is True
+        assert budget.available == 0
+
+    @staticmethod
+    def test_lru_cache():
+        cache = LRUCache(10)
+        cache.put("a", 1, 4)
+        cache.put("b", 2, 4)
+        assert cache.get("a") == 1
+        cache.put("c", 3, 4)
+        # "b" was the least recently used.
+        assert cache.get("b") is None
+        assert cache.get("a") == 1 and cache.get("c") == 3
+        assert cache.used == 8
+        cache.put("d", 4, 11)
+        assert cache.get("d") is None
+        assert len(cache) == 2
+
+    @staticmethod
+    def test_calculate_digest():
+        assert calculate_digest(b"foo") == calculate_md5(b"foo")
+        assert calculate_digest("foo", "sha256") == (
+            "2c26b46b68ffc68ff99b453c1d30413413422d706483bfa0f98a5e886266e7ae"
+        )
+        assert calculate_digest(memoryview(b"foo"), "sha1") == calculate_digest(
+            b"foo", "sha1"
+        )
+        with pytest.raises(ValueError):
+            calculate_digest(b"foo", "crc32")
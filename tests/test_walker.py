@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Directory walker unit tests."""
+
+import os
+import sys
+
+import pytest
+
+from .context import walk_dir, walker
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def recursive_walk(path, relative=""):
+    """The walk order of a plain recursive os.scandir() walk."""
+    for entry in os.scandir(path):
+        if entry.is_dir():
+            yield from recursive_walk(entry.path, relative + entry.name + "/")
+        else:
+            yield relative + entry.name
+
+
+class TestWalker:
+    """Directory walker unit test class."""
+
+    @staticmethod
+    @pytest.mark.parametrize("threads", [1, 2, 8])
+    def test_walk_order(monkeypatch, threads):
+        # Keep the listing threads from getting far ahead of the walk.
+        monkeypatch.setattr(walker, "WALK_AHEAD", 1)
+        root = os.path.join(DATA_DIR, "small")
+        walked = [relative for relative, _ in walk_dir(root, threads=threads)]
+        assert walked == list(recursive_walk(root))
+        for relative, entry in walk_dir(root, threads=threads):
+            assert entry.path == os.path.join(root, *relative.split("/"))
+
+    @staticmethod
+    @pytest.mark.parametrize("threads", [1, 4])
+    def test_walk_excluded(threads):
+        checked = []
+
+        def excluded(relative, is_dir):
+            checked.append(relative)
+            return (is_dir and relative.endswith("level2")) or relative.endswith(".zip")
+
+        root = os.path.join(DATA_DIR, "small")
+        walked = [relative for relative, _ in walk_dir(root, excluded, threads)]
+        assert walked
+        assert not any(relative.endswith(".zip") for relative in walked)
+        assert not any("level2" in relative for relative in walked)
+        # The excluded directory is never listed.
+        assert "level1/level2" in checked
+        assert not any(relative.startswith("level1/level2/") for relative in checked)
+
+    @staticmethod
+    def test_walk_deep(tmp_path):
+        depth = sys.getrecursionlimit() + 100
+        leaf = str(tmp_path)
+        try:
+            for _ in range(depth):
+                # os.makedirs() recurses too.
+                leaf = os.path.join(leaf, "d")
+                os.mkdir(leaf)
+            with open(os.path.join(leaf, "deep.txt"), "w", encoding="utf-8"):
+                pass
+            walked = [relative for relative, _ in walk_dir(str(tmp_path), threads=2)]
+            assert walked == ["d/" * depth + "deep.txt"]
+        finally:
+            # shutil.rmtree(), which cleans up tmp_path, recurses too.
+            if os.path.exists(os.path.join(leaf, "deep.txt")):
+                os.remove(os.path.join(leaf, "deep.txt"))
+            while leaf != str(tmp_path):
+                if os.path.isdir(leaf):
+                    os.rmdir(leaf)
+                leaf = os.path.dirname(leaf)
+
+    @staticmethod
+    def test_walk_unlistable(monkeypatch, tmp_path):
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "lost.txt").write_text("lost")
+        (tmp_path / "b.txt").write_text("found")
+        list_dir = walker._list_dir
+
+        def failing_list_dir(path):
+            if path.endswith("a"):
+                return PermissionError("Permission denied")
+            return list_dir(path)
+
+        monkeypatch.setattr(walker, "_list_dir", failing_list_dir)
+        walked = [relative for relative, _ in walk_dir(str(tmp_path))]
+        assert walked == ["b.txt"]
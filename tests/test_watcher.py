@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Directory watcher unit tests."""
+
+import os
+import threading
+
+import pytest
+
+from .context import Exclusions, Inotify, Poller, watch, watcher
+
+
+def make_files(root, *names):
+    """Write a small file for each "/"-separated name under root."""
+    for name in names:
+        path = os.path.join(str(root), *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fid:
+            fid.write(name)
+
+
+def collect(tree, expected, tries=20):
+    """Gather changes until every expected path has been reported."""
+    changed = set()
+    for _ in range(tries):
+        changed.update(tree.changes(0.2))
+        if expected <= changed:
+            break
+    return changed
+
+
+class TestWatcher:
+    """Directory watcher unit test class."""
+
+    @staticmethod
+    def test_poller(tmp_path):
+        make_files(tmp_path, "a.txt", "sub/b.txt", "skip/c.txt")
+        poller = Poller(
+            str(tmp_path), Exclusions(["skip/"]).excluded, poll_interval=0.01
+        )
+        assert poller.changes(None) == set()
+        make_files(tmp_path, "new/d.txt", "skip/e.txt")
+        with open(str(tmp_path / "a.txt"), "a") as fid:
+            fid.write("more")
+        assert poller.changes(None) == {
+            str(tmp_path / "a.txt"),
+            os.path.join(str(tmp_path), "new", "d.txt"),
+        }
+        (tmp_path / "sub" / "b.txt").unlink()
+        assert poller.changes(None) == set()
+
+    @staticmethod
+    @pytest.mark.skipif(watcher._libc() is None, reason="No inotify")
+    def test_inotify(tmp_path):
+        make_files(tmp_path, "a.txt", "sub/b.txt", "skip/c.txt")
+        tree = Inotify(str(tmp_path), Exclusions(["skip/", "*.tmp"]).excluded)
+        try:
+            assert tree.changes(0.01) == set()
+            make_files(tmp_path, "sub/b.txt", "new/deeper/d.txt", "skip/e.txt", "f.tmp")
+            expected = {
+                os.path.join(str(tmp_path), "sub", "b.txt"),
+                os.path.join(str(tmp_path), "new", "deeper", "d.txt"),
+            }
+            assert collect(tree, expected) == expected
+            # The new directories are watched too.
+            make_files(tmp_path, "new/deeper/g.txt")
+            expected = {os.path.join(str(tmp_path), "new", "deeper", "g.txt")}
+            assert collect(tree, expected) == expected
+        finally:
+            tree.close()
+
+    @staticmethod
+    @pytest.mark.parametrize("poll_interval", [None, 0.05])
+    def test_watch(tmp_path, poll_interval):
+        make_files(tmp_path, "a.txt")
+        bursts = watch(str(tmp_path), debounce=0.2, poll_interval=poll_interval)
+        # Write a burst of files once the watch has started.
+        timer = threading.Timer(0.5, make_files, (tmp_path, "b.txt", "c/d.txt"))
+        timer.start()
+        try:
+            assert next(bursts) == sorted(
+                [str(tmp_path / "b.txt"), os.path.join(str(tmp_path), "c", "d.txt")]
+            )
+        finally:
+            timer.join()
+            bursts.close()